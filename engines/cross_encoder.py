@@ -0,0 +1,153 @@
+#engines/cross_encoder.py
+"""
+Cross-Encoder Re-ranker - Batched CPU scoring of (query, chunk) pairs for the final result order
+"""
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER_MODEL = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
+
+
+class CrossEncoderReranker:
+    """Scores the top-N results with a multilingual cross-encoder, within a latency budget
+    
+    Pair scores are cached by (query hash, doc id): doc ids change when a chunk's content
+    does, so cached scores never go stale.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = DEFAULT_CROSS_ENCODER_MODEL,
+        top_n: int = 20,
+        latency_budget_ms: float = 150.0,
+        max_length: int = 256,
+        cache_size: int = 20000,
+        model: Optional[Any] = None
+    ):
+        self.model_name = model_name
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name, max_length=max_length, device='cpu')
+        self.model = model  # Anything with CrossEncoder.predict; a preloaded model skips the load
+        self.top_n = top_n
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        
+        # One scoring thread: a batch that overruns the budget finishes in the background
+        # (filling the cache) instead of piling up parallel model calls
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cross-encoder')
+        
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {
+            'reranked': 0,
+            'cache_hits': 0,
+            'pairs_scored': 0,
+            'over_budget': 0,
+            'errors': 0
+        }
+    
+    @staticmethod
+    def query_hash(query: str) -> str:
+        normalized = ' '.join(query.lower().split())
+        return hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    
+    def _cached_scores(self, keys: List[Tuple[str, str]]) -> List[Optional[float]]:
+        with self._cache_lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            return scores
+    
+    def _score_pairs(self, keys: List[Tuple[str, str]], pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Score pairs in one batch and cache them (runs on the scoring thread)"""
+        
+        scores = np.asarray(
+            self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+            dtype=np.float32
+        ).reshape(-1)
+        
+        with self._cache_lock:
+            for key, score in zip(keys, scores.tolist()):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        self.stats['pairs_scored'] += len(pairs)
+        return scores
+    
+    async def rerank(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Reorder the first top_n results by cross-encoder score against query ('rerank_score')
+        
+        query is the user's question: every result is scored against it, not against the
+        refined query that retrieved it, so scores are comparable across results.
+        Returns results unchanged when scoring fails or does not finish within the budget.
+        """
+        
+        if len(results) < 2 or self.top_n < 2:
+            return results
+        
+        started = time.perf_counter()
+        head, tail = results[:self.top_n], results[self.top_n:]
+        
+        query_key = self.query_hash(query)
+        keys = [(query_key, result['doc_id']) for result in head]
+        scores = self._cached_scores(keys)
+        missing = [row for row, score in enumerate(scores) if score is None]
+        self.stats['cache_hits'] += len(head) - len(missing)
+        
+        if missing:
+            budget = self.latency_budget_ms / 1000 - (time.perf_counter() - started)
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                self._score_pairs,
+                [keys[row] for row in missing],
+                [(query, head[row]['content']) for row in missing]
+            )
+            try:
+                # Shielded: an overrun batch still completes and caches its scores
+                missing_scores = await asyncio.wait_for(asyncio.shield(future), timeout=max(budget, 0))
+            except asyncio.TimeoutError:
+                self.stats['over_budget'] += 1
+                logger.info(f"Cross-encoder re-ranking over {self.latency_budget_ms}ms budget, keeping order")
+                return results
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Cross-encoder re-ranking error: {e}")
+                return results
+            
+            for row, score in zip(missing, missing_scores.tolist()):
+                scores[row] = score
+        
+        # Stable sort: pairs the model scores equally keep their previous order
+        order = np.argsort(-np.asarray(scores, dtype=np.float32), kind='stable')
+        for result, score in zip(head, scores):
+            result['rerank_score'] = score
+        
+        self.stats['reranked'] += 1
+        return [head[row] for row in order.tolist()] + tail
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'model_name': self.model_name,
+            'top_n': self.top_n,
+            'latency_budget_ms': self.latency_budget_ms,
+            'cache_entries': len(self._cache),
+            **self.stats
+        }
+    
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,691 @@
+#engines/document_store.py
+"""
+Document Store - Columnar, memory-mappable chunk storage keyed by FAISS id
+
+On-disk layout per collection:
+    {name}_docs.npy   fixed-width columns (structured array, memory-mapped)
+    {name}_text.bin   UTF-8 chunk text, addressed by offset/length
+    {name}_meta.bin   UTF-8 JSON of the string doc id, chunk metadata and SHA-256 content digest
+    {name}_vectors.npy  normalized float32 embeddings, row-aligned with the docs file
+    {name}_delta.log  append-only log of changes since the base files were last written
+
+Usage:
+    python -m engines.document_store migrate --base-path ./data/faiss_indices
+"""
+import os
+import json
+import mmap
+import uuid
+import zlib
+import hashlib
+import struct
+import pickle
+import argparse
+import logging
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run a single worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DOC_COLUMNS = np.dtype([
+    ('id', '<i8'),
+    ('text_offset', '<i8'),
+    ('text_length', '<u4'),
+    ('meta_offset', '<i8'),
+    ('meta_length', '<u4'),
+    ('content_length', '<u4'),
+    ('added_at', '<f8'),
+    ('content_hash', '<u4')
+])
+
+
+def content_digest(content: str) -> str:
+    """Stable SHA-256 hex digest of chunk text (same value as document_metadata.content_hash)"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def chunk_key(metadata: Optional[Dict[str, Any]], digest: str) -> str:
+    """Identity of a chunk across re-ingestion: its source position when known, else its content"""
+    
+    metadata = metadata or {}
+    if metadata.get('source') is not None and metadata.get('chunk_index') is not None:
+        return f"{metadata['source']}#{metadata['chunk_index']}"
+    return f"sha256:{digest}"
+
+
+class DocumentStore:
+    """Read-mostly document store: a memory-mapped base plus an in-memory tail of new records"""
+    
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        
+        # Base: (columns, ids, text blob, meta blob, vectors or None) sorted by id, backed by
+        # files once saved. Swapped as one tuple so concurrent readers never mix old and new files.
+        self._base = (np.zeros(0, dtype=DOC_COLUMNS), np.zeros(0, dtype=np.int64), b'', b'', None)
+        self._files = []
+        
+        # Tail: records (and their vectors) added since the last save
+        self._tail: Dict[int, Dict[str, Any]] = {}
+        self._tail_vectors: Dict[int, np.ndarray] = {}
+        
+        # Base ids removed since the last save (dropped from the files on the next save)
+        self._removed: set = set()
+    
+    def __len__(self) -> int:
+        return len(self._base[1]) - len(self._removed) + len(self._tail)
+    
+    def __contains__(self, faiss_id: int) -> bool:
+        if faiss_id in self._tail:
+            return True
+        return faiss_id not in self._removed and self._find_row(self._base[1], faiss_id) is not None
+    
+    @staticmethod
+    def _find_row(ids: np.ndarray, faiss_id: int) -> Optional[int]:
+        """Row of an id in the sorted base ids, or None"""
+        
+        row = int(np.searchsorted(ids, faiss_id))
+        if row < len(ids) and ids[row] == faiss_id:
+            return row
+        return None
+    
+    def get(self, faiss_id: int) -> Optional[Dict[str, Any]]:
+        """Materialize a document record (same shape as the legacy metadata_store entries)"""
+        
+        record = self._tail.get(faiss_id)
+        if record is not None:
+            return record
+        
+        if faiss_id in self._removed:
+            return None
+        
+        base = self._base
+        row = self._find_row(base[1], faiss_id)
+        if row is None:
+            return None
+        
+        return self._materialize(base, row)
+    
+    def _materialize(self, base: tuple, row: int) -> Dict[str, Any]:
+        """Decode a base row into a record dict"""
+        
+        rows, _, text, meta_blob, _ = base
+        columns = rows[row]
+        text_offset = int(columns['text_offset'])
+        meta_offset = int(columns['meta_offset'])
+        
+        content = text[text_offset:text_offset + int(columns['text_length'])].decode('utf-8')
+        meta = json.loads(meta_blob[meta_offset:meta_offset + int(columns['meta_length'])].decode('utf-8'))
+        
+        return {
+            'id': meta['id'],
+            'faiss_id': int(columns['id']),
+            'content': content,
+            'metadata': meta['metadata'],
+            'collection': self.collection_name,
+            'added_at': float(columns['added_at']),
+            'content_length': int(columns['content_length']),
+            'content_hash': int(columns['content_hash']),
+            'content_digest': meta.get('content_digest') or content_digest(content)
+        }
+    
+    def append(self, records: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None):
+        """Add new records (optionally with their float vectors); they stay in memory until the next save"""
+        
+        for record in records:
+            self._tail[record['faiss_id']] = record
+        if vectors is not None:
+            self.put_vectors([record['faiss_id'] for record in records], vectors)
+    
+    def put_vectors(self, faiss_ids, vectors: np.ndarray):
+        """Store float vectors for existing or new ids (kept in memory until the next save)"""
+        
+        for faiss_id, vector in zip(np.asarray(faiss_ids).tolist(), vectors):
+            self._tail_vectors[faiss_id] = np.asarray(vector, dtype=np.float32)
+    
+    def remove(self, faiss_ids) -> int:
+        """Drop records and their vectors; returns how many were present"""
+        
+        removed = 0
+        base_ids = self._base[1]
+        for faiss_id in np.asarray(faiss_ids, dtype=np.int64).tolist():
+            if self._tail.pop(faiss_id, None) is not None:
+                self._tail_vectors.pop(faiss_id, None)
+                removed += 1
+            elif faiss_id not in self._removed and self._find_row(base_ids, faiss_id) is not None:
+                self._removed.add(faiss_id)
+                removed += 1
+        return removed
+    
+    def get_vectors(self, faiss_ids) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """Stored float vectors of ids plus a found mask; vectors is None when nothing is stored"""
+        
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        _, base_ids, _, _, base_vectors = self._base
+        found = np.zeros(len(faiss_ids), dtype=bool)
+        
+        if base_vectors is not None:
+            dimension = base_vectors.shape[1]
+        elif self._tail_vectors:
+            dimension = len(next(iter(self._tail_vectors.values())))
+        else:
+            return None, found
+        
+        vectors = np.zeros((len(faiss_ids), dimension), dtype=np.float32)
+        if base_vectors is not None and len(base_ids):
+            rows = np.minimum(np.searchsorted(base_ids, faiss_ids), len(base_ids) - 1)
+            in_base = base_ids[rows] == faiss_ids
+            vectors[in_base] = base_vectors[rows[in_base]]
+            found |= in_base
+        
+        if self._tail_vectors:
+            for position, faiss_id in enumerate(faiss_ids.tolist()):
+                vector = self._tail_vectors.get(faiss_id)
+                if vector is not None:
+                    vectors[position] = vector
+                    found[position] = True
+        
+        return vectors, found
+    
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over all records, base first"""
+        
+        base, removed = self._base, self._removed
+        for row in range(len(base[1])):
+            if removed and int(base[1][row]) in removed:
+                continue
+            yield self._materialize(base, row)
+        yield from list(self._tail.values())
+    
+    def content_lengths(self) -> np.ndarray:
+        """Character length of every stored chunk"""
+        
+        tail_lengths = np.fromiter(
+            (record['content_length'] for record in self._tail.values()),
+            dtype=np.int64,
+            count=len(self._tail)
+        )
+        base_lengths = self._base[0]['content_length'].astype(np.int64)
+        if self._removed:
+            base_lengths = base_lengths[~np.isin(self._base[1], list(self._removed))]
+        return np.concatenate([base_lengths, tail_lengths])
+    
+    def save(self, directory: str):
+        """Write base + tail as new files, then reopen them memory-mapped"""
+        
+        records = sorted(self.iter_records(), key=lambda record: record['faiss_id'])
+        rows = np.zeros(len(records), dtype=DOC_COLUMNS)
+        text_chunks, meta_chunks = [], []
+        text_offset = meta_offset = 0
+        
+        for row, record in enumerate(records):
+            text_bytes = record['content'].encode('utf-8')
+            meta_bytes = json.dumps(
+                {
+                    'id': record['id'],
+                    'metadata': record['metadata'],
+                    'content_digest': record.get('content_digest') or content_digest(record['content'])
+                },
+                ensure_ascii=False
+            ).encode('utf-8')
+            
+            rows[row] = (
+                record['faiss_id'],
+                text_offset, len(text_bytes),
+                meta_offset, len(meta_bytes),
+                record['content_length'],
+                record['added_at'],
+                record['content_hash']
+            )
+            text_chunks.append(text_bytes)
+            meta_chunks.append(meta_bytes)
+            text_offset += len(text_bytes)
+            meta_offset += len(meta_bytes)
+        
+        # Vectors are only written when every row has one (stores migrated from pickle have none)
+        vectors, found = self.get_vectors(rows['id'])
+        if not found.all():
+            vectors = None
+        
+        # Write then rename, so workers that mapped the previous files keep valid mappings
+        paths = self.file_paths(directory, self.collection_name)
+        tmp_paths = {key: unique_tmp_path(path) for key, path in paths.items()}
+        with open(tmp_paths['text'], 'wb') as f:
+            f.write(b''.join(text_chunks))
+        with open(tmp_paths['meta'], 'wb') as f:
+            f.write(b''.join(meta_chunks))
+        if vectors is not None:
+            with open(tmp_paths['vectors'], 'wb') as f:
+                np.save(f, vectors)
+        with open(tmp_paths['docs'], 'wb') as f:
+            np.save(f, rows)
+        
+        # The docs file is renamed last: it is what load() looks for
+        for key in ('text', 'meta', 'vectors', 'docs'):
+            if key == 'vectors' and vectors is None:
+                if os.path.exists(paths[key]):
+                    os.remove(paths[key])
+                continue
+            os.replace(tmp_paths[key], paths[key])
+        
+        self._open(directory)
+    
+    def _open(self, directory: str):
+        """Map the on-disk base and drop the in-memory tail"""
+        
+        paths = self.file_paths(directory, self.collection_name)
+        
+        try:
+            rows = np.load(paths['docs'], mmap_mode='r')
+        except ValueError:
+            rows = np.load(paths['docs'])  # Empty arrays cannot be mapped
+        text = self._map_file(paths['text'])
+        meta_blob = self._map_file(paths['meta'])
+        
+        vectors = None
+        if os.path.exists(paths['vectors']):
+            try:
+                vectors = np.load(paths['vectors'], mmap_mode='r')
+            except ValueError:
+                vectors = np.load(paths['vectors'])
+            if len(vectors) != len(rows):
+                vectors = None  # Left over from a save that could not write vectors
+        
+        # Previous mappings are released when no reader references them any more
+        self._base = (rows, np.ascontiguousarray(rows['id']), text, meta_blob, vectors)
+        self._files = [blob for blob in (text, meta_blob) if isinstance(blob, mmap.mmap)]
+        self._tail = {}
+        self._tail_vectors = {}
+        self._removed = set()
+    
+    @staticmethod
+    def _map_file(path: str):
+        """Memory-map a blob file read-only"""
+        
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def close(self):
+        """Release memory-mapped blobs"""
+        
+        for blob in self._files:
+            try:
+                blob.close()
+            except BufferError:
+                pass  # Still referenced by a materialized slice; freed when collected
+        self._files = []
+    
+    @staticmethod
+    def file_paths(directory: str, collection_name: str) -> Dict[str, str]:
+        return {
+            'docs': os.path.join(directory, f"{collection_name}_docs.npy"),
+            'text': os.path.join(directory, f"{collection_name}_text.bin"),
+            'meta': os.path.join(directory, f"{collection_name}_meta.bin"),
+            'vectors': os.path.join(directory, f"{collection_name}_vectors.npy")
+        }
+    
+    @classmethod
+    def exists(cls, directory: str, collection_name: str) -> bool:
+        return os.path.exists(cls.file_paths(directory, collection_name)['docs'])
+    
+    @classmethod
+    def load(cls, directory: str, collection_name: str) -> 'DocumentStore':
+        store = cls(collection_name)
+        store._open(directory)
+        return store
+    
+    @classmethod
+    def from_records(
+        cls,
+        collection_name: str,
+        records: List[Dict[str, Any]],
+        vectors: Optional[np.ndarray] = None
+    ) -> 'DocumentStore':
+        store = cls(collection_name)
+        store.append(records, vectors)
+        return store
+
+
+class MetadataIndex:
+    """Inverted index from chunk metadata values to FAISS ids, used to pre-filter searches"""
+    
+    # Record-level fields a filter can match besides chunk metadata; only 'collection' is indexed
+    RECORD_FIELDS = ('id', 'faiss_id', 'content', 'metadata', 'added_at', 'content_length', 'content_hash')
+    
+    def __init__(self):
+        self._postings: Dict[str, Dict[Any, List[int]]] = {}
+        self._arrays: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._unindexable_keys = set()
+    
+    @classmethod
+    def from_records(cls, records) -> 'MetadataIndex':
+        metadata_index = cls()
+        metadata_index.add(records)
+        return metadata_index
+    
+    def add(self, records):
+        """Index the effective filter value of every metadata key (metadata first, then record)"""
+        
+        for record in records:
+            values = dict(record.get('metadata') or {})
+            if values.get('collection') is None:
+                values['collection'] = record.get('collection')
+            
+            for key, value in values.items():
+                if value is None:
+                    continue
+                try:
+                    self._postings.setdefault(key, {}).setdefault(value, []).append(record['faiss_id'])
+                    self._arrays.pop((key, value), None)
+                except TypeError:
+                    self._unindexable_keys.add(key)  # e.g. list values: leave to post-filtering
+    
+    def remove(self, faiss_ids):
+        """Drop ids from every posting list"""
+        
+        removed = set(np.asarray(faiss_ids, dtype=np.int64).tolist())
+        if not removed:
+            return
+        
+        for key, values in self._postings.items():
+            for value in list(values):
+                ids = [faiss_id for faiss_id in values[value] if faiss_id not in removed]
+                if len(ids) == len(values[value]):
+                    continue
+                if ids:
+                    values[value] = ids
+                else:
+                    del values[value]
+                self._arrays.pop((key, value), None)
+    
+    def ids_for(self, key: str, value: Any) -> np.ndarray:
+        """Sorted ids whose key has exactly this value (no substring matching)"""
+        
+        if value not in self._postings.get(key, {}):
+            return np.zeros(0, dtype=np.int64)
+        return self._ids(key, value)
+    
+    def _ids(self, key: str, value: Any) -> np.ndarray:
+        ids = self._arrays.get((key, value))
+        if ids is None:
+            ids = np.unique(np.asarray(self._postings[key][value], dtype=np.int64))
+            self._arrays[(key, value)] = ids
+        return ids
+    
+    @staticmethod
+    def _value_matches(filter_value: Any, stored_value: Any) -> bool:
+        """Same matching rule as FAISSCollectionManager._matches_filter"""
+        
+        if isinstance(filter_value, str) and isinstance(stored_value, str):
+            return filter_value.lower() in stored_value.lower()
+        return stored_value == filter_value
+    
+    def resolve(self, context_filter: Optional[Dict]) -> Tuple[Optional[np.ndarray], Dict]:
+        """Turn a filter into sorted allowed ids (None = unconstrained) plus the keys left to post-filter"""
+        
+        allowed = None
+        residual = {}
+        
+        for key, filter_value in (context_filter or {}).items():
+            if filter_value is None:
+                continue
+            if key in self.RECORD_FIELDS or key in self._unindexable_keys:
+                residual[key] = filter_value
+                continue
+            
+            # Substring matching against the few distinct values of a key, then union their ids
+            matches = [
+                self._ids(key, stored_value)
+                for stored_value in self._postings.get(key, {})
+                if self._value_matches(filter_value, stored_value)
+            ]
+            key_ids = np.unique(np.concatenate(matches)) if matches else np.zeros(0, dtype=np.int64)
+            allowed = key_ids if allowed is None else np.intersect1d(allowed, key_ids, assume_unique=True)
+        
+        return allowed, residual
+
+
+class ContentDigestIndex:
+    """Chunk key -> (FAISS id, content digest), so re-ingestion skips unchanged chunks and replaces changed ones"""
+    
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, str]] = {}
+        self._keys: Dict[int, str] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @classmethod
+    def from_records(cls, records) -> 'ContentDigestIndex':
+        digest_index = cls()
+        digest_index.add(records)
+        return digest_index
+    
+    def add(self, records):
+        """Index records by chunk key; a later record for the same key supersedes the earlier one"""
+        
+        for record in records:
+            digest = record.get('content_digest') or content_digest(record['content'])
+            key = chunk_key(record.get('metadata'), digest)
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._keys.pop(previous[0], None)
+            self._entries[key] = (record['faiss_id'], digest)
+            self._keys[record['faiss_id']] = key
+    
+    def remove(self, faiss_ids):
+        for faiss_id in np.asarray(faiss_ids, dtype=np.int64).tolist():
+            key = self._keys.pop(faiss_id, None)
+            if key is not None and self._entries.get(key, (None,))[0] == faiss_id:
+                del self._entries[key]
+    
+    def get(self, key: str) -> Optional[Tuple[int, str]]:
+        return self._entries.get(key)
+
+
+def unique_tmp_path(path: str) -> str:
+    """Temporary name to write path under before os.replace, never shared by two writers"""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+class FileLock:
+    """Exclusive advisory lock (flock) on a file, shared by the worker processes of one base path
+    
+    Reentrant within a process: nested holders share it, it only excludes other processes.
+    Acquiring blocks until the other process releases it.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+    
+    @classmethod
+    def for_collection(cls, directory: str, collection_name: str) -> "FileLock":
+        return cls(os.path.join(directory, f"{collection_name}.lock"))
+    
+    def acquire(self):
+        if self._depth == 0 and fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            self._fd = fd
+        self._depth += 1
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+    
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class DeltaLog:
+    """Append-only, checksummed log of document changes not yet compacted into the base files
+    
+    Frame: <json length u32, vector length u32, crc32 u32> + JSON entry + float32 vector bytes.
+    A torn frame at the end (crash mid-append) is dropped on read.
+    """
+    
+    FRAME_HEADER = struct.Struct('<III')
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.entry_count = 0
+    
+    def append(self, entries: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None):
+        """Durably append entries (with optional row-aligned vectors) as one write"""
+        
+        frames = []
+        for position, entry in enumerate(entries):
+            payload = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+            vector_bytes = b''
+            if vectors is not None:
+                vector_bytes = np.ascontiguousarray(vectors[position], dtype=np.float32).tobytes()
+            crc = zlib.crc32(payload + vector_bytes)
+            frames.append(self.FRAME_HEADER.pack(len(payload), len(vector_bytes), crc) + payload + vector_bytes)
+        
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(frames))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entry_count += len(entries)
+    
+    def read(self) -> List[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+        """All complete entries in order; truncates a torn or corrupt tail"""
+        
+        if not os.path.exists(self.path):
+            self.entry_count = 0
+            return []
+        
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        
+        entries = []
+        offset = 0
+        header_size = self.FRAME_HEADER.size
+        while offset + header_size <= len(data):
+            payload_length, vector_length, crc = self.FRAME_HEADER.unpack_from(data, offset)
+            end = offset + header_size + payload_length + vector_length
+            body = data[offset + header_size:end]
+            if end > len(data) or zlib.crc32(body) != crc:
+                break
+            
+            entry = json.loads(body[:payload_length].decode('utf-8'))
+            vector = np.frombuffer(body[payload_length:], dtype=np.float32) if vector_length else None
+            entries.append((entry, vector))
+            offset = end
+        
+        if offset < len(data):
+            logger.warning(f"Dropping {len(data) - offset} bytes of incomplete delta log {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        
+        self.entry_count = len(entries)
+        return entries
+    
+    def reset(self):
+        """Empty the log once its entries are part of the base files"""
+        
+        if os.path.exists(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+        self.entry_count = 0
+
+
+def migrate_pickle_store(
+    directory: str,
+    collection_name: str,
+    stored_ids: Optional[np.ndarray] = None
+) -> Optional[DocumentStore]:
+    """Convert a legacy {name}_metadata.pkl into a DocumentStore and save it"""
+    
+    pickle_path = os.path.join(directory, f"{collection_name}_metadata.pkl")
+    if not os.path.exists(pickle_path):
+        return None
+    
+    with open(pickle_path, 'rb') as f:
+        metadata_store = pickle.load(f)
+    
+    # Collections written before stable ids carry no 'faiss_id' in their metadata.
+    # Their ids were salted hashes that cannot be recomputed, but IndexIDMap2 keeps
+    # them in insertion order, which is also the insertion order of metadata_store.
+    legacy = [meta for meta in metadata_store.values() if 'faiss_id' not in meta]
+    if legacy:
+        if stored_ids is None:
+            stored_ids = _read_index_ids(directory, collection_name)
+        if stored_ids is not None and len(stored_ids) == len(metadata_store):
+            for stored_id, metadata in zip(stored_ids, metadata_store.values()):
+                metadata['faiss_id'] = int(stored_id)
+            logger.info(f"Migrated {len(legacy)} legacy ids for {collection_name}")
+        else:
+            logger.warning(
+                f"Cannot migrate legacy ids for {collection_name}: "
+                f"{0 if stored_ids is None else len(stored_ids)} vectors vs {len(metadata_store)} metadata entries"
+            )
+    
+    records = [meta for meta in metadata_store.values() if 'faiss_id' in meta]
+    store = DocumentStore.from_records(collection_name, records)
+    store.save(directory)
+    
+    logger.info(f"Migrated {len(records)} documents of {collection_name} from pickle to columnar store")
+    return store
+
+
+def _read_index_ids(directory: str, collection_name: str) -> Optional[np.ndarray]:
+    """External ids of a saved IndexIDMap2, in insertion order"""
+    
+    import faiss
+    
+    index_path = os.path.join(directory, f"{collection_name}.index")
+    if not os.path.exists(index_path):
+        return None
+    
+    index = faiss.read_index(index_path)
+    return faiss.vector_to_array(index.id_map)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document store maintenance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    migrate_parser = subparsers.add_parser('migrate', help="Convert *_metadata.pkl files to the columnar store")
+    migrate_parser.add_argument('--base-path', default="./data/faiss_indices")
+    migrate_parser.add_argument('--force', action='store_true', help="Re-migrate collections already converted")
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    suffix = "_metadata.pkl"
+    for filename in sorted(os.listdir(args.base_path)):
+        if not filename.endswith(suffix):
+            continue
+        
+        collection_name = filename[:-len(suffix)]
+        if DocumentStore.exists(args.base_path, collection_name) and not args.force:
+            logger.info(f"Skipping {collection_name}: already migrated")
+            continue
+        
+        with FileLock.for_collection(args.base_path, collection_name):
+            migrate_pickle_store(args.base_path, collection_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#engines/embedding_backends.py
+"""
+Embedding Backends - Pluggable CPU encoders for the FAISS collections
+
+Usage:
+    python -m engines.embedding_backends export --output ./data/onnx/minilm-int8
+    python -m engines.embedding_backends compare --onnx-dir ./data/onnx/minilm-int8
+"""
+import os
+import abc
+import json
+import time
+import argparse
+import logging
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# Representative chat traffic used by the parity/latency check when no texts are given
+SAMPLE_TEXTS = [
+    "Sản phẩm A có những tính năng gì?",
+    "Giá gói doanh nghiệp của sản phẩm B là bao nhiêu?",
+    "Chính sách bảo hành và đổi trả như thế nào?",
+    "Làm sao để liên hệ bộ phận hỗ trợ khách hàng?",
+    "How do I reset my password?",
+    "pricing plans",
+    "hotline hỗ trợ",
+    "Tôi muốn so sánh tính năng bảo mật giữa sản phẩm A và sản phẩm B trước khi đăng ký gói năm."
+]
+
+
+class EmbeddingBackend(abc.ABC):
+    """Interface for embedding encoders used by FAISSCollectionManager"""
+    
+    name = 'base'
+    dimension = 384
+    
+    @abc.abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into an (n, dimension) float32 matrix (not normalized)"""
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """PyTorch fp32 SentenceTransformer encoder"""
+    
+    name = 'sentence_transformer'
+    
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = SentenceTransformer(
+            model_name,
+            device='cpu'  # Use CPU for better stability in production
+        )
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            batch_size=len(texts)
+        )
+
+
+class OnnxInt8Backend(EmbeddingBackend):
+    """int8-quantised ONNX Runtime encoder exported from the same SentenceTransformer model"""
+    
+    name = 'onnx_int8'
+    
+    def __init__(self, model_dir: str, intra_op_threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("onnx_int8 embedding backend requires onnxruntime and transformers") from e
+        
+        with open(os.path.join(model_dir, 'backend.json'), 'r', encoding='utf-8') as f:
+            backend_config = json.load(f)
+        
+        self.dimension = backend_config['dimension']
+        self.max_seq_length = backend_config['max_seq_length']
+        
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            session_options.intra_op_num_threads = intra_op_threads
+        
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, 'model_int8.onnx'),
+            session_options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors='np'
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+        
+        # Mean pooling over real tokens, matching the SentenceTransformer pooling layer
+        mask = encoded['attention_mask'][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return (summed / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+
+def create_embedding_backend(
+    backend: str,
+    model_name: str = DEFAULT_MODEL_NAME,
+    onnx_model_dir: Optional[str] = None
+) -> EmbeddingBackend:
+    """Build an embedding backend by name"""
+    
+    if backend == SentenceTransformerBackend.name:
+        return SentenceTransformerBackend(model_name)
+    elif backend == OnnxInt8Backend.name:
+        if not onnx_model_dir:
+            raise ValueError("onnx_int8 embedding backend requires onnx_model_dir")
+        return OnnxInt8Backend(onnx_model_dir)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def export_onnx_int8(model_name: str, output_dir: str, opset_version: int = 14) -> str:
+    """Export the SentenceTransformer transformer to ONNX and quantise its weights to int8"""
+    
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, 'model_fp32.onnx')
+    int8_path = os.path.join(output_dir, 'model_int8.onnx')
+    
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0].auto_model.eval()
+    
+    class TokenEmbeddings(torch.nn.Module):
+        """Expose only last_hidden_state so the graph has a single output"""
+        
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+        
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+    
+    dummy = st_model.tokenizer(["xin chào"], return_tensors='pt')
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            (dummy['input_ids'], dummy['attention_mask']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'}
+            },
+            opset_version=opset_version
+        )
+    
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    
+    st_model.tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'backend.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'model_name': model_name,
+            'dimension': st_model.get_sentence_embedding_dimension(),
+            'max_seq_length': st_model.max_seq_length,
+            'quantization': 'dynamic_int8'
+        }, f, indent=2)
+    
+    logger.info(f"Exported int8 ONNX model to {int8_path}")
+    return int8_path
+
+
+def compare_backends(
+    reference: EmbeddingBackend,
+    candidate: EmbeddingBackend,
+    texts: List[str],
+    runs: int = 10
+) -> Dict[str, Any]:
+    """Parity (cosine vs reference) and latency comparison between two backends"""
+    
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    
+    def measure(backend: EmbeddingBackend) -> Dict[str, float]:
+        backend.encode(texts[:1])  # Warm-up
+        single, batch = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            backend.encode(texts[:1])
+            single.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            backend.encode(texts)
+            batch.append(time.perf_counter() - start)
+        return {
+            'single_ms_p50': float(np.median(single) * 1000),
+            'batch_ms_p50': float(np.median(batch) * 1000),
+            'batch_size': len(texts)
+        }
+    
+    reference_vectors = normalize(reference.encode(texts))
+    candidate_vectors = normalize(candidate.encode(texts))
+    cosines = (reference_vectors * candidate_vectors).sum(axis=1)
+    
+    # Do both backends rank the texts the same way against each other?
+    reference_ranking = np.argsort(-(reference_vectors @ reference_vectors.T), axis=1)[:, 1]
+    candidate_ranking = np.argsort(-(candidate_vectors @ candidate_vectors.T), axis=1)[:, 1]
+    
+    reference_latency = measure(reference)
+    candidate_latency = measure(candidate)
+    
+    return {
+        'parity': {
+            'cosine_min': float(cosines.min()),
+            'cosine_mean': float(cosines.mean()),
+            'nearest_neighbour_agreement': float((reference_ranking == candidate_ranking).mean()),
+            'parity_ok': bool(cosines.min() >= 0.98)
+        },
+        'latency': {
+            reference.name: reference_latency,
+            candidate.name: candidate_latency,
+            'batch_speedup': reference_latency['batch_ms_p50'] / max(candidate_latency['batch_ms_p50'], 1e-9),
+            'single_speedup': reference_latency['single_ms_p50'] / max(candidate_latency['single_ms_p50'], 1e-9)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and validate CPU embedding backends")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    export_parser = subparsers.add_parser('export', help="Export an int8 ONNX model")
+    export_parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    export_parser.add_argument('--output', required=True)
+    
+    compare_parser = subparsers.add_parser('compare', help="Parity and latency vs the fp32 model")
+    compare_parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    compare_parser.add_argument('--onnx-dir', required=True)
+    compare_parser.add_argument('--texts-file', help="UTF-8 file with one text per line")
+    compare_parser.add_argument('--runs', type=int, default=10)
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    if args.command == 'export':
+        export_onnx_int8(args.model, args.output)
+    else:
+        texts = SAMPLE_TEXTS
+        if args.texts_file:
+            with open(args.texts_file, 'r', encoding='utf-8') as f:
+                texts = [line.strip() for line in f if line.strip()]
+        
+        report = compare_backends(
+            SentenceTransformerBackend(args.model),
+            OnnxInt8Backend(args.onnx_dir),
+            texts,
+            runs=args.runs
+        )
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
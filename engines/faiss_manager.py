@@ -4,18 +4,35 @@ FAISS Collections Manager - Vector database management for document retrieval
 """
 import os
 import json
-import pickle
 import time
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Set, Tuple, Callable, Awaitable
 from dataclasses import dataclass
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+
+from .embedding_backends import EmbeddingBackend, create_embedding_backend
+from .document_store import (
+    DocumentStore, MetadataIndex, ContentDigestIndex, DeltaLog, FileLock, migrate_pickle_store,
+    content_digest, chunk_key, unique_tmp_path
+)
+from .lexical_index import BM25Index
+from .index_policy import IndexPolicy, index_type_of, compression_of, exact_rerank
+from .snapshots import SnapshotStore
 
 logger = logging.getLogger(__name__)
 
+# Search parameters (id selectors, nprobe, efSearch) are passed through the IndexIDMap2
+# wrapper of every collection; FAISS only forwards them from 1.8 on and raises before that
+MIN_FAISS_VERSION = (1, 8)
+if tuple(int(part) for part in faiss.__version__.split('.')[:2]) < MIN_FAISS_VERSION:
+    raise ImportError(f"faiss-cpu>=1.8.0 is required, found {faiss.__version__}")
+
 @dataclass
 class DocumentChunk:
     content: str
@@ -23,64 +40,425 @@ class DocumentChunk:
     embedding: Optional[np.ndarray] = None
 
 
+# Embedding backend owned by each worker process of the 'process' executor
+_process_embedding_backend: Optional[EmbeddingBackend] = None
+
+
+def _init_embedding_process(backend: str, model_name: str, onnx_model_dir: Optional[str]):
+    """Load the embedding backend once per executor process"""
+    global _process_embedding_backend
+    _process_embedding_backend = create_embedding_backend(backend, model_name, onnx_model_dir)
+
+
+def _encode_in_process(texts: List[str]) -> np.ndarray:
+    """Encode a batch inside an executor process"""
+    return _process_embedding_backend.encode(texts)
+
+
+def _init_search_thread(omp_threads: int):
+    """Cap the OpenMP threads of FAISS calls made from this search thread
+    
+    OpenMP thread counts are per calling thread, so each pool thread sets its own.
+    """
+    faiss.omp_set_num_threads(omp_threads)
+
+
+class ReadWriteLock:
+    """Many concurrent readers (FAISS searches) or one writer (index adds)"""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+    
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._condition:
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class EmbeddingBatcher:
+    """Micro-batching scheduler that coalesces concurrent encode requests into one model call"""
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        
+        # Only touched from the event loop thread, so no locking is needed
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_size = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+        
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'texts': 0,
+            'max_batch_seen': 0
+        }
+    
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Queue texts for the next batch and wait for their embeddings"""
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        self._pending.append((texts, future))
+        self._pending_size += len(texts)
+        self.stats['requests'] += 1
+        
+        # Flush on size, otherwise at most max_wait after the first queued request
+        if self._pending_size >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Hand the pending requests to the model as a single batch"""
+        
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        pending, self._pending = self._pending, []
+        self._pending_size = 0
+        if not pending:
+            return
+        
+        task = asyncio.get_running_loop().create_task(self._run_batch(pending))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+    
+    async def _run_batch(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        """Encode one coalesced batch and fan the vectors back out to the callers"""
+        
+        batch = [text for texts, _ in pending for text in texts]
+        self.stats['batches'] += 1
+        self.stats['texts'] += len(batch)
+        self.stats['max_batch_seen'] = max(self.stats['max_batch_seen'], len(batch))
+        
+        try:
+            vectors = await self.encode_fn(batch)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        offset = 0
+        for texts, future in pending:
+            if not future.done():  # Caller may have been cancelled meanwhile
+                future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        
+        stats = dict(self.stats)
+        stats['avg_batch_size'] = (stats['texts'] / stats['batches']) if stats['batches'] > 0 else 0.0
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000
+        
+        return stats
+
+
 class FAISSCollectionManager:
-    def __init__(self, base_path: str = "./data/faiss_indices"):
+    def __init__(
+        self,
+        base_path: str = "./data/faiss_indices",
+        embedding_executor: str = "thread",
+        embedding_workers: int = 2,
+        embedding_batch_size: int = 64,
+        embedding_batch_wait_ms: float = 5.0,
+        embedding_backend: str = "sentence_transformer",
+        onnx_model_dir: Optional[str] = None,
+        index_load_mode: str = "memory",
+        unified_index: bool = False,
+        index_latency_target_ms: float = 1.0,
+        ivf_nprobe: int = 16,
+        hnsw_ef_search: int = 64,
+        index_compression: Optional[str] = None,
+        delta_compaction_entries: int = 5000,
+        tombstone_compaction_ratio: float = 0.2,
+        near_duplicate_threshold: float = 0.95,
+        hybrid_search: bool = False,
+        rrf_k: int = 60,
+        lexical_min_score: float = 0.3,
+        mmr_lambda: Optional[float] = None,
+        search_workers: int = 4,
+        search_omp_threads: int = 1,
+        snapshot_watch_interval: float = 0.0,
+        snapshot_keep: int = 3
+    ):
         self.base_path = base_path
-        self.embedding_model = SentenceTransformer(
-            'paraphrase-multilingual-MiniLM-L12-v2',
-            device='cpu'  # Use CPU for better stability in production
-        )
+        
+        # 'mmap' maps the inverted lists of IVF index files read-only so uvicorn workers share
+        # page-cache pages; FAISS cannot map Flat or HNSW indexes, which each worker still reads.
+        # IndexPolicy keeps a collection Flat while a Flat search meets the latency target
+        # (~10k vectors at the default 1 ms; the shipped collections hold far fewer), so mmap
+        # mode only saves memory once a collection is built as IVF.
+        if index_load_mode not in ('memory', 'mmap'):
+            raise ValueError(f"Unknown index load mode: {index_load_mode}")
+        self.index_load_mode = index_load_mode
+        self.embedding_model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
+        self.embedding_backend_name = embedding_backend
+        self.onnx_model_dir = onnx_model_dir
         self.embedding_dim = 384  # MiniLM dimension
         
+        # Backend name is part of the model id: int8 vectors must not mix with fp32 ones in caches
+        self.embedding_model_id = f"{self.embedding_model_name}:{embedding_backend}"
+        
+        # The 'process' executor loads the backend in its workers, so skip the in-process copy
+        self.embedding_backend = None
+        if embedding_executor != 'process':
+            self.embedding_backend = create_embedding_backend(
+                embedding_backend, self.embedding_model_name, onnx_model_dir
+            )
+        
+        # Normalized embeddings of static refined queries, filled at startup
+        self.query_embedding_table: Dict[str, np.ndarray] = {}
+        
+        # Optional two-tier query embedding cache (utils.cache.EmbeddingCache)
+        self.embedding_cache = None
+        
+        # Optional mirror of indexed chunks in Postgres (utils.document_registry.DocumentRegistry)
+        self.document_registry = None
+        
+        # Optional final re-ranking stage (engines.cross_encoder.CrossEncoderReranker)
+        self.cross_encoder = None
+        
+        # Model inference runs off the event loop: 'thread' shares the backend above,
+        # 'process' loads a private copy of the backend in each worker process
+        self.embedding_executor = self._create_embedding_executor(embedding_executor, embedding_workers)
+        
+        # Coalesce encode calls from concurrent requests; a wait of 0 disables batching
+        self.embedding_batcher = None
+        if embedding_batch_wait_ms > 0:
+            self.embedding_batcher = EmbeddingBatcher(
+                self._encode_in_executor,
+                max_batch_size=embedding_batch_size,
+                max_wait_ms=embedding_batch_wait_ms
+            )
+        
+        # Per-collection FAISS searches fan out to this pool (FAISS releases the GIL) and are
+        # merged on the event loop; 0 workers searches inline. Each thread caps its OpenMP
+        # threads so several uvicorn workers do not oversubscribe the cores.
+        self.search_workers = search_workers
+        self.search_omp_threads = search_omp_threads
+        self.search_executor = None
+        if search_workers > 0:
+            self.search_executor = ThreadPoolExecutor(
+                max_workers=search_workers,
+                thread_name_prefix='faiss-search',
+                initializer=_init_search_thread,
+                initargs=(search_omp_threads,)
+            )
+        
+        # FAISS ids are int64: the high bits hold the collection's id_namespace,
+        # the low bits a per-collection sequence persisted with the collection
+        self.id_sequence_bits = 40
+        
+        # Collections with index_type 'auto' move Flat -> IVF -> HNSW as they grow,
+        # rebuilt in the background and swapped in once ready. index_compression ('sq8'
+        # or 'pq', overridable per collection with config['compression']) stores codes
+        # only; results are re-scored from the document store's float vectors.
+        self.index_policy = IndexPolicy(
+            latency_target_ms=index_latency_target_ms,
+            nprobe=ivf_nprobe,
+            ef_search=hnsw_ef_search,
+            compression=index_compression
+        )
+        
         # Collection definitions with Vietnamese content structure
         self.collection_configs = {
             'product_a_features': {
                 'description': 'Tính năng và đặc điểm của Sản phẩm A',
                 'keywords': ['product a', 'sản phẩm a', 'tính năng', 'feature', 'chức năng'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 1000,
-                'similarity_threshold': 0.7
+                'similarity_threshold': 0.7,
+                'id_namespace': 1,
+                'priority': 1.0
             },
             'product_a_pricing': {
                 'description': 'Giá cả và gói dịch vụ Sản phẩm A',
                 'keywords': ['product a', 'giá', 'pricing', 'cost', 'gói', 'plan', 'phí'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 200,
-                'similarity_threshold': 0.75
+                'similarity_threshold': 0.75,
+                'id_namespace': 2,
+                'priority': 1.1  # Pricing info slightly prioritized
             },
             'product_b_features': {
                 'description': 'Tính năng và đặc điểm của Sản phẩm B',
                 'keywords': ['product b', 'sản phẩm b', 'tính năng', 'feature', 'chức năng'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 1000,
-                'similarity_threshold': 0.7
+                'similarity_threshold': 0.7,
+                'id_namespace': 3,
+                'priority': 1.0
             },
             'product_b_pricing': {
                 'description': 'Giá cả và gói dịch vụ Sản phẩm B',
                 'keywords': ['product b', 'giá', 'pricing', 'cost', 'gói', 'plan', 'phí'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 200,
-                'similarity_threshold': 0.75
+                'similarity_threshold': 0.75,
+                'id_namespace': 4,
+                'priority': 1.1  # Pricing info slightly prioritized
             },
             'warranty_support': {
                 'description': 'Thông tin bảo hành và hỗ trợ khách hàng',
                 'keywords': ['bảo hành', 'warranty', 'support', 'hỗ trợ', 'khách hàng', 'service'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 500,
-                'similarity_threshold': 0.7
+                'similarity_threshold': 0.7,
+                'id_namespace': 5,
+                'priority': 0.9
             },
             'contact_company': {
                 'description': 'Thông tin liên hệ và về công ty',
                 'keywords': ['liên hệ', 'contact', 'company', 'công ty', 'địa chỉ', 'about'],
-                'index_type': 'flat',
+                'index_type': 'auto',
                 'max_docs': 100,
-                'similarity_threshold': 0.8
+                'similarity_threshold': 0.8,
+                'id_namespace': 6,
+                'priority': 0.8
             }
         }
         
+        # Adds are appended to a per-collection delta log; the base files are only
+        # rewritten once this many entries have accumulated (or on rebuild/migration)
+        self.delta_compaction_entries = delta_compaction_entries
+        
+        # Deleted and replaced documents are tombstoned (skipped by searches through an id
+        # selector) and only leave the index when a background rebuild compacts it, once
+        # tombstones make up this fraction of the indexed vectors
+        self.tombstone_compaction_ratio = tombstone_compaction_ratio
+        
+        # Published, immutable versions of the collection files. With a watch interval > 0
+        # this worker serves the CURRENT snapshot read-only and hot-swaps newer ones.
+        self.snapshots = SnapshotStore(os.path.join(base_path, 'snapshots'), keep=snapshot_keep)
+        self.snapshot_watch_interval = snapshot_watch_interval
+        self.snapshot_state = {'version': None, 'loaded_at': None, 'error': None}
+        self._snapshot_watcher = None
+        
         self.collections = {}
+        self.namespace_collections = {
+            config['id_namespace']: name for name, config in self.collection_configs.items()
+        }
+        
+        # Re-ranking weight of each collection, indexed by id namespace
+        self.collection_weights = self._namespace_weights({})
+        
+        # Results whose stored embedding has at least this cosine similarity to a higher-scoring
+        # result are dropped as near-duplicates (>= 1 keeps everything but exact duplicates)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        
+        # Hybrid mode fuses the FAISS ranking with a per-collection BM25 ranking by reciprocal
+        # rank (1 / (rrf_k + rank)), so exact plan names, prices and codes are not missed.
+        # BM25-only hits skip the similarity threshold but need at least lexical_min_score
+        # cosine (per collection: config['lexical_min_score']), so a shared term alone
+        # does not put an unrelated chunk at the top
+        self.hybrid_search = hybrid_search
+        self.rrf_k = rrf_k
+        self.lexical_min_score = lexical_min_score
+        
+        # With an MMR lambda (1 = pure relevance, 0 = pure diversity) searches return top_k
+        # results picked from the post-processed pool by maximal marginal relevance, so
+        # near-identical chunks of one page do not crowd out other information
+        self.mmr_lambda = mmr_lambda
+        
+        # Unified mode: one FAISS index over every collection, restricted per search with
+        # IDSelectorRange on the id namespace bits (the id itself records its collection).
+        # It trades memory for one search call: an exact Flat float32 copy of every vector in
+        # each worker, never persisted but rebuilt from the collection files on load and on
+        # snapshot swap. That copy would undo what mmap loading and compressed indexes save,
+        # so those combinations are refused.
+        if unified_index:
+            compressed = [
+                name for name, config in self.collection_configs.items()
+                if config.get('compression', index_compression) is not None
+            ]
+            if index_load_mode == 'mmap' or compressed:
+                raise ValueError(
+                    "unified_index keeps a float32 copy of every collection in memory and cannot be "
+                    f"combined with mmap loading or compressed indexes (compressed: {compressed})"
+                )
+        self.unified_index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedding_dim)) if unified_index else None
+        self.unified_index_lock = ReadWriteLock()
+        
         self._ensure_directories()
     
+    def _create_embedding_executor(self, executor_type: str, workers: int) -> Executor:
+        """Create the executor that runs embedding model inference"""
+        
+        if executor_type == 'thread':
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='embedding')
+        elif executor_type == 'process':
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),  # torch is not fork-safe
+                initializer=_init_embedding_process,
+                initargs=(self.embedding_backend_name, self.embedding_model_name, self.onnx_model_dir)
+            )
+        else:
+            raise ValueError(f"Unknown embedding executor: {executor_type}")
+    
+    def _encode_sync(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch with the in-process backend (runs on an executor thread)"""
+        return self.embedding_backend.encode(texts)
+    
+    async def _encode_in_executor(self, texts: List[str]) -> np.ndarray:
+        """Run model inference on the embedding executor without blocking the event loop"""
+        
+        loop = asyncio.get_running_loop()
+        if isinstance(self.embedding_executor, ProcessPoolExecutor):
+            return await loop.run_in_executor(self.embedding_executor, _encode_in_process, texts)
+        return await loop.run_in_executor(self.embedding_executor, self._encode_sync, texts)
+    
+    def set_embedding_cache(self, embedding_cache):
+        """Inject query embedding cache dependency"""
+        self.embedding_cache = embedding_cache
+    
+    def set_document_registry(self, document_registry):
+        """Inject document_metadata registry dependency"""
+        self.document_registry = document_registry
+    
+    def set_cross_encoder(self, cross_encoder):
+        """Inject cross-encoder re-ranker dependency"""
+        self.cross_encoder = cross_encoder
+    
     def _ensure_directories(self):
         """Ensure necessary directories exist"""
         os.makedirs(self.base_path, exist_ok=True)
@@ -104,41 +482,271 @@ class FAISSCollectionManager:
         """Create individual FAISS collection"""
         
         try:
-            # Create appropriate FAISS index
-            if config['index_type'] == 'flat':
-                # Use Inner Product for cosine similarity (normalized vectors)
-                index = faiss.IndexFlatIP(self.embedding_dim)
-            elif config['index_type'] == 'ivf':
-                # For larger datasets - IVF (Inverted File) index
-                quantizer = faiss.IndexFlatIP(self.embedding_dim)
-                n_centroids = min(100, max(10, config['max_docs'] // 10))
-                index = faiss.IndexIVFFlat(quantizer, self.embedding_dim, n_centroids)
-            else:
-                raise ValueError(f"Unknown index type: {config['index_type']}")
-            
-            # Wrap with ID mapping for document tracking
-            index_with_ids = faiss.IndexIDMap2(index)
-            
-            self.collections[name] = {
-                'index': index_with_ids,
-                'base_index': index,  # Keep reference to base index
-                'metadata_store': {},  # doc_id -> metadata mapping
-                'doc_count': 0,
-                'config': config,
-                'loaded': False,
-                'last_updated': time.time()
-            }
-            
+            self.collections[name] = self._new_collection_state(name, config, self.base_path)
+        
         except Exception as e:
             logger.error(f"Error creating collection {name}: {e}")
             raise
     
+    def _new_collection_state(self, name: str, config: Dict, directory: str) -> Dict:
+        """Empty in-memory state of a collection whose files live in directory"""
+        
+        index_with_ids, index = self._build_index(config)
+        
+        return {
+            'index': index_with_ids,
+            'base_index': index,  # Keep reference to base index
+            'doc_store': DocumentStore(name),  # FAISS int64 id -> document record
+            'metadata_index': MetadataIndex(),  # metadata value -> FAISS ids, for pre-filtering
+            'digest_index': ContentDigestIndex(),  # chunk key -> (FAISS id, content digest), for re-ingestion
+            'lexical_index': BM25Index(),  # BM25 over chunk text, for hybrid search
+            'delta_log': DeltaLog(os.path.join(directory, f"{name}_delta.log")),  # Uncompacted adds and removals
+            'file_lock': FileLock.for_collection(directory, name),  # Serializes file writes across workers
+            'tombstones': np.zeros(0, dtype=np.int64),  # Sorted ids still indexed but deleted
+            'tombstone_selector': None,  # IDSelectorNot over the tombstones (+ objects to keep alive), or None
+            'next_id': 0,  # Next sequence number for the id allocator
+            'doc_count': 0,
+            'config': config,
+            'loaded': False,
+            'read_only': False,  # True while the index is loaded with mmap flags (IVF lists mapped from disk)
+            'snapshot': None,  # Snapshot version this state was loaded from (never written to)
+            'rebuild_task': None,  # Background index retrain/rebuild, if one is running
+            'trained_vectors': 0,  # Vectors the index's centroids/quantizer were trained on
+            'index_lock': ReadWriteLock(),  # Adds and index swaps exclude searches running on the search pool
+            'last_updated': time.time()
+        }
+    
+    def _build_index(self, config: Dict, vectors: Optional[np.ndarray] = None) -> Tuple[faiss.Index, faiss.Index]:
+        """Create an empty FAISS index for a collection config, wrapped with ID mapping
+        
+        The index type comes from the policy for len(vectors); IVF is trained on them.
+        """
+        
+        num_vectors = len(vectors) if vectors is not None else 0
+        index_type = self.index_policy.choose(config, num_vectors)
+        compression = self.index_policy.choose_compression(config, num_vectors)
+        index = self.index_policy.build(index_type, self.embedding_dim, vectors, compression)
+        
+        # Wrap with ID mapping for document tracking
+        return faiss.IndexIDMap2(index), index
+    
+    def _export_vectors(self, collection: Dict, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, vectors) of a collection's live (non-tombstoned) vectors in insertion order, from position start"""
+        
+        index = collection['index']
+        ids = faiss.vector_to_array(index.id_map)[start:].astype(np.int64)
+        live = ~np.isin(ids, collection['tombstones'])
+        if not live.any():
+            return ids[live], np.zeros((0, self.embedding_dim), dtype=np.float32)
+        
+        # Stored float vectors are exact; compressed codes only reconstruct approximations
+        stored_vectors, found = collection['doc_store'].get_vectors(ids[live])
+        if stored_vectors is not None and found.all():
+            return ids[live], stored_vectors
+        
+        base_index = collection['base_index']
+        ivf_index = faiss.try_extract_index_ivf(base_index)
+        if ivf_index is not None:
+            ivf_index.make_direct_map()  # IVF lists need a direct map to reconstruct by position
+        
+        return ids[live], base_index.reconstruct_n(start, base_index.ntotal - start)[live]
+    
+    def _build_filled_index(self, config: Dict, ids: np.ndarray, vectors: np.ndarray) -> Tuple[faiss.Index, faiss.Index]:
+        """Build a policy-chosen index holding the given vectors (safe to run off the event loop)"""
+        
+        index_with_ids, index = self._build_index(config, vectors)
+        if len(ids):
+            index_with_ids.add_with_ids(vectors, ids)
+        return index_with_ids, index
+    
+    def _rebuild_collection_index(self, collection_name: str, ids: np.ndarray, vectors: np.ndarray):
+        """Replace a collection's index with a fresh one holding the given vectors"""
+        
+        collection = self.collections[collection_name]
+        index_with_ids, index = self._build_filled_index(collection['config'], ids, vectors)
+        
+        self._swap_index(collection, index_with_ids, index)
+        collection['trained_vectors'] = len(vectors)
+        self._prune_tombstones(collection)
+    
+    @staticmethod
+    def _swap_index(collection: Dict, index_with_ids: faiss.Index, index: faiss.Index, read_only: bool = False):
+        """Replace a collection's index and base index together, so no pool search sees one without the other"""
+        
+        with collection['index_lock'].write():
+            collection['index'] = index_with_ids
+            collection['base_index'] = index
+            collection['read_only'] = read_only
+    
+    def _schedule_index_rebuild(self, collection_name: str):
+        """Start a background rebuild when the live index no longer fits the policy"""
+        
+        collection = self.collections[collection_name]
+        if collection['rebuild_task'] is not None and not collection['rebuild_task'].done():
+            return
+        outgrown = self.index_policy.needs_rebuild(
+            collection['config'], collection['base_index'], self._live_count(collection), collection['trained_vectors']
+        )
+        if not outgrown and not self._needs_compaction(collection):
+            return
+        
+        collection['rebuild_task'] = asyncio.create_task(self._rebuild_index_in_background(collection_name))
+    
+    async def _rebuild_index_in_background(self, collection_name: str):
+        """Train and fill a new index on a worker thread, then swap it in atomically"""
+        
+        collection = self.collections[collection_name]
+        old_type = index_type_of(collection['base_index'])
+        
+        try:
+            start = time.time()
+            exported_count = collection['index'].ntotal
+            ids, vectors = self._export_vectors(collection)
+            
+            loop = asyncio.get_running_loop()
+            index_with_ids, index = await loop.run_in_executor(
+                None, self._build_filled_index, collection['config'], ids, vectors
+            )
+            
+            # Replay vectors added while building and swap, with no await in between. Tombstoned
+            # vectors were left out; ids tombstoned meanwhile stay tombstoned in the new index.
+            new_ids, new_vectors = self._export_vectors(collection, start=exported_count)
+            if len(new_ids):
+                index_with_ids.add_with_ids(new_vectors, new_ids)
+            self._swap_index(collection, index_with_ids, index)
+            collection['trained_vectors'] = len(vectors)
+            self._prune_tombstones(collection)
+            if self.unified_index is not None:
+                self._register_in_unified_index(collection_name)
+            
+            await self._save_collection(collection_name)
+            logger.info(
+                f"Rebuilt {collection_name} index {old_type} -> {index_type_of(index)} "
+                f"({index_with_ids.ntotal} vectors, {time.time() - start:.1f}s)"
+            )
+        
+        except Exception as e:
+            logger.error(f"Background index rebuild failed for {collection_name}: {e}")
+    
+    async def _migrate_legacy_ids(self, collection_name: str):
+        """Re-key vectors whose ids predate namespaced ids so every id names its collection"""
+        
+        collection = self.collections[collection_name]
+        namespace = collection['config']['id_namespace']
+        ids, vectors = self._export_vectors(collection)
+        
+        if not len(ids) or np.all((ids >> self.id_sequence_bits) == namespace):
+            return
+        
+        doc_store = collection['doc_store']
+        new_ids = np.empty_like(ids)
+        records = []
+        positions = []
+        for position, old_id in enumerate(ids.tolist()):
+            new_ids[position] = self._allocate_id(collection)
+            record = doc_store.get(old_id)
+            if record is not None:
+                records.append({**record, 'faiss_id': int(new_ids[position])})
+                positions.append(position)
+        
+        self._rebuild_collection_index(collection_name, new_ids, vectors)
+        collection['doc_store'] = DocumentStore.from_records(collection_name, records, vectors[positions])
+        await self._save_collection(collection_name)
+        
+        logger.info(f"Re-keyed {len(ids)} legacy ids of {collection_name} into namespace {namespace}")
+    
+    async def _backfill_vectors(self, collection_name: str):
+        """Copy float vectors from an uncompressed index into a document store saved without them"""
+        
+        collection = self.collections[collection_name]
+        if compression_of(collection['base_index']) is not None:
+            return
+        
+        ids, vectors = self._export_vectors(collection)
+        _, found = collection['doc_store'].get_vectors(ids)
+        if found.all():
+            return
+        
+        collection['doc_store'].put_vectors(ids[~found], vectors[~found])
+        if not collection['read_only']:
+            await self._save_collection(collection_name)
+        logger.info(f"Stored {int((~found).sum())} float vectors for {collection_name}")
+    
+    def _namespace_selector(self, collection_names: List[str]) -> Tuple[faiss.IDSelector, List]:
+        """IDSelector matching the id ranges of the given collections (plus objects to keep alive)"""
+        
+        keep_alive = []
+        selector = None
+        for name in collection_names:
+            namespace = self.collection_configs[name]['id_namespace']
+            range_selector = faiss.IDSelectorRange(
+                namespace << self.id_sequence_bits,
+                (namespace + 1) << self.id_sequence_bits
+            )
+            keep_alive.append(range_selector)
+            if selector is None:
+                selector = range_selector
+            else:
+                selector = faiss.IDSelectorOr(selector, range_selector)
+                keep_alive.append(selector)
+        
+        return selector, keep_alive
+    
+    def _register_in_unified_index(self, collection_name: str):
+        """(Re)load one collection's vectors into the unified index"""
+        
+        selector, _ = self._namespace_selector([collection_name])
+        ids, vectors = self._export_vectors(self.collections[collection_name])
+        
+        with self.unified_index_lock.write():
+            self.unified_index.remove_ids(selector)
+            if len(ids):
+                self.unified_index.add_with_ids(vectors, ids)
+    
+    def _select_changed_documents(
+        self,
+        collection_name: str,
+        documents: List[DocumentChunk]
+    ) -> Tuple[List[int], List[str], List[Optional[int]]]:
+        """Positions of documents that are new or changed, with their digests and the FAISS ids they replace
+        
+        Chunks whose key already maps to the same content digest are skipped; within the
+        batch the last document for a key wins.
+        """
+        
+        digest_index = self.collections[collection_name]['digest_index']
+        digests = []
+        latest = {}
+        for position, doc in enumerate(documents):
+            digest = content_digest(doc.content)
+            digests.append(digest)
+            latest[chunk_key(doc.metadata, digest)] = position
+        
+        positions, replaced_ids = [], []
+        for key, position in sorted(latest.items(), key=lambda item: item[1]):
+            existing = digest_index.get(key)
+            if existing is not None and existing[1] == digests[position]:
+                continue
+            positions.append(position)
+            replaced_ids.append(existing[0] if existing is not None else None)
+        
+        return positions, [digests[position] for position in positions], replaced_ids
+    
     async def add_documents_to_collection(
         self, 
         collection_name: str, 
-        documents: List[DocumentChunk]
+        documents: List[DocumentChunk],
+        embeddings: Optional[np.ndarray] = None,
+        changes: Optional[Tuple[List[int], List[str], List[Optional[int]]]] = None
     ) -> int:
-        """Add documents to specific collection with batch processing"""
+        """Add documents to specific collection with batch processing
+        
+        embeddings may be precomputed (row-aligned with documents), e.g. by the ingestion pipeline.
+        Re-ingestion is idempotent: unchanged chunks are skipped before embedding and changed
+        ones replace the chunk stored under the same key (source + chunk_index, else content).
+        changes is the _select_changed_documents result for documents when the caller already
+        selected them (the pipeline does, to embed changed chunks only).
+        """
         
         if collection_name not in self.collections:
             raise ValueError(f"Collection {collection_name} not found")
@@ -150,18 +758,34 @@ class FAISSCollectionManager:
         collection = self.collections[collection_name]
         logger.info(f"Adding {len(documents)} documents to collection {collection_name}")
         
+        # Memory-mapped indexes cannot grow in place
+        self._ensure_writable(collection_name)
+        
         try:
+            if changes is None:
+                changes = self._select_changed_documents(collection_name, documents)
+            positions, digests, replaced_ids = changes
+            if len(positions) < len(documents):
+                logger.info(f"Skipping {len(documents) - len(positions)} unchanged documents in {collection_name}")
+            if not positions:
+                return 0
+            
+            documents = [documents[position] for position in positions]
+            
             # Generate embeddings in batches for efficiency
-            texts = [doc.content for doc in documents]
-            embeddings = await self._generate_embeddings_batch(texts, batch_size=32)
+            if embeddings is None:
+                texts = [doc.content for doc in documents]
+                embeddings = await self._generate_embeddings_batch(texts, batch_size=32)
+            else:
+                embeddings = np.asarray(embeddings)[positions]
             
             # Prepare data for FAISS
             doc_ids = []
             embedding_matrix = []
+            records = []
+            superseded_ids = []
             
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                doc_id = f"{collection_name}_{collection['doc_count'] + i}_{int(time.time())}"
-                
+            for i, (doc, embedding, digest) in enumerate(zip(documents, embeddings, digests)):
                 # Normalize embedding for cosine similarity
                 embedding_norm = np.linalg.norm(embedding)
                 if embedding_norm > 0:
@@ -170,171 +794,811 @@ class FAISSCollectionManager:
                     logger.warning(f"Zero embedding for document in {collection_name}")
                     continue
                 
+                doc_id_int = self._allocate_id(collection)
+                doc_id = f"{collection_name}_{doc_id_int & ((1 << self.id_sequence_bits) - 1)}_{int(time.time())}"
+                
                 # Store metadata with additional information
-                collection['metadata_store'][doc_id] = {
+                metadata = {
                     'id': doc_id,
+                    'faiss_id': doc_id_int,
                     'content': doc.content,
                     'metadata': doc.metadata,
                     'collection': collection_name,
                     'added_at': time.time(),
                     'content_length': len(doc.content),
-                    'content_hash': hash(doc.content) % (2**32)  # For deduplication
+                    'content_hash': int(digest[:8], 16),  # Stable across processes, unlike hash()
+                    'content_digest': digest
                 }
+                records.append(metadata)
+                if replaced_ids[i] is not None:
+                    superseded_ids.append(replaced_ids[i])
                 
-                # Convert doc_id to integer for FAISS (use hash)
-                doc_id_int = abs(hash(doc_id)) % (2**63)  # Ensure positive int64
                 doc_ids.append(doc_id_int)
                 embedding_matrix.append(normalized_embedding)
             
             # Add to FAISS index
+            removed_records = []
             if embedding_matrix:
                 embedding_matrix = np.array(embedding_matrix, dtype=np.float32)
                 doc_ids_array = np.array(doc_ids, dtype=np.int64)
                 
-                # Train index if necessary (for IVF)
-                if hasattr(collection['base_index'], 'is_trained') and not collection['base_index'].is_trained:
-                    if embedding_matrix.shape[0] >= collection['base_index'].nlist:
-                        collection['base_index'].train(embedding_matrix)
-                        logger.info(f"Trained IVF index for collection {collection_name}")
-                    else:
-                        logger.warning(f"Not enough data to train IVF index for {collection_name}")
+                # The delta log is the durable copy until the next compaction
+                collection['delta_log'].append([{'op': 'add', 'record': record} for record in records], embedding_matrix)
+                
+                with collection['index_lock'].write():
+                    collection['index'].add_with_ids(embedding_matrix, doc_ids_array)
+                collection['doc_store'].append(records, embedding_matrix)
+                collection['metadata_index'].add(records)
+                collection['digest_index'].add(records)
+                collection['lexical_index'].add(records)
+                if self.unified_index is not None:
+                    with self.unified_index_lock.write():
+                        self.unified_index.add_with_ids(embedding_matrix, doc_ids_array)
                 
-                collection['index'].add_with_ids(embedding_matrix, doc_ids_array)
-                collection['doc_count'] += len(embedding_matrix)
+                # Changed chunks replace their previous version only once the new one is searchable
+                removed_records = self._remove_documents(collection_name, superseded_ids)
+                
+                collection['doc_count'] = self._live_count(collection)
                 collection['last_updated'] = time.time()
                 
-                logger.info(f"Added {len(embedding_matrix)} documents to {collection_name}")
+                logger.info(
+                    f"Added {len(embedding_matrix)} documents to {collection_name} "
+                    f"({len(removed_records)} replaced)"
+                )
+            
+            if self.document_registry is not None:
+                await self.document_registry.sync(
+                    collection_name, records, [record['id'] for record in removed_records], self.embedding_model_id
+                )
+            
+            # Fold the delta log into the base files once it has grown large enough
+            if collection['delta_log'].entry_count >= self.delta_compaction_entries:
+                await self._save_collection(collection_name)
+            
+            # Growth may call for a bigger index type or IVF retraining
+            self._schedule_index_rebuild(collection_name)
+            
+            return len(embedding_matrix)
+        
+        except Exception as e:
+            logger.error(f"Error adding documents to {collection_name}: {e}")
+            raise
+    
+    def _remove_documents(self, collection_name: str, faiss_ids: List[int]) -> List[Dict]:
+        """Tombstone documents: searches skip them at once, their vectors leave the index at the next compaction
+        
+        Returns the removed records.
+        """
+        
+        collection = self.collections[collection_name]
+        ids = np.unique(np.asarray(faiss_ids, dtype=np.int64))
+        records = [record for record in map(collection['doc_store'].get, ids.tolist()) if record is not None]
+        if not records:
+            return []
+        
+        ids = np.array([record['faiss_id'] for record in records], dtype=np.int64)
+        collection['delta_log'].append([{'op': 'remove', 'faiss_id': int(faiss_id)} for faiss_id in ids])
+        
+        self._add_tombstones(collection, ids)
+        collection['doc_store'].remove(ids)
+        collection['metadata_index'].remove(ids)
+        collection['digest_index'].remove(ids)
+        collection['lexical_index'].remove(ids)
+        collection['doc_count'] = self._live_count(collection)
+        collection['last_updated'] = time.time()
+        
+        return records
+    
+    def _add_tombstones(self, collection: Dict, ids: np.ndarray):
+        self._set_tombstones(collection, np.union1d(collection['tombstones'], np.asarray(ids, dtype=np.int64)))
+    
+    def _prune_tombstones(self, collection: Dict):
+        """Forget tombstones of ids that are no longer in the index (after a rebuild)"""
+        
+        self._set_tombstones(collection, np.intersect1d(
+            collection['tombstones'], faiss.vector_to_array(collection['index'].id_map).astype(np.int64)
+        ))
+    
+    @staticmethod
+    def _set_tombstones(collection: Dict, tombstones: np.ndarray):
+        """Replace a collection's tombstones and build their IDSelectorNot
+        
+        Built by the writer (event loop) and published with one assignment: pool searches
+        only read collection['tombstone_selector'], never build or clear it.
+        """
+        
+        tombstones = np.ascontiguousarray(tombstones, dtype=np.int64)
+        tombstone_selector = None
+        if len(tombstones):
+            tombstone_batch = faiss.IDSelectorBatch(len(tombstones), faiss.swig_ptr(tombstones))
+            selector = faiss.IDSelectorNot(tombstone_batch)
+            tombstone_selector = (selector, [tombstones, tombstone_batch, selector])
+        
+        collection['tombstones'] = tombstones
+        collection['tombstone_selector'] = tombstone_selector
+    
+    @staticmethod
+    def _live_count(collection: Dict) -> int:
+        return collection['index'].ntotal - len(collection['tombstones'])
+    
+    def _needs_compaction(self, collection: Dict) -> bool:
+        """Whether tombstones make up enough of the index to be worth a rebuild"""
+        
+        tombstone_count = len(collection['tombstones'])
+        return tombstone_count > 0 and tombstone_count >= self.tombstone_compaction_ratio * collection['index'].ntotal
+    
+    def _exclude_tombstones(
+        self,
+        selector: Optional[faiss.IDSelector],
+        keep_alive: List,
+        collections: Dict[str, Dict]
+    ) -> Tuple[Optional[faiss.IDSelector], List]:
+        """AND a selector (None = every id) with NOT(tombstoned ids) of the given collections"""
+        
+        for collection in collections.values():
+            tombstone_selector = collection['tombstone_selector']
+            if tombstone_selector is None:
+                continue
+            keep_alive = keep_alive + tombstone_selector[1]
+            if selector is None:
+                selector = tombstone_selector[0]
+            else:
+                selector = faiss.IDSelectorAnd(selector, tombstone_selector[0])
+                keep_alive.append(selector)
+        
+        return selector, keep_alive
+    
+    def _resolve_doc_ids(self, collection_name: str, doc_ids: List[str]) -> List[int]:
+        """FAISS ids of documents given by their string doc id ('{collection}_{sequence}_{timestamp}')"""
+        
+        collection = self.collections[collection_name]
+        namespace = collection['config']['id_namespace']
+        faiss_ids = []
+        unresolved = set()
+        
+        for doc_id in doc_ids:
+            prefix, _, rest = doc_id.rpartition('_')
+            prefix, _, sequence = prefix.rpartition('_')
+            if prefix == collection_name and sequence.isdigit():
+                faiss_id = (namespace << self.id_sequence_bits) | int(sequence)
+                record = collection['doc_store'].get(faiss_id)
+                if record is not None and record['id'] == doc_id:
+                    faiss_ids.append(faiss_id)
+                    continue
+            unresolved.add(doc_id)
+        
+        # Ids written before namespaced ids do not encode their sequence
+        if unresolved:
+            faiss_ids.extend(
+                record['faiss_id'] for record in collection['doc_store'].iter_records() if record['id'] in unresolved
+            )
+        
+        return faiss_ids
+    
+    async def _delete_ids(self, collection_name: str, faiss_ids: List[int]) -> int:
+        """Tombstone documents, mirror the deletion in the registry and schedule compaction if due"""
+        
+        removed_records = self._remove_documents(collection_name, faiss_ids)
+        if not removed_records:
+            return 0
+        
+        if self.document_registry is not None:
+            await self.document_registry.sync(
+                collection_name, [], [record['id'] for record in removed_records], self.embedding_model_id
+            )
+        
+        collection = self.collections[collection_name]
+        if collection['delta_log'].entry_count >= self.delta_compaction_entries:
+            await self._save_collection(collection_name)
+        self._schedule_index_rebuild(collection_name)
+        
+        logger.info(f"Deleted {len(removed_records)} documents from {collection_name}")
+        return len(removed_records)
+    
+    async def delete_documents(
+        self,
+        collection_name: str,
+        doc_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict] = None
+    ) -> int:
+        """Delete documents by string doc id and/or by metadata (e.g. {'source': 'pricing.md'})
+        
+        Metadata values match exactly, unlike search filters. Deleted documents disappear
+        from searches immediately; returns how many were deleted.
+        """
+        
+        if collection_name not in self.collections:
+            raise ValueError(f"Collection {collection_name} not found")
+        if not doc_ids and not metadata_filter:
+            raise ValueError("delete_documents needs doc_ids or a metadata_filter")
+        
+        collection = self.collections[collection_name]
+        if not collection['loaded']:
+            await self._load_collection(collection_name)
+        self._ensure_writable(collection_name)
+        
+        faiss_ids = self._resolve_doc_ids(collection_name, doc_ids) if doc_ids else []
+        
+        if metadata_filter:
+            allowed = None
+            record_filter = {}
+            for key, value in metadata_filter.items():
+                if value is None:
+                    continue
+                if key in MetadataIndex.RECORD_FIELDS:
+                    record_filter[key] = value
+                    continue
+                key_ids = collection['metadata_index'].ids_for(key, value)
+                allowed = key_ids if allowed is None else np.intersect1d(allowed, key_ids, assume_unique=True)
+            
+            if allowed is None and not record_filter:
+                candidates = []  # Only None values: match nothing rather than everything
+            elif allowed is None:
+                candidates = collection['doc_store'].iter_records()
+            else:
+                candidates = filter(None, map(collection['doc_store'].get, allowed.tolist()))
+            faiss_ids.extend(
+                record['faiss_id'] for record in candidates
+                if all(record.get(key) == value for key, value in record_filter.items())
+            )
+        
+        return await self._delete_ids(collection_name, faiss_ids)
+    
+    async def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[DocumentChunk],
+        embeddings: Optional[np.ndarray] = None
+    ) -> Dict[str, int]:
+        """Make the given chunks the current content of their sources
+        
+        New and changed chunks are written (replacing the previous version of each chunk key),
+        unchanged ones are skipped, and stored chunks of the same sources that are not part of
+        documents any more (e.g. a page that got shorter) are deleted.
+        """
+        
+        if collection_name not in self.collections:
+            raise ValueError(f"Collection {collection_name} not found")
+        
+        collection = self.collections[collection_name]
+        if not collection['loaded']:
+            await self._load_collection(collection_name)
+        
+        written = await self.add_documents_to_collection(collection_name, documents, embeddings)
+        
+        current_keys = {chunk_key(doc.metadata, content_digest(doc.content)) for doc in documents}
+        sources = {doc.metadata.get('source') for doc in documents} - {None}
+        deleted = await self.delete_stale_chunks(collection_name, sources, current_keys)
+        
+        return {'written': written, 'deleted': deleted}
+    
+    async def delete_stale_chunks(self, collection_name: str, sources: Set[str], current_keys: Set[str]) -> int:
+        """Delete stored chunks of sources whose chunk key is not among current_keys
+        
+        Call once every current chunk of the sources is written; returns how many were deleted.
+        """
+        
+        collection = self.collections[collection_name]
+        stale_ids = []
+        for source in sources:
+            for faiss_id in collection['metadata_index'].ids_for('source', source).tolist():
+                record = collection['doc_store'].get(faiss_id)
+                if record is not None and chunk_key(record['metadata'], record['content_digest']) not in current_keys:
+                    stale_ids.append(faiss_id)
+        
+        return await self._delete_ids(collection_name, stale_ids) if stale_ids else 0
+    
+    async def search_targeted_collections(
+        self,
+        queries: List[str],
+        collections: List[str],
+        context_filter: Optional[Dict] = None,
+        top_k: int = 5,
+        collection_weights: Optional[Dict[str, float]] = None,
+        hybrid: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None,
+        original_query: Optional[str] = None
+    ) -> List[Dict]:
+        """Search across specified collections with context filtering
+        
+        collection_weights overrides the configured re-ranking priority of some collections.
+        hybrid (default: the manager's hybrid_search) fuses BM25 and vector rankings; results
+        then carry a 'fusion_score' used for ordering, while 'score' stays the cosine similarity.
+        mmr_lambda (default: the manager's) selects top_k diverse results instead of
+        top_k per collection. original_query (default: the first query) is the user's
+        question the cross-encoder scores every result against.
+        """
+        
+        hybrid = self.hybrid_search if hybrid is None else hybrid
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        
+        queries = [query for query in queries if query.strip()]
+        if not queries or not collections:
+            logger.warning("Empty queries or collections provided")
+            return []
+        
+        # Encode every refined query once and reuse the vectors for all collections
+        query_matrix = await self._encode_queries(queries)
+        
+        for collection_name in collections:
+            if collection_name in self.collections and not self.collections[collection_name]['loaded']:
+                logger.info(f"Loading collection {collection_name}")
+                await self._load_collection(collection_name)
+        
+        # Take every collection dict (and the unified index) once, with no await in between:
+        # a snapshot swap while the pool searches must not mix versions within this request
+        unified_index = self.unified_index
+        target_collections = {}
+        for collection_name in collections:
+            if collection_name not in self.collections:
+                logger.warning(f"Collection {collection_name} not found")
+                continue
+            
+            collection = self.collections[collection_name]
+            if self._live_count(collection) == 0:
+                logger.warning(f"Collection {collection_name} is empty")
+                continue
+            
+            target_collections[collection_name] = collection
+        
+        all_results = []
+        
+        if unified_index is not None and target_collections \
+                and self._unified_filterable(target_collections, context_filter):
+            try:
+                search_filter = self._search_filter(target_collections, context_filter, unified=True)
+                all_results = await self._run_search(
+                    self._search_unified, queries, query_matrix, target_collections, unified_index,
+                    search_filter, top_k
+                )
+            except Exception as e:
+                logger.error(f"Error searching unified index for {list(target_collections)}: {e}")
+        else:
+            # Fan out one search per collection to the search pool, then merge in collection order
+            outcomes = await asyncio.gather(*[
+                self._search_collection_batch(
+                    collection_name=collection_name,
+                    collection=collection,
+                    queries=queries,
+                    query_matrix=query_matrix,
+                    context_filter=context_filter,
+                    top_k=top_k,
+                    similarity_threshold=collection['config'].get('similarity_threshold', 0.7)
+                )
+                for collection_name, collection in target_collections.items()
+            ], return_exceptions=True)
+            
+            for collection_name, outcome in zip(target_collections, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Error searching collection {collection_name} with {len(queries)} queries: {outcome}")
+                    continue
+                all_results.extend(outcome)
+        
+        if hybrid and target_collections:
+            try:
+                all_results = self._fuse_lexical_results(
+                    queries, query_matrix, target_collections, context_filter, top_k, all_results
+                )
+            except Exception as e:
+                logger.error(f"Error in lexical search for {list(target_collections)}: {e}")
+        
+        # Post-process results
+        if all_results:
+            weights = self._namespace_weights(collection_weights) if collection_weights else self.collection_weights
+            all_results = self._postprocess_results(
+                all_results, target_collections, top_k * len(collections), weights,
+                rank_key='fusion_score' if hybrid else 'score'
+            )
+            if mmr_lambda is not None:
+                all_results = self._select_mmr(all_results, target_collections, top_k, mmr_lambda)
+            if self.cross_encoder is not None:
+                all_results = await self.cross_encoder.rerank(original_query or queries[0], all_results)
+        
+        logger.info(f"Found {len(all_results)} total results across {len(collections)} collections")
+        return all_results
+    
+    async def _search_single_collection(
+        self,
+        collection_name: str,
+        query: str,
+        context_filter: Optional[Dict],
+        top_k: int,
+        similarity_threshold: float,
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[Dict]:
+        """Search a single collection"""
+        
+        # Generate query embedding unless the caller already encoded it
+        if query_vector is None:
+            query_vector = (await self._encode_queries([query]))[0]
+        
+        return await self._search_collection_batch(
+            collection_name=collection_name,
+            collection=self.collections[collection_name],
+            queries=[query],
+            query_matrix=np.asarray([query_vector], dtype=np.float32),
+            context_filter=context_filter,
+            top_k=top_k,
+            similarity_threshold=similarity_threshold
+        )
+    
+    async def _run_search(self, search_fn: Callable[..., List[Dict]], *args) -> List[Dict]:
+        """Run a synchronous FAISS search on the search pool (inline when the pool is disabled)"""
+        
+        if self.search_executor is None:
+            return search_fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.search_executor, search_fn, *args)
+    
+    async def _search_collection_batch(
+        self,
+        collection_name: str,
+        collection: Dict,
+        queries: List[str],
+        query_matrix: np.ndarray,
+        context_filter: Optional[Dict],
+        top_k: int,
+        similarity_threshold: float
+    ) -> List[Dict]:
+        """Search a single collection with all queries in one FAISS call (Q x dim matrix)"""
+        
+        search_filter = self._search_filter({collection_name: collection}, context_filter)
+        return await self._run_search(
+            self._search_collection, collection_name, collection, queries, query_matrix,
+            search_filter, top_k, similarity_threshold
+        )
+    
+    def _search_collection(
+        self,
+        collection_name: str,
+        collection: Dict,
+        queries: List[str],
+        query_matrix: np.ndarray,
+        search_filter: Tuple,
+        top_k: int,
+        similarity_threshold: float
+    ) -> List[Dict]:
+        """Body of _search_collection_batch, run on a search pool thread
+        
+        collection is the state dict the caller took on the event loop; self.collections
+        may be swapped for a newer snapshot meanwhile. search_filter comes from _search_filter.
+        """
+        
+        targets = {collection_name: collection}
+        
+        # Zero query embeddings cannot score anything meaningful
+        valid_queries = query_matrix.any(axis=1)
+        for query, is_valid in zip(queries, valid_queries):
+            if not is_valid:
+                logger.warning(f"Zero query embedding for: {query}")
+        if not valid_queries.any():
+            return []
+        
+        selector, keep_alive, residual_filter, candidate_count = search_filter
+        if candidate_count == 0:
+            return []
+        
+        query_matrix = np.ascontiguousarray(query_matrix, dtype=np.float32)
+        with collection['index_lock'].read():
+            # A rebuild swaps both under the write lock: read them once, together
+            index, base_index = collection['index'], collection['base_index']
             
-            # Save to disk
-            await self._save_collection(collection_name)
+            # Over-fetch only when some filter keys still have to be checked after the search
+            k = min(top_k * 2 if residual_filter else top_k, candidate_count or index.ntotal)
             
-            return len(embedding_matrix)
+            # Compressed codes give approximate scores: fetch more candidates and re-score exactly
+            rerank = compression_of(base_index) is not None and collection['config'].get('exact_rerank', True)
+            fetch_k = min(k * self.index_policy.rerank_factor, candidate_count or index.ntotal) if rerank else k
             
-        except Exception as e:
-            logger.error(f"Error adding documents to {collection_name}: {e}")
-            raise
+            scores, doc_ids = index.search(
+                query_matrix, fetch_k,
+                params=self.index_policy.search_parameters(base_index, selector)
+            )
+        if rerank:
+            vectors, found = collection['doc_store'].get_vectors(doc_ids.ravel())
+            scores, doc_ids = exact_rerank(query_matrix, scores, doc_ids, vectors, found, k)
+        
+        # Drop empty slots, low scores and zero queries for all rows at once
+        hit_mask = (doc_ids != -1) & (scores >= similarity_threshold) & valid_queries[:, None]
+        
+        return self._collect_hits(queries, scores, doc_ids, hit_mask, residual_filter, top_k, targets, collection_name)
     
-    async def search_targeted_collections(
+    def _search_unified(
         self,
         queries: List[str],
-        collections: List[str],
-        context_filter: Optional[Dict] = None,
-        top_k: int = 5
+        query_matrix: np.ndarray,
+        collections: Dict[str, Dict],
+        unified_index: faiss.Index,
+        search_filter: Tuple,
+        top_k: int
     ) -> List[Dict]:
-        """Search across specified collections with context filtering"""
+        """Search all target collections with one unified-index call restricted by an IDSelector"""
         
-        if not queries or not collections:
-            logger.warning("Empty queries or collections provided")
+        valid_queries = query_matrix.any(axis=1)
+        if not valid_queries.any():
             return []
         
-        all_results = []
+        selector, keep_alive, residual_filter, candidate_count = search_filter
+        if candidate_count == 0:
+            return []
         
-        for collection_name in collections:
-            if collection_name not in self.collections:
-                logger.warning(f"Collection {collection_name} not found")
-                continue
-            
-            collection = self.collections[collection_name]
-            if not collection['loaded']:
-                logger.info(f"Loading collection {collection_name}")
-                await self._load_collection(collection_name)
-            
-            if collection['index'].ntotal == 0:
-                logger.warning(f"Collection {collection_name} is empty")
-                continue
-            
-            similarity_threshold = collection['config'].get('similarity_threshold', 0.7)
-            
-            for query in queries:
-                try:
-                    results = await self._search_single_collection(
-                        collection_name=collection_name,
-                        query=query,
-                        context_filter=context_filter,
-                        top_k=top_k,
-                        similarity_threshold=similarity_threshold
-                    )
-                    all_results.extend(results)
-                    
-                except Exception as e:
-                    logger.error(f"Error searching collection {collection_name} with query '{query}': {e}")
-                    continue
+        # Leave room for every collection to fill its per-query top_k
+        k = top_k * 2 * len(collections) if residual_filter else top_k * len(collections)
+        k = min(k, candidate_count or unified_index.ntotal)
+        with self.unified_index_lock.read():
+            scores, doc_ids = unified_index.search(
+                np.ascontiguousarray(query_matrix, dtype=np.float32), k,
+                params=self.index_policy.search_parameters(faiss.downcast_index(unified_index.index), selector)
+            )
         
-        # Post-process results
-        if all_results:
-            all_results = self._deduplicate_results(all_results)
-            all_results = self._rerank_results(all_results)
-            all_results = all_results[:top_k * len(collections)]  # Limit results
+        # Per-hit similarity threshold looked up from the namespace in the id's high bits
+        max_namespace = max(self.namespace_collections)
+        namespace_thresholds = np.full(max_namespace + 1, np.inf, dtype=np.float32)
+        for collection in collections.values():
+            config = collection['config']
+            namespace_thresholds[config['id_namespace']] = config.get('similarity_threshold', 0.7)
+        hit_namespaces = np.clip(doc_ids >> self.id_sequence_bits, 0, max_namespace)
         
-        logger.info(f"Found {len(all_results)} total results across {len(collections)} collections")
-        return all_results
+        hit_mask = (doc_ids != -1) & (scores >= namespace_thresholds[hit_namespaces]) & valid_queries[:, None]
+        
+        return self._collect_hits(queries, scores, doc_ids, hit_mask, residual_filter, top_k, collections)
     
-    async def _search_single_collection(
+    def _unified_filterable(self, collections: Dict[str, Dict], context_filter: Optional[Dict]) -> bool:
+        """Whether one unified-index selector can express the filter for every collection
+        
+        A key that is indexed in some collections but only post-filtered in others (e.g. list
+        values) constrains the first ones only; the selector would then drop every chunk of
+        the others, so such filters are searched per collection.
+        """
+        
+        constrained = {
+            collection['metadata_index'].resolve(context_filter)[0] is not None
+            for collection in collections.values()
+        }
+        if len(constrained) > 1:
+            logger.debug(f"Filter {context_filter} is not indexed in every collection; searching per collection")
+            return False
+        return True
+    
+    def _search_filter(
         self,
-        collection_name: str,
-        query: str,
+        collections: Dict[str, Dict],
         context_filter: Optional[Dict],
-        top_k: int,
-        similarity_threshold: float
-    ) -> List[Dict]:
-        """Search a single collection"""
+        unified: bool = False
+    ) -> Tuple[Optional[faiss.IDSelector], List, Dict, Optional[int]]:
+        """Selector, objects to keep alive, residual filter and candidate count of one search
         
-        collection = self.collections[collection_name]
+        Runs on the event loop before the search is handed to the pool: adds and deletes
+        update the metadata indexes on the loop, so pool threads never read their postings.
+        """
         
-        # Generate query embedding
-        query_embeddings = await self._generate_embeddings_batch([query])
-        query_vector = query_embeddings[0]
+        # Indexed metadata filters become an id selector applied inside the FAISS search
+        selector, keep_alive, residual_filter, candidate_count = self._filter_selector(collections, context_filter)
+        if candidate_count is None:
+            if unified:
+                # Filtered ids already belong to the target collections; otherwise restrict by namespace
+                selector, keep_alive = self._namespace_selector(collections)
+            # Filtered candidates come from the metadata index, which never holds deleted ids
+            selector, keep_alive = self._exclude_tombstones(selector, keep_alive, collections)
+        return selector, keep_alive, residual_filter, candidate_count
+    
+    def _filter_selector(
+        self,
+        collections: Dict[str, Dict],
+        context_filter: Optional[Dict]
+    ) -> Tuple[Optional[faiss.IDSelector], List, Dict, Optional[int]]:
+        """Resolve a context filter through the metadata indexes into an IDSelectorBatch
         
-        # Normalize query vector
-        query_norm = np.linalg.norm(query_vector)
-        if query_norm > 0:
-            query_vector = query_vector / query_norm
-        else:
-            logger.warning(f"Zero query embedding for: {query}")
-            return []
+        Returns (selector, objects to keep alive, residual filter, candidate count);
+        selector and count are None when no indexed key constrains the search.
+        """
         
-        query_matrix = np.array([query_vector], dtype=np.float32)
+        allowed_parts = []
+        residual_filter = {}
+        for collection in collections.values():
+            allowed, residual = collection['metadata_index'].resolve(context_filter)
+            residual_filter.update(residual)
+            if allowed is not None:
+                allowed_parts.append(allowed)
+        
+        if not allowed_parts:
+            return None, [], residual_filter, None
+        
+        allowed_ids = np.ascontiguousarray(np.concatenate(allowed_parts), dtype=np.int64)
+        if not len(allowed_ids):
+            return None, [], residual_filter, 0
+        
+        selector = faiss.IDSelectorBatch(len(allowed_ids), faiss.swig_ptr(allowed_ids))
+        return selector, [selector, allowed_ids], residual_filter, len(allowed_ids)
+    
+    def _collect_hits(
+        self,
+        queries: List[str],
+        scores: np.ndarray,
+        doc_ids: np.ndarray,
+        hit_mask: np.ndarray,
+        context_filter: Optional[Dict],
+        top_k: int,
+        collections: Dict[str, Dict],
+        collection_name: Optional[str] = None
+    ) -> List[Dict]:
+        """Resolve masked FAISS hits into results, keeping at most top_k per query and collection"""
         
-        # Search FAISS index
-        scores, doc_ids = collection['index'].search(query_matrix, min(top_k * 2, collection['index'].ntotal))
+        rows, cols = np.nonzero(hit_mask)  # Row-major: per-query hits stay in score order
+        hit_ids = doc_ids[rows, cols]
+        hit_namespaces = (hit_ids >> self.id_sequence_bits).tolist()
         
         results = []
-        for score, doc_id in zip(scores[0], doc_ids[0]):
-            if doc_id == -1:  # No result found
-                continue
-            
-            if score < similarity_threshold:
+        per_query_counts = {}
+        for row, namespace, score, doc_id in zip(
+            rows.tolist(), hit_namespaces, scores[rows, cols].tolist(), hit_ids.tolist()
+        ):
+            hit_collection = collection_name or self.namespace_collections.get(namespace)
+            count_key = (row, hit_collection)
+            if per_query_counts.get(count_key, 0) >= top_k:
                 continue
             
             # Find metadata by doc_id
-            metadata = self._find_metadata_by_id(collection, doc_id)
+            metadata = None
+            if hit_collection in collections:
+                metadata = self._find_metadata_by_id(collections[hit_collection], doc_id)
             if not metadata:
-                logger.warning(f"Metadata not found for doc_id {doc_id} in {collection_name}")
+                logger.warning(f"Metadata not found for doc_id {doc_id} in {hit_collection}")
                 continue
             
             # Apply context filters
             if context_filter and not self._matches_filter(metadata, context_filter):
                 continue
             
-            result = {
-                'content': metadata['content'],
-                'metadata': metadata['metadata'],
-                'collection': collection_name,
-                'score': float(score),
-                'query': query,
-                'doc_id': metadata['id'],
-                'content_length': metadata.get('content_length', len(metadata['content'])),
-                'added_at': metadata.get('added_at', 0)
-            }
+            results.append(self._make_result(metadata, hit_collection, score, queries[row]))
+            per_query_counts[count_key] = per_query_counts.get(count_key, 0) + 1
+        
+        return results
+    
+    @staticmethod
+    def _make_result(metadata: Dict, collection_name: str, score: float, query: str) -> Dict:
+        """Search result for a document record"""
+        
+        return {
+            'content': metadata['content'],
+            'metadata': metadata['metadata'],
+            'collection': collection_name,
+            'score': score,
+            'query': query,
+            'doc_id': metadata['id'],
+            'faiss_id': metadata['faiss_id'],
+            'content_hash': metadata.get('content_hash', 0),
+            'content_length': metadata.get('content_length', len(metadata['content'])),
+            'added_at': metadata.get('added_at', 0)
+        }
+    
+    def _fuse_lexical_results(
+        self,
+        queries: List[str],
+        query_matrix: np.ndarray,
+        collections: Dict[str, Dict],
+        context_filter: Optional[Dict],
+        top_k: int,
+        vector_results: List[Dict]
+    ) -> List[Dict]:
+        """Reciprocal-rank fusion of vector hits with BM25 hits, per query and collection
+        
+        Lexical-only hits get their cosine score from the stored vectors and are kept when it
+        reaches the collection's lexical_min_score, which sits below the similarity threshold:
+        they matched exact terms.
+        """
+        
+        # Vector hits arrive in score order per query (and collection)
+        fused = {}
+        ranks = {}
+        for result in vector_results:
+            rank_key = (result['query'], result['collection'])
+            ranks[rank_key] = ranks.get(rank_key, 0) + 1
+            result['fusion_score'] = 1.0 / (self.rrf_k + ranks[rank_key])
+            fused[(result['query'], result['faiss_id'])] = result
+        
+        lexical_results = []
+        for name, collection in collections.items():
+            allowed, residual_filter = collection['metadata_index'].resolve(context_filter)
+            if allowed is not None and not len(allowed):
+                continue
+            
+            hits = []  # (query row, record, fusion score) of lexical-only hits
+            for row, query in enumerate(queries):
+                lexical_ids, _ = collection['lexical_index'].search(query, top_k, allowed)
+                for rank, faiss_id in enumerate(lexical_ids.tolist(), 1):
+                    result = fused.get((query, faiss_id))
+                    if result is not None:
+                        result['fusion_score'] += 1.0 / (self.rrf_k + rank)
+                        continue
+                    record = collection['doc_store'].get(faiss_id)
+                    if record is None or (residual_filter and not self._matches_filter(record, residual_filter)):
+                        continue
+                    hits.append((row, record, 1.0 / (self.rrf_k + rank)))
             
-            results.append(result)
+            if not hits:
+                continue
+            
+            candidates = []
+            for row, record, fusion_score in hits:
+                result = self._make_result(record, name, 0.0, queries[row])
+                result['fusion_score'] = fusion_score
+                candidates.append(result)
+            
+            # Chunks without a vector score 0 and are dropped: nothing backs the term match
+            vectors = self._result_vectors(candidates, collections)
+            rows = np.array([row for row, _, _ in hits])
+            scores = np.einsum('nd,nd->n', vectors, query_matrix[rows])
+            min_score = collection['config'].get('lexical_min_score', self.lexical_min_score)
+            for result, score in zip(candidates, scores.tolist()):
+                if score >= min_score:
+                    result['score'] = score
+                    lexical_results.append(result)
+        
+        return vector_results + lexical_results
+    
+    async def precompute_query_embeddings(self, queries: List[str]):
+        """Precompute embeddings for static refined queries, persisted next to the indices"""
+        
+        table_path = os.path.join(self.base_path, "query_embeddings.npz")
+        table = {}
+        
+        if os.path.exists(table_path):
+            try:
+                with np.load(table_path, allow_pickle=False) as data:
+                    if str(data['model_name']) == self.embedding_model_id:
+                        table = dict(zip(data['queries'].tolist(), data['embeddings']))
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable query embedding table: {e}")
+        
+        missing = [query for query in dict.fromkeys(queries) if query.strip() and query not in table]
+        if missing:
+            table.update(zip(missing, await self._encode_queries(missing)))
+            
+            try:
+                np.savez(
+                    table_path,
+                    model_name=np.array(self.embedding_model_id),
+                    queries=np.array(list(table.keys())),
+                    embeddings=np.array(list(table.values()), dtype=np.float32)
+                )
+            except Exception as e:
+                logger.warning(f"Could not persist query embedding table: {e}")
+        
+        self.query_embedding_table = table
+        logger.info(f"Query embedding table ready: {len(table)} entries ({len(missing)} newly encoded)")
+    
+    async def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode queries in one batch into a normalized float32 matrix (one row per query)"""
         
-        return results[:top_k]
+        query_matrix = np.zeros((len(queries), self.embedding_dim), dtype=np.float32)
+        
+        # Static refined queries come from the precomputed table; only the rest hit the model
+        missing_rows = []
+        for row, query in enumerate(queries):
+            cached = self.query_embedding_table.get(query)
+            if cached is not None:
+                query_matrix[row] = cached
+            else:
+                missing_rows.append(row)
+        
+        if missing_rows:
+            query_matrix[missing_rows] = await self._generate_embeddings_batch(
+                [queries[row] for row in missing_rows],
+                use_cache=True
+            )
+        
+        # Normalize rows for cosine similarity; zero rows stay zero and are skipped by callers
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        np.divide(query_matrix, norms, out=query_matrix, where=norms > 0)
+        
+        return query_matrix
     
     async def _generate_embeddings_batch(
         self, 
         texts: List[str], 
-        batch_size: int = 32
+        batch_size: int = 32,
+        use_cache: bool = False
     ) -> np.ndarray:
         """Generate embeddings with batch processing"""
         
@@ -349,40 +1613,63 @@ class FAISSCollectionManager:
                 logger.warning("No valid texts after cleaning")
                 return np.array([])
             
+            # Serve what we can from the embedding cache and only encode the rest
+            cached_vectors = None
+            texts_to_encode = cleaned_texts
+            if use_cache and self.embedding_cache is not None:
+                cached_vectors = self.embedding_cache.get_many(cleaned_texts)
+                texts_to_encode = [
+                    text for text, vector in zip(cleaned_texts, cached_vectors) if vector is None
+                ]
+            
             all_embeddings = []
             
-            for i in range(0, len(cleaned_texts), batch_size):
-                batch = cleaned_texts[i:i + batch_size]
+            for i in range(0, len(texts_to_encode), batch_size):
+                batch = texts_to_encode[i:i + batch_size]
                 
                 # Generate embeddings for batch
-                batch_embeddings = self.embedding_model.encode(
-                    batch,
-                    convert_to_numpy=True,
-                    show_progress_bar=False,
-                    batch_size=len(batch)
-                )
+                if self.embedding_batcher is not None:
+                    batch_embeddings = await self.embedding_batcher.encode(batch)
+                else:
+                    batch_embeddings = await self._encode_in_executor(batch)
                 
                 all_embeddings.append(batch_embeddings)
             
             # Combine all embeddings
             result = np.vstack(all_embeddings) if all_embeddings else np.array([])
-            logger.debug(f"Generated embeddings for {len(cleaned_texts)} texts")
+            logger.debug(f"Generated embeddings for {len(texts_to_encode)} texts")
             
-            return result
+            if cached_vectors is not None:
+                if texts_to_encode:
+                    self.embedding_cache.set_many(texts_to_encode, result)
+                
+                # Merge cache hits and fresh embeddings back into input order
+                fresh_vectors = iter(result)
+                result = np.vstack([
+                    vector if vector is not None else next(fresh_vectors)
+                    for vector in cached_vectors
+                ])
             
+            return result
+        
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    def _allocate_id(self, collection: Dict) -> int:
+        """Allocate the next stable int64 FAISS id for a collection"""
+        
+        sequence = collection['next_id']
+        if sequence >= (1 << self.id_sequence_bits):
+            raise ValueError(f"Id space exhausted for namespace {collection['config']['id_namespace']}")
+        
+        collection['next_id'] = sequence + 1
+        return (collection['config']['id_namespace'] << self.id_sequence_bits) | sequence
+    
     def _find_metadata_by_id(self, collection: Dict, doc_id: int) -> Optional[Dict]:
         """Find metadata by FAISS doc_id"""
         
-        # Search through metadata store to find matching hash
-        for stored_id, metadata in collection['metadata_store'].items():
-            if abs(hash(stored_id)) % (2**63) == doc_id:
-                return metadata
-        
-        return None
+        return collection['doc_store'].get(doc_id)
     
     def _matches_filter(self, metadata: Dict, context_filter: Dict) -> bool:
         """Check if metadata matches context filters"""
@@ -408,113 +1695,232 @@ class FAISSCollectionManager:
         
         return True
     
-    def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
-        """Remove duplicate results based on content similarity"""
+    def _namespace_weights(self, overrides: Dict[str, float]) -> np.ndarray:
+        """Collection priorities (config 'priority', then overrides) as an array indexed by id namespace"""
         
-        if len(results) <= 1:
-            return results
+        weights = np.ones(max(self.namespace_collections) + 1, dtype=np.float64)
+        for name, config in self.collection_configs.items():
+            weights[config['id_namespace']] = overrides.get(name, config.get('priority', 1.0))
+        return weights
+    
+    def _postprocess_results(
+        self,
+        results: List[Dict],
+        collections: Dict[str, Dict],
+        limit: int,
+        collection_weights: np.ndarray,
+        rank_key: str = 'score'
+    ) -> List[Dict]:
+        """Deduplicate, re-rank and cut results to limit with vector ops over their columns
         
-        seen_hashes = set()
-        deduplicated = []
+        collections are the state dicts the results were found in, as taken by the request.
+        rank_key names the base score: 'score' (cosine) or 'fusion_score' (hybrid search).
+        """
         
-        # Sort by score first (highest first)
-        results.sort(key=lambda x: x['score'], reverse=True)
+        count = len(results)
+        scores = np.fromiter((result[rank_key] for result in results), dtype=np.float64, count=count)
+        content_hashes = np.fromiter((result['content_hash'] for result in results), dtype=np.int64, count=count)
         
-        for result in results:
-            # Create content hash for deduplication
-            content = result['content']
-            content_hash = hash(content[:200])  # Use first 200 chars for hash
-            
-            # Also check for very similar content lengths (potential duplicates)
-            similar_found = False
-            for existing_hash in seen_hashes:
-                if abs(existing_hash - content_hash) < 100:  # Threshold for similarity
-                    similar_found = True
-                    break
+        keep = self._deduplicate_results(scores, content_hashes)
+        keep = self._suppress_near_duplicates(results, keep, collections)
+        
+        lengths = np.fromiter((results[i]['content_length'] for i in keep.tolist()), dtype=np.float64, count=len(keep))
+        added_at = np.fromiter((results[i]['added_at'] for i in keep.tolist()), dtype=np.float64, count=len(keep))
+        namespaces = np.fromiter((results[i]['faiss_id'] for i in keep.tolist()), dtype=np.int64, count=len(keep))
+        namespaces = np.clip(namespaces >> self.id_sequence_bits, 0, len(collection_weights) - 1)
+        
+        composite = self._rerank_results(scores[keep], lengths, added_at, collection_weights[namespaces])
+        
+        # Top-limit cut: partial selection, then sort only the survivors
+        if len(composite) > limit:
+            top = np.argpartition(-composite, limit - 1)[:limit]
+        else:
+            top = np.arange(len(composite))
+        top = top[np.argsort(-composite[top], kind='stable')]
+        
+        ranked = []
+        for position in top.tolist():
+            result = results[int(keep[position])]
+            result['composite_score'] = float(composite[position])
+            ranked.append(result)
+        
+        return ranked
+    
+    @staticmethod
+    def _deduplicate_results(scores: np.ndarray, content_hashes: np.ndarray) -> np.ndarray:
+        """Positions of the best-scoring result per content hash, in descending score order
+        
+        content_hash is derived from the stable content digest, so the same chunk hit by
+        several queries (or stored twice) collapses to one result.
+        """
+        
+        order = np.argsort(-scores, kind='stable')
+        _, first = np.unique(content_hashes[order], return_index=True)
+        return order[np.sort(first)]
+    
+    def _suppress_near_duplicates(self, results: List[Dict], keep: np.ndarray, collections: Dict[str, Dict]) -> np.ndarray:
+        """Drop candidates (in descending score order) that are near-duplicates of a higher-scoring one
+        
+        Uses the cosine similarity matrix of the normalized chunk vectors, computed in one
+        pass; candidates without a vector are never suppressed. Only kept candidates suppress:
+        with A~B and B~C but not A~C, B is dropped and C stays.
+        """
+        
+        if len(keep) <= 1 or self.near_duplicate_threshold >= 1:
+            return keep
+        
+        vectors = self._result_vectors([results[i] for i in keep.tolist()], collections)
+        
+        # Upper triangle: row i compares candidate i with every worse one
+        similar = np.triu(vectors @ vectors.T >= self.near_duplicate_threshold, k=1)
+        kept = np.ones(len(keep), dtype=bool)
+        for row in range(len(keep)):
+            if kept[row]:
+                kept[row + 1:] &= ~similar[row, row + 1:]
+        
+        return keep[kept]
+    
+    def _result_vectors(self, results: List[Dict], collections: Dict[str, Dict]) -> np.ndarray:
+        """Normalized chunk vectors of results, one row each (zero rows when unavailable)
+        
+        Vectors come from the document store of the request's collection state dicts, never
+        from self.collections, which a snapshot swap may have replaced since the search; chunks
+        stored without one (compressed legacy collections) are reconstructed from the index,
+        which is approximate for quantised codes.
+        """
+        
+        faiss_ids = np.fromiter((result['faiss_id'] for result in results), dtype=np.int64, count=len(results))
+        collection_names = np.array([result['collection'] for result in results], dtype=object)
+        
+        vectors = np.zeros((len(results), self.embedding_dim), dtype=np.float32)
+        for name in set(collection_names.tolist()):
+            if name not in collections:
+                continue
+            collection = collections[name]
+            rows = np.nonzero(collection_names == name)[0]
+            stored_vectors, found = collection['doc_store'].get_vectors(faiss_ids[rows])
+            if stored_vectors is not None:
+                vectors[rows[found]] = stored_vectors[found]
             
-            if not similar_found:
-                seen_hashes.add(content_hash)
-                deduplicated.append(result)
+            missing = rows if stored_vectors is None else rows[~found]
+            if not len(missing):
+                continue
+            try:
+                with collection['index_lock'].read():
+                    index, base_index = collection['index'], collection['base_index']
+                    ivf_index = faiss.try_extract_index_ivf(base_index)
+                    if ivf_index is not None:
+                        ivf_index.make_direct_map()  # IVF lists need a direct map to reconstruct by id
+                    for row in missing.tolist():
+                        vectors[row] = index.reconstruct(int(faiss_ids[row]))
+            except RuntimeError as e:
+                logger.warning(f"Could not reconstruct result vectors of {name}: {e}")
         
-        return deduplicated
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
     
-    def _rerank_results(self, results: List[Dict]) -> List[Dict]:
-        """Re-rank results based on multiple factors"""
+    def _select_mmr(self, results: List[Dict], collections: Dict[str, Dict], k: int, mmr_lambda: float) -> List[Dict]:
+        """Pick k results by maximal marginal relevance, in selection order
+        
+        Each step takes the candidate maximizing
+        mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to the already selected,
+        with relevance the composite score scaled to [0, 1].
+        """
         
         if len(results) <= 1:
-            return results
+            return results[:k]
         
-        # Calculate composite score
-        for result in results:
-            base_score = result['score']
-            
-            # Boost factor based on content length (prefer substantial content)
-            content_length = result.get('content_length', len(result['content']))
-            length_factor = min(1.2, 1.0 + (content_length - 100) / 1000)  # Boost longer content
-            
-            # Recency factor (newer content gets slight boost)
-            added_at = result.get('added_at', 0)
-            if added_at > 0:
-                age_days = (time.time() - added_at) / (24 * 3600)
-                recency_factor = max(0.9, 1.0 - age_days / 365)  # Decay over year
-            else:
-                recency_factor = 1.0
-            
-            # Collection priority (some collections might be more important)
-            collection_priority = self._get_collection_priority(result['collection'])
-            
-            # Calculate final score
-            result['composite_score'] = base_score * length_factor * recency_factor * collection_priority
+        relevance = np.fromiter(
+            (result['composite_score'] for result in results), dtype=np.float64, count=len(results)
+        )
+        top_relevance = relevance.max()
+        if top_relevance > 0:
+            relevance = relevance / top_relevance
         
-        # Sort by composite score
-        results.sort(key=lambda x: x['composite_score'], reverse=True)
+        vectors = self._result_vectors(results, collections)
+        similarity = vectors @ vectors.T
         
-        return results
+        # Max similarity of every candidate to the selected set, updated one row per pick
+        redundancy = np.zeros(len(results), dtype=np.float64)
+        available = np.ones(len(results), dtype=bool)
+        selected = []
+        for _ in range(min(k, len(results))):
+            mmr = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+            pick = int(np.argmax(mmr))
+            selected.append(pick)
+            available[pick] = False
+            np.maximum(redundancy, similarity[pick], out=redundancy)
+        
+        return [results[i] for i in selected]
     
-    def _get_collection_priority(self, collection_name: str) -> float:
-        """Get priority multiplier for collection"""
+    @staticmethod
+    def _rerank_results(
+        scores: np.ndarray,
+        content_lengths: np.ndarray,
+        added_at: np.ndarray,
+        collection_weights: np.ndarray
+    ) -> np.ndarray:
+        """Composite scores: similarity x length factor x recency factor x collection priority"""
         
-        priority_map = {
-            'product_a_features': 1.0,
-            'product_b_features': 1.0,
-            'product_a_pricing': 1.1,  # Pricing info slightly prioritized
-            'product_b_pricing': 1.1,
-            'warranty_support': 0.9,
-            'contact_company': 0.8
-        }
+        # Boost factor based on content length (prefer substantial content)
+        length_factor = np.minimum(1.2, 1.0 + (content_lengths - 100) / 1000)
+        
+        # Recency factor (newer content gets slight boost, decaying over a year)
+        age_days = (time.time() - added_at) / (24 * 3600)
+        recency_factor = np.where(added_at > 0, np.maximum(0.9, 1.0 - age_days / 365), 1.0)
         
-        return priority_map.get(collection_name, 1.0)
+        return scores * length_factor * recency_factor * collection_weights
     
     async def _save_collection(self, collection_name: str):
-        """Save FAISS collection to disk"""
+        """Save FAISS collection to disk as new base files and empty its delta log (compaction)"""
         
         collection = self.collections[collection_name]
         
         try:
-            # Save FAISS index
-            index_path = os.path.join(self.base_path, f"{collection_name}.index")
-            faiss.write_index(collection['index'], index_path)
-            
-            # Save metadata
-            metadata_path = os.path.join(self.base_path, f"{collection_name}_metadata.pkl")
-            with open(metadata_path, 'wb') as f:
-                pickle.dump(collection['metadata_store'], f)
-            
-            # Save config and stats
-            config_path = os.path.join(self.base_path, f"{collection_name}_config.json")
-            config_data = {
-                'config': collection['config'],
-                'doc_count': collection['doc_count'],
-                'last_updated': collection['last_updated'],
-                'index_type': collection['config']['index_type'],
-                'total_size': collection['index'].ntotal
-            }
-            
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=2)
-            
-            logger.debug(f"Saved collection {collection_name} to disk")
-            
+            with collection['file_lock']:
+                # Save FAISS index; write then rename so workers that mmap the old file keep a valid mapping
+                index_path = os.path.join(self.base_path, f"{collection_name}.index")
+                tmp_path = unique_tmp_path(index_path)
+                faiss.write_index(collection['index'], tmp_path)
+                os.replace(tmp_path, index_path)
+                
+                # Save document store (columnar arrays + text blobs)
+                collection['doc_store'].save(self.base_path)
+                
+                collection['lexical_index'].save(self.base_path, collection_name)
+                
+                # Tombstoned ids are still in the saved index until a rebuild compacts it
+                tombstone_path = os.path.join(self.base_path, f"{collection_name}_tombstones.npy")
+                tmp_path = unique_tmp_path(tombstone_path)
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, collection['tombstones'])
+                os.replace(tmp_path, tombstone_path)
+                
+                # Save config and stats
+                config_path = os.path.join(self.base_path, f"{collection_name}_config.json")
+                config_data = {
+                    'config': collection['config'],
+                    'doc_count': collection['doc_count'],
+                    'last_updated': collection['last_updated'],
+                    'index_type': index_type_of(collection['base_index']),
+                    'total_size': collection['index'].ntotal,
+                    'tombstone_count': len(collection['tombstones']),
+                    'id_namespace': collection['config']['id_namespace'],
+                    'next_id': collection['next_id'],
+                    'trained_vectors': collection['trained_vectors']
+                }
+                
+                tmp_path = unique_tmp_path(config_path)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(config_data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, config_path)
+                
+                # Every logged change is now in the base files
+                collection['delta_log'].reset()
+                
+                logger.debug(f"Saved collection {collection_name} to disk")
+        
         except Exception as e:
             logger.error(f"Error saving collection {collection_name}: {e}")
             raise
@@ -523,38 +1929,195 @@ class FAISSCollectionManager:
         """Load FAISS collection from disk"""
         
         try:
-            # Load FAISS index
-            index_path = os.path.join(self.base_path, f"{collection_name}.index")
-            if os.path.exists(index_path):
-                self.collections[collection_name]['index'] = faiss.read_index(index_path)
-                logger.debug(f"Loaded FAISS index for {collection_name}")
-            else:
-                logger.warning(f"FAISS index file not found for {collection_name}")
-            
-            # Load metadata
-            metadata_path = os.path.join(self.base_path, f"{collection_name}_metadata.pkl")
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'rb') as f:
-                    self.collections[collection_name]['metadata_store'] = pickle.load(f)
-                logger.debug(f"Loaded metadata for {collection_name}")
-            else:
-                logger.warning(f"Metadata file not found for {collection_name}")
-            
-            # Load config
-            config_path = os.path.join(self.base_path, f"{collection_name}_config.json")
-            if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                    self.collections[collection_name]['doc_count'] = config_data.get('doc_count', 0)
-                    self.collections[collection_name]['last_updated'] = config_data.get('last_updated', time.time())
-            
-            self.collections[collection_name]['loaded'] = True
-            
+            # Another worker migrating or saving these files finishes before they are read
+            with self.collections[collection_name]['file_lock']:
+                # Load FAISS index
+                index_path = os.path.join(self.base_path, f"{collection_name}.index")
+                if os.path.exists(index_path):
+                    self._read_index_file(collection_name, index_path, mmap=self.index_load_mode == 'mmap')
+                    logger.debug(f"Loaded FAISS index for {collection_name} ({self.index_load_mode})")
+                else:
+                    logger.warning(f"FAISS index file not found for {collection_name}")
+                
+                # Load document store, migrating a legacy metadata pickle on first start
+                collection = self.collections[collection_name]
+                if DocumentStore.exists(self.base_path, collection_name):
+                    collection['doc_store'] = DocumentStore.load(self.base_path, collection_name)
+                    logger.debug(f"Loaded document store for {collection_name}")
+                else:
+                    stored_ids = None
+                    if os.path.exists(index_path):
+                        stored_ids = faiss.vector_to_array(collection['index'].id_map)
+                    migrated_store = migrate_pickle_store(self.base_path, collection_name, stored_ids)
+                    if migrated_store is not None:
+                        collection['doc_store'] = migrated_store
+                    else:
+                        logger.warning(f"Metadata file not found for {collection_name}")
+                
+                self._set_tombstones(collection, self._read_tombstones(self.base_path, collection_name))
+                if BM25Index.exists(self.base_path, collection_name):
+                    collection['lexical_index'] = BM25Index.load(self.base_path, collection_name)
+                
+                # Load config
+                config_path = os.path.join(self.base_path, f"{collection_name}_config.json")
+                if os.path.exists(config_path):
+                    with open(config_path, 'r', encoding='utf-8') as f:
+                        config_data = json.load(f)
+                        self.collections[collection_name]['doc_count'] = config_data.get('doc_count', 0)
+                        self.collections[collection_name]['last_updated'] = config_data.get('last_updated', time.time())
+                        self.collections[collection_name]['next_id'] = config_data.get(
+                            'next_id', config_data.get('doc_count', 0)
+                        )
+                        # Older configs did not record it: assume the index was trained on what it held
+                        self.collections[collection_name]['trained_vectors'] = config_data.get(
+                            'trained_vectors', config_data.get('total_size', 0)
+                        )
+                
+                self._replay_delta_log(collection_name)
+                self._prune_tombstones(collection)
+                collection['doc_count'] = self._live_count(collection)
+                await self._migrate_legacy_ids(collection_name)
+                await self._backfill_vectors(collection_name)
+                self._index_records(collection)
+                if self.unified_index is not None:
+                    self._register_in_unified_index(collection_name)
+                
+                # Memory-mapped readers serve the index as published; only writers rebuild it
+                if not collection['read_only']:
+                    self._schedule_index_rebuild(collection_name)
+                
+                self.collections[collection_name]['loaded'] = True
+        
         except Exception as e:
             logger.error(f"Error loading collection {collection_name}: {e}")
             # Mark as loaded even if some files missing (for new collections)
             self.collections[collection_name]['loaded'] = True
     
+    def _replay_delta_log(self, collection_name: str):
+        """Re-apply logged adds that are missing from the base index or document store, then logged removals
+        
+        Each part is checked on its own, so a crash part-way through a compaction
+        (index replaced, document store not yet) still converges.
+        """
+        
+        collection = self.collections[collection_name]
+        entries = collection['delta_log'].read()
+        if not entries:
+            return
+        
+        index_ids = faiss.vector_to_array(collection['index'].id_map)
+        last_indexed_id = int(index_ids.max()) if len(index_ids) else -1  # Ids are allocated in increasing order
+        doc_store = collection['doc_store']
+        sequence_mask = (1 << self.id_sequence_bits) - 1
+        
+        index_records, index_vectors, store_records, store_vectors = [], [], [], []
+        removed_ids = []
+        for entry, vector in entries:
+            if entry.get('op') == 'remove':
+                removed_ids.append(entry['faiss_id'])
+                continue
+            
+            record = entry['record']
+            faiss_id = record['faiss_id']
+            if faiss_id > last_indexed_id:
+                index_records.append(record)
+                index_vectors.append(vector)
+            if faiss_id not in doc_store:
+                store_records.append(record)
+                store_vectors.append(vector)
+            collection['next_id'] = max(collection['next_id'], (faiss_id & sequence_mask) + 1)
+            collection['last_updated'] = max(collection['last_updated'], record['added_at'])
+        
+        if index_records:
+            self._ensure_writable(collection_name)
+            with collection['index_lock'].write():
+                collection['index'].add_with_ids(
+                    np.vstack(index_vectors),
+                    np.array([record['faiss_id'] for record in index_records], dtype=np.int64)
+                )
+        if store_records:
+            doc_store.append(store_records, np.vstack(store_vectors))
+        if removed_ids:
+            self._add_tombstones(collection, removed_ids)
+            doc_store.remove(removed_ids)
+        collection['doc_count'] = self._live_count(collection)
+        
+        logger.info(
+            f"Replayed {len(entries)} delta log entries for {collection_name} "
+            f"({len(index_records)} re-indexed, {len(removed_ids)} tombstoned)"
+        )
+    
+    @staticmethod
+    def _read_tombstones(directory: str, collection_name: str) -> np.ndarray:
+        """Tombstoned ids saved next to a collection's index (empty if none)"""
+        
+        tombstone_path = os.path.join(directory, f"{collection_name}_tombstones.npy")
+        if not os.path.exists(tombstone_path):
+            return np.zeros(0, dtype=np.int64)
+        return np.load(tombstone_path).astype(np.int64)
+    
+    @staticmethod
+    def _index_records(collection: Dict):
+        """Rebuild a collection's metadata and content digest indexes in one pass over its records
+        
+        The BM25 index is persisted, so only records it is missing (e.g. replayed from the
+        delta log) are tokenised, and documents no longer stored are dropped from it.
+        """
+        
+        metadata_index = MetadataIndex()
+        digest_index = ContentDigestIndex()
+        lexical_index = collection['lexical_index']
+        stored_ids = []
+        for record in collection['doc_store'].iter_records():
+            metadata_index.add([record])
+            digest_index.add([record])
+            if record['faiss_id'] not in lexical_index:
+                lexical_index.add([record])
+            stored_ids.append(record['faiss_id'])
+        
+        stale_ids = np.setdiff1d(lexical_index.doc_ids(), np.asarray(stored_ids, dtype=np.int64))
+        if len(stale_ids):
+            lexical_index.remove(stale_ids)
+        
+        collection['metadata_index'] = metadata_index
+        collection['digest_index'] = digest_index
+    
+    def _read_index_file(self, collection_name: str, index_path: str, mmap: bool):
+        """Read a FAISS index from disk into a collection, optionally memory-mapped and read-only"""
+        
+        index_with_ids, index = self._read_index(index_path, mmap)
+        if mmap and index_type_of(index) != 'ivf':
+            logger.info(f"{collection_name} is a {index_type_of(index)} index: read into memory, only IVF lists are mapped")
+        self._swap_index(self.collections[collection_name], index_with_ids, index, read_only=mmap)
+    
+    @staticmethod
+    def _read_index(index_path: str, mmap: bool) -> Tuple[faiss.Index, faiss.Index]:
+        """Read an IndexIDMap2 and its downcast base index"""
+        
+        io_flags = 0
+        if mmap:
+            # IO_FLAG_MMAP only maps IVF inverted lists: Flat and HNSW codes (and the IVF
+            # quantizer) are read into memory whatever the flags
+            io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        
+        index = faiss.read_index(index_path, io_flags)
+        return index, faiss.downcast_index(index.index)
+    
+    def _ensure_writable(self, collection_name: str):
+        """Swap a memory-mapped index for a private in-memory copy before modifying it"""
+        
+        collection = self.collections[collection_name]
+        if collection['snapshot'] is not None:
+            raise RuntimeError(
+                f"Collection {collection_name} is served from snapshot {collection['snapshot']} and is read-only"
+            )
+        if not collection['read_only']:
+            return
+        
+        index_path = os.path.join(self.base_path, f"{collection_name}.index")
+        self._read_index_file(collection_name, index_path, mmap=False)
+        logger.info(f"Reloaded {collection_name} into memory for writing")
+    
     async def load_all_collections(self):
         """Load all collections from disk"""
         
@@ -563,6 +2126,14 @@ class FAISSCollectionManager:
         if not self.collections:
             await self.initialize_collections()
         
+        # Snapshot-serving workers start from the published version, not the writer's files
+        if self.snapshot_watch_interval > 0:
+            version = self.snapshots.current()
+            if version is not None:
+                await self._load_snapshot(version)
+                return
+            logger.warning("No published snapshot yet; serving working collection files")
+        
         for collection_name in self.collection_configs.keys():
             try:
                 await self._load_collection(collection_name)
@@ -576,17 +2147,142 @@ class FAISSCollectionManager:
         
         logger.info("Finished loading all collections")
     
+    async def publish_snapshot(self) -> str:
+        """Compact every collection and publish its files as a new immutable snapshot version"""
+        
+        file_names = []
+        for name, collection in self.collections.items():
+            if not collection['loaded'] or collection['snapshot'] is not None:
+                continue
+            await self._save_collection(name)
+            file_names.append(f"{name}.index")
+            file_names.append(f"{name}_config.json")
+            file_names.append(f"{name}_tombstones.npy")
+            file_names.append(os.path.basename(BM25Index.file_path(self.base_path, name)))
+            file_names.extend(
+                os.path.basename(path) for path in DocumentStore.file_paths(self.base_path, name).values()
+            )
+        
+        return self.snapshots.publish(self.base_path, file_names)
+    
+    def _read_snapshot(self, version: str) -> Tuple[Dict[str, Dict], Optional[faiss.Index]]:
+        """Load every collection of a snapshot into new state (blocking; runs on a worker thread)"""
+        
+        directory = self.snapshots.path(version)
+        mmap = self.index_load_mode == 'mmap'
+        collections = {}
+        
+        for name, config in self.collection_configs.items():
+            collection = self._new_collection_state(name, config, directory)
+            collection['snapshot'] = version
+            
+            index_path = os.path.join(directory, f"{name}.index")
+            if os.path.exists(index_path):
+                collection['index'], collection['base_index'] = self._read_index(index_path, mmap)
+                collection['read_only'] = mmap
+            if DocumentStore.exists(directory, name):
+                collection['doc_store'] = DocumentStore.load(directory, name)
+            self._set_tombstones(collection, self._read_tombstones(directory, name))
+            if BM25Index.exists(directory, name):
+                collection['lexical_index'] = BM25Index.load(directory, name)
+            
+            config_path = os.path.join(directory, f"{name}_config.json")
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config_data = json.load(f)
+                collection['next_id'] = config_data.get('next_id', 0)
+                collection['last_updated'] = config_data.get('last_updated', collection['last_updated'])
+                collection['trained_vectors'] = config_data.get('trained_vectors', config_data.get('total_size', 0))
+            
+            collection['doc_count'] = self._live_count(collection)
+            self._index_records(collection)
+            collection['loaded'] = True
+            collections[name] = collection
+        
+        unified_index = None
+        if self.unified_index is not None:
+            unified_index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedding_dim))
+            for collection in collections.values():
+                ids, vectors = self._export_vectors(collection)
+                if len(ids):
+                    unified_index.add_with_ids(vectors, ids)
+        
+        return collections, unified_index
+    
+    async def _load_snapshot(self, version: str):
+        """Load a snapshot off the event loop, then swap it in with a single reference assignment
+        
+        In-flight searches keep the collection dicts they already hold (double buffering).
+        """
+        
+        start = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            collections, unified_index = await loop.run_in_executor(None, self._read_snapshot, version)
+        except Exception as e:
+            self.snapshot_state['error'] = f"{version}: {e}"
+            logger.error(f"Failed to load snapshot {version}: {e}")
+            return
+        
+        self.collections = collections
+        if unified_index is not None:
+            self.unified_index = unified_index
+        self.snapshot_state = {'version': version, 'loaded_at': time.time(), 'error': None}
+        
+        logger.info(f"Serving snapshot {version} (loaded in {time.time() - start:.2f}s)")
+    
+    def start_snapshot_watcher(self):
+        """Poll the CURRENT pointer and hot-swap newly published snapshots"""
+        
+        if self.snapshot_watch_interval <= 0 or self._snapshot_watcher is not None:
+            return
+        self._snapshot_watcher = asyncio.create_task(self._watch_snapshots())
+    
+    async def _watch_snapshots(self):
+        while True:
+            await asyncio.sleep(self.snapshot_watch_interval)
+            try:
+                version = self.snapshots.current()
+                if version is not None and version != self.snapshot_state['version']:
+                    await self._load_snapshot(version)
+            except Exception as e:
+                logger.error(f"Snapshot watcher error: {e}")
+    
     async def health_check(self) -> Dict[str, Any]:
         """Health check for all collections"""
         
+        # A snapshot-serving worker is ready once it serves the published version
+        serving_snapshots = self.snapshot_watch_interval > 0
+        latest_snapshot = self.snapshots.current() if serving_snapshots else None
+        
         status = {
             'all_loaded': True,
+            'ready': True,
             'total_collections': len(self.collection_configs),
             'collections': {},
+            'snapshot': {
+                'serving': serving_snapshots,
+                'version': self.snapshot_state['version'],
+                'latest': latest_snapshot,
+                'loaded_at': self.snapshot_state['loaded_at'],
+                'error': self.snapshot_state['error']
+            },
+            'unified_index': {
+                'enabled': self.unified_index is not None,
+                'size': self.unified_index.ntotal if self.unified_index is not None else 0
+            },
+            'index_policy': self.index_policy.get_settings(),
+            'search_pool': {
+                'workers': self.search_workers,
+                'omp_threads': self.search_omp_threads
+            },
             'embedding_model': {
-                'model_name': self.embedding_model.get_sentence_embedding_dimension() is not None,
-                'dimension': self.embedding_dim
-            }
+                'model_name': self.embedding_model_name,
+                'backend': self.embedding_backend_name,
+                'dimension': self.embedding_dim,
+                'batcher': self.embedding_batcher.get_stats() if self.embedding_batcher else None
+            },
+            'cross_encoder': self.cross_encoder.get_stats() if self.cross_encoder is not None else None
         }
         
         for name, collection in self.collections.items():
@@ -595,6 +2291,13 @@ class FAISSCollectionManager:
                 'doc_count': collection['doc_count'],
                 'index_size': collection['index'].ntotal if collection['loaded'] else 0,
                 'last_updated': collection.get('last_updated', 0),
+                'memory_mapped': collection['read_only'] and index_type_of(collection['base_index']) == 'ivf',
+                'delta_entries': collection['delta_log'].entry_count,
+                'tombstones': len(collection['tombstones']),
+                'lexical_docs': len(collection['lexical_index']),
+                'index_type': index_type_of(collection['base_index']),
+                'compression': compression_of(collection['base_index']),
+                'rebuilding': collection['rebuild_task'] is not None and not collection['rebuild_task'].done(),
                 'config': {
                     'index_type': collection['config']['index_type'],
                     'max_docs': collection['config']['max_docs']
@@ -607,6 +2310,9 @@ class FAISSCollectionManager:
             
             status['collections'][name] = collection_status
         
+        status['ready'] = status['all_loaded'] and (
+            latest_snapshot is None or self.snapshot_state['version'] is not None
+        )
         return status
     
     async def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
@@ -624,21 +2330,35 @@ class FAISSCollectionManager:
             'index_size': collection['index'].ntotal if collection['loaded'] else 0,
             'last_updated': collection.get('last_updated', 0),
             'config': collection['config'],
-            'metadata_count': len(collection['metadata_store'])
+            'metadata_count': len(collection['doc_store']),
+            'tombstone_count': len(collection['tombstones'])
         }
         
         # Calculate content statistics
-        if collection['metadata_store']:
-            content_lengths = [
-                len(meta['content']) 
-                for meta in collection['metadata_store'].values()
-            ]
+        if len(collection['doc_store']):
+            content_lengths = collection['doc_store'].content_lengths()
             
             stats['content_stats'] = {
-                'avg_length': sum(content_lengths) / len(content_lengths),
-                'min_length': min(content_lengths),
-                'max_length': max(content_lengths),
-                'total_characters': sum(content_lengths)
+                'avg_length': float(content_lengths.mean()),
+                'min_length': int(content_lengths.min()),
+                'max_length': int(content_lengths.max()),
+                'total_characters': int(content_lengths.sum())
             }
         
-        return stats
\ No newline at end of file
+        return stats
+    
+    async def close(self):
+        """Stop background work and release the embedding executor"""
+        
+        if self._snapshot_watcher is not None:
+            self._snapshot_watcher.cancel()
+        for collection in self.collections.values():
+            if collection['rebuild_task'] is not None:
+                collection['rebuild_task'].cancel()
+        
+        self.embedding_executor.shutdown(wait=False, cancel_futures=True)
+        if self.search_executor is not None:
+            self.search_executor.shutdown(wait=False, cancel_futures=True)
+        if self.cross_encoder is not None:
+            self.cross_encoder.close()
+        logger.info("Embedding executor shut down")
@@ -0,0 +1,354 @@
+#engines/index_policy.py
+"""
+Index Policy - Chooses and builds the FAISS index type of a collection from its size and latency target
+
+Usage:
+    python -m engines.index_policy compare --base-path ./data/faiss_indices
+"""
+import os
+import json
+import math
+import time
+import argparse
+import logging
+from typing import Dict, Optional, Any
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+COMPRESSIONS = (None, 'sq8', 'pq')
+
+
+class IndexPolicy:
+    """Flat while a brute-force scan fits the latency target, then IVF, then HNSW"""
+    
+    def __init__(
+        self,
+        latency_target_ms: float = 1.0,
+        flat_vectors_per_ms: int = 10000,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        min_points_per_centroid: int = 39,
+        retrain_growth: float = 2.0,
+        compression: Optional[str] = None,
+        pq_m: int = 96,
+        rerank_factor: int = 4
+    ):
+        self.latency_target_ms = latency_target_ms
+        self.flat_vectors_per_ms = flat_vectors_per_ms  # Single-query IndexFlatIP scan throughput
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.min_points_per_centroid = min_points_per_centroid  # Below this FAISS warns about training
+        self.retrain_growth = retrain_growth  # Retrain once nlist drifts or the collection grows this far
+        
+        # Default vector compression: None (float32), 'sq8' (4x smaller) or 'pq' (IVF-PQ, pq_m bytes/vector)
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.compression = compression
+        self.pq_m = pq_m
+        self.rerank_factor = rerank_factor  # Candidates fetched per result for exact re-ranking
+    
+    def ideal_nlist(self, num_vectors: int) -> int:
+        """~4·sqrt(n) centroids, capped so every centroid gets enough training points"""
+        return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // self.min_points_per_centroid))
+    
+    def estimate_latency_ms(self, index_type: str, num_vectors: int) -> float:
+        """Rough single-query cost as the number of vectors compared, scaled by flat scan throughput"""
+        
+        if index_type == 'flat':
+            scanned = num_vectors
+        elif index_type == 'ivf':
+            nlist = self.ideal_nlist(num_vectors)
+            scanned = nlist + num_vectors * min(self.nprobe, nlist) / nlist
+        else:
+            # HNSW visits ~efSearch candidates per layer, each with up to 2·M neighbours
+            scanned = self.ef_search * 2 * self.hnsw_m * max(1.0, math.log2(max(num_vectors, 2)) / 4)
+        return scanned / self.flat_vectors_per_ms
+    
+    def pq_trainable(self, num_vectors: int) -> bool:
+        """PQ codebooks (256 centroids per sub-quantizer) need enough training points"""
+        return num_vectors >= self.min_points_per_centroid * 256
+    
+    def choose_compression(self, config: Dict, num_vectors: int) -> Optional[str]:
+        """Compression for a collection of num_vectors; PQ falls back to SQ8 until it can be trained"""
+        
+        compression = config.get('compression', self.compression)
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression is None or num_vectors == 0:
+            return None  # Quantizers are trained on data: empty collections start uncompressed
+        if compression == 'pq' and not self.pq_trainable(num_vectors):
+            return 'sq8'
+        return compression
+    
+    def choose(self, config: Dict, num_vectors: int) -> str:
+        """Index type for a collection of num_vectors; a non-'auto' config type is honoured when buildable"""
+        
+        requested = config.get('index_type', 'auto')
+        latency_target_ms = config.get('latency_target_ms', self.latency_target_ms)
+        ivf_trainable = num_vectors >= self.min_points_per_centroid * 2
+        
+        # IVF-PQ is an IVF index by construction
+        if self.choose_compression(config, num_vectors) == 'pq':
+            return 'ivf'
+        
+        if requested in INDEX_TYPES:
+            return 'flat' if requested == 'ivf' and not ivf_trainable else requested
+        if requested != 'auto':
+            raise ValueError(f"Unknown index type: {requested}")
+        
+        if self.estimate_latency_ms('flat', num_vectors) <= latency_target_ms or not ivf_trainable:
+            return 'flat'
+        if self.estimate_latency_ms('ivf', num_vectors) <= latency_target_ms:
+            return 'ivf'
+        return 'hnsw'
+    
+    def needs_rebuild(
+        self,
+        config: Dict,
+        base_index: faiss.Index,
+        num_vectors: int,
+        trained_vectors: int = 0
+    ) -> bool:
+        """Whether the live index no longer matches the policy for the collection's size
+        
+        trained_vectors is the number of vectors the index was trained on (0 if unknown).
+        """
+        
+        current_type = index_type_of(base_index)
+        if current_type != self.choose(config, num_vectors):
+            return True
+        compression = compression_of(base_index)
+        if compression != self.choose_compression(config, num_vectors):
+            return True
+        
+        # SQ8 ranges and PQ codebooks only cover the sample they were trained on
+        if compression is not None and trained_vectors and num_vectors / trained_vectors >= self.retrain_growth:
+            return True
+        
+        if current_type == 'ivf':
+            ratio = self.ideal_nlist(num_vectors) / faiss.extract_index_ivf(base_index).nlist
+            return ratio >= self.retrain_growth or ratio <= 1 / self.retrain_growth
+        return False
+    
+    def build(
+        self,
+        index_type: str,
+        dimension: int,
+        vectors: Optional[np.ndarray] = None,
+        compression: Optional[str] = None
+    ) -> faiss.Index:
+        """Create (and train, for IVF and quantizers) an empty inner-product index of the given type"""
+        
+        if (index_type == 'ivf' or compression) and (vectors is None or not len(vectors)):
+            raise ValueError(f"{index_type}/{compression} index needs training vectors")
+        sq8 = faiss.ScalarQuantizer.QT_8bit
+        
+        if index_type == 'flat':
+            # Use Inner Product for cosine similarity (normalized vectors)
+            if compression == 'sq8':
+                index = faiss.IndexScalarQuantizer(dimension, sq8, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+                return index
+            return faiss.IndexFlatIP(dimension)
+        
+        if index_type == 'ivf':
+            quantizer = faiss.IndexFlatIP(dimension)
+            nlist = self.ideal_nlist(len(vectors))
+            if compression == 'pq':
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, self.pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+            elif compression == 'sq8':
+                index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, sq8, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = self.nprobe
+            return index
+        
+        if index_type == 'hnsw':
+            if compression == 'sq8':
+                index = faiss.IndexHNSWSQ(dimension, sq8, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+            else:
+                index = faiss.IndexHNSWFlat(dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.ef_construction
+            index.hnsw.efSearch = self.ef_search
+            return index
+        
+        raise ValueError(f"Unknown index type: {index_type}")
+    
+    def search_parameters(
+        self,
+        base_index: faiss.Index,
+        selector: Optional[faiss.IDSelector] = None
+    ) -> Optional[faiss.SearchParameters]:
+        """Per-search nprobe / efSearch tunables plus an optional id selector"""
+        
+        index_type = index_type_of(base_index)
+        if index_type == 'ivf':
+            params = faiss.SearchParametersIVF()
+            params.nprobe = self.nprobe
+        elif index_type == 'hnsw':
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = self.ef_search
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        
+        if selector is not None:
+            params.sel = selector
+        return params
+    
+    def get_settings(self) -> Dict:
+        return {
+            'latency_target_ms': self.latency_target_ms,
+            'nprobe': self.nprobe,
+            'ef_search': self.ef_search,
+            'hnsw_m': self.hnsw_m,
+            'compression': self.compression,
+            'rerank_factor': self.rerank_factor
+        }
+
+
+def index_type_of(base_index: faiss.Index) -> str:
+    """Policy name of a (downcast) FAISS index"""
+    
+    if faiss.try_extract_index_ivf(base_index) is not None:
+        return 'ivf'
+    if isinstance(base_index, faiss.IndexHNSW):
+        return 'hnsw'
+    return 'flat'
+
+
+def compression_of(base_index: faiss.Index) -> Optional[str]:
+    """Compression name of a (downcast) FAISS index"""
+    
+    if isinstance(base_index, faiss.IndexHNSW):
+        base_index = faiss.downcast_index(base_index.storage)
+    if isinstance(base_index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'sq8'
+    if isinstance(base_index, faiss.IndexIVFPQ):
+        return 'pq'
+    return None
+
+
+def exact_rerank(
+    query_matrix: np.ndarray,
+    scores: np.ndarray,
+    doc_ids: np.ndarray,
+    vectors: Optional[np.ndarray],
+    found: np.ndarray,
+    k: int
+):
+    """Re-score (Q, k') compressed-index candidates with float vectors and keep the top k per query
+    
+    Candidates without a stored vector keep their approximate score.
+    """
+    
+    if vectors is None:
+        return scores[:, :k], doc_ids[:, :k]
+    
+    vectors = vectors.reshape(doc_ids.shape + (-1,))
+    exact = np.einsum('qkd,qd->qk', vectors, query_matrix.astype(np.float32))
+    exact = np.where(found.reshape(doc_ids.shape), exact, scores)
+    exact = np.where(doc_ids != -1, exact, -np.inf)
+    
+    order = np.argsort(-exact, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(exact, order, axis=1), np.take_along_axis(doc_ids, order, axis=1)
+
+
+def compare_compression(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    policy: IndexPolicy,
+    k: int = 10,
+    index_type: str = 'flat'
+) -> Dict[str, Any]:
+    """Recall@k vs IndexFlatIP, latency and code size of each compression, with and without re-ranking"""
+    
+    dimension = vectors.shape[1]
+    ground_truth_index = faiss.IndexFlatIP(dimension)
+    ground_truth_index.add(vectors)
+    _, ground_truth = ground_truth_index.search(queries, k)
+    
+    def measure(index: faiss.Index, rerank: bool) -> Dict[str, float]:
+        fetch_k = k * policy.rerank_factor if rerank else k
+        params = policy.search_parameters(index)
+        latencies = []
+        hits = 0
+        for row in range(len(queries)):
+            query = queries[row:row + 1]
+            start = time.perf_counter()
+            scores, ids = index.search(query, fetch_k, params=params)
+            if rerank:
+                found = ids >= 0
+                scores, ids = exact_rerank(query, scores, ids, vectors[np.maximum(ids, 0)], found, k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(np.intersect1d(ids[0], ground_truth[row]))
+        return {
+            'recall_at_k': hits / (len(queries) * k),
+            'latency_ms_p50': float(np.median(latencies) * 1000),
+            'latency_ms_p95': float(np.percentile(latencies, 95) * 1000)
+        }
+    
+    report = {'num_vectors': len(vectors), 'num_queries': len(queries), 'k': k, 'results': {}}
+    for compression in COMPRESSIONS:
+        built_type = 'ivf' if compression == 'pq' else index_type
+        if compression == 'pq' and not policy.pq_trainable(len(vectors)):
+            continue
+        index = policy.build(built_type, dimension, vectors, compression)
+        index.add(vectors)
+        
+        code_bytes = faiss.serialize_index(index).nbytes / max(len(vectors), 1)
+        for rerank in ((False, True) if compression else (False,)):
+            name = f"{built_type}/{compression or 'float32'}" + ('+rerank' if rerank else '')
+            report['results'][name] = {**measure(index, rerank), 'bytes_per_vector': round(code_bytes, 1)}
+    
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index policy tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    compare_parser = subparsers.add_parser('compare', help="Recall/latency of compressed indexes on stored vectors")
+    compare_parser.add_argument('--base-path', default="./data/faiss_indices")
+    compare_parser.add_argument('--collection', help="Single collection (default: all stored vectors)")
+    compare_parser.add_argument('--index-type', default='flat', choices=INDEX_TYPES)
+    compare_parser.add_argument('--queries', type=int, default=200, help="Held-out stored vectors used as queries")
+    compare_parser.add_argument('--k', type=int, default=10)
+    compare_parser.add_argument('--pq-m', type=int, default=96)
+    compare_parser.add_argument('--rerank-factor', type=int, default=4)
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    suffix = "_vectors.npy"
+    matrices = [
+        np.load(os.path.join(args.base_path, filename))
+        for filename in sorted(os.listdir(args.base_path))
+        if filename.endswith(suffix) and args.collection in (None, filename[:-len(suffix)])
+    ]
+    if not matrices:
+        raise SystemExit(f"No stored vectors found in {args.base_path}")
+    
+    vectors = np.ascontiguousarray(np.concatenate(matrices), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 2), replace=False)
+    queries = vectors[query_rows]
+    vectors = np.delete(vectors, query_rows, axis=0)
+    
+    policy = IndexPolicy(pq_m=args.pq_m, rerank_factor=args.rerank_factor)
+    report = compare_compression(vectors, queries, policy, k=args.k, index_type=args.index_type)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
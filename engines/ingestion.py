@@ -0,0 +1,399 @@
+#engines/ingestion.py
+"""
+Ingestion Pipeline - Streams files from disk into FAISS collections
+
+Reads Markdown, plain text, HTML and PDF files, splits them into overlapping chunks,
+embeds chunk batches concurrently on the manager's embedding executor and writes
+vectors to the collection in large batches. Queues between the stages are bounded,
+so memory stays flat regardless of corpus size. Chunks whose content digest is already
+indexed are skipped before embedding, so re-running an ingest only pays for changes.
+
+Usage:
+    python -m engines.ingestion ./content/product_a_features --collection product_a_features
+    python -m engines.ingestion ./content --executor process --workers 4 --publish
+      (without --collection, each top-level sub-directory is ingested into the collection of the same name)
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import logging
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Any, Iterator, Set, Tuple
+import numpy as np
+
+from .faiss_manager import FAISSCollectionManager, DocumentChunk
+from .document_store import chunk_key, content_digest
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.md', '.markdown', '.txt', '.html', '.htm', '.pdf')
+
+# product_a_features -> product 'product_a', section 'features' (matches the chat context filter)
+COLLECTION_NAME_PATTERN = re.compile(r'^(product_[^_]+)_(.+)$')
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Visible text of an HTML page, with headings rewritten as Markdown headings"""
+    
+    BLOCK_TAGS = {'p', 'div', 'section', 'article', 'li', 'tr', 'br', 'table', 'ul', 'ol', 'pre', 'blockquote'}
+    HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+    SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'footer'}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in self.HEADING_LEVELS:
+            self.parts.append('\n\n' + '#' * self.HEADING_LEVELS[tag] + ' ')
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.HEADING_LEVELS or tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+    
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(re.sub(r'\s+', ' ', data))
+    
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+
+def read_document(path: str) -> str:
+    """Text of a supported file; HTML headings become Markdown headings"""
+    
+    extension = os.path.splitext(path)[1].lower()
+    
+    if extension == '.pdf':
+        try:
+            from pypdf import PdfReader
+        except ImportError as e:
+            raise ImportError("PDF ingestion requires pypdf") from e
+        return '\n\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)
+    
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    
+    if extension in ('.html', '.htm'):
+        extractor = _HTMLTextExtractor()
+        extractor.feed(text)
+        return extractor.text()
+    return text
+
+
+def split_sections(text: str) -> List[Tuple[Optional[str], str]]:
+    """Split Markdown-style text into (heading, body) sections"""
+    
+    sections = []
+    heading, lines = None, []
+    for line in text.splitlines():
+        match = re.match(r'^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$', line)
+        if match:
+            if any(body_line.strip() for body_line in lines):
+                sections.append((heading, '\n'.join(lines)))
+            heading, lines = match.group(1).strip() or heading, []
+        else:
+            lines.append(line)
+    
+    if any(body_line.strip() for body_line in lines):
+        sections.append((heading, '\n'.join(lines)))
+    return sections
+
+
+def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:
+    """Pack paragraphs into chunks of at most chunk_size characters, overlapping by ~chunk_overlap"""
+    
+    # Paragraphs longer than a chunk are cut on word boundaries first
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = re.sub(r'[ \t]+', ' ', paragraph).strip()
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind(' ', 0, chunk_size)
+            cut = cut if cut > chunk_size // 2 else chunk_size
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+    
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > chunk_size:
+            chunks.append(current)
+            # Carry the tail of the previous chunk, starting at a word boundary
+            tail = current[-chunk_overlap:] if chunk_overlap else ''
+            tail = tail[tail.find(' ') + 1:] if ' ' in tail else tail
+            current = f"{tail}\n\n{piece}" if tail and len(tail) + len(piece) + 2 <= chunk_size else piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def default_metadata(collection_name: str) -> Dict[str, Any]:
+    """Product/section metadata implied by a collection name such as product_a_features"""
+    
+    match = COLLECTION_NAME_PATTERN.match(collection_name)
+    if match:
+        return {'product': match.group(1), 'section': match.group(2)}
+    return {}
+
+
+class IngestionPipeline:
+    """Read -> chunk -> embed (concurrent, bounded) -> write (large batches) for FAISSCollectionManager"""
+    
+    def __init__(
+        self,
+        faiss_manager: FAISSCollectionManager,
+        chunk_size: int = 800,
+        chunk_overlap: int = 100,
+        embed_batch_size: int = 256,
+        write_batch_size: int = 4096,
+        max_in_flight: int = 4,
+        extra_metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.faiss_manager = faiss_manager
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.max_in_flight = max_in_flight  # Embedding batches queued or running at once
+        self.extra_metadata = extra_metadata or {}
+    
+    def iter_files(self, root: str, collection_name: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """(collection, path) pairs; without a collection name, top-level sub-directories name collections"""
+        
+        for directory, dir_names, file_names in os.walk(root):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                
+                path = os.path.join(directory, file_name)
+                target = collection_name
+                if target is None:
+                    target = os.path.relpath(path, root).split(os.sep)[0]
+                    if target == file_name or target not in self.faiss_manager.collections:
+                        logger.warning(f"Skipping {path}: not inside a collection directory")
+                        continue
+                yield target, path
+    
+    def iter_chunks(self, root: str, collection_name: Optional[str] = None) -> Iterator[Tuple[str, DocumentChunk]]:
+        """Stream (collection, chunk) pairs file by file"""
+        
+        for target, path in self.iter_files(root, collection_name):
+            try:
+                text = read_document(path)
+            except Exception as e:
+                logger.error(f"Failed to read {path}: {e}")
+                continue
+            
+            source = os.path.relpath(path, root)
+            base_metadata = {**default_metadata(target), **self.extra_metadata}
+            chunk_index = 0
+            for heading, body in split_sections(text):
+                for content in chunk_text(body, self.chunk_size, self.chunk_overlap):
+                    yield target, DocumentChunk(
+                        content=content,
+                        metadata={
+                            **base_metadata,
+                            'source': source,
+                            'heading': heading,
+                            'chunk_index': chunk_index,
+                            'file_type': os.path.splitext(path)[1].lower().lstrip('.')
+                        }
+                    )
+                    chunk_index += 1
+    
+    async def ingest_directory(self, root: str, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """Ingest every supported file under root; returns throughput stats
+        
+        Each file replaces its previous version: chunks it no longer has (e.g. a page that
+        got shorter) are deleted once all of its current chunks are written.
+        """
+        
+        start = time.time()
+        stats = {'chunks': 0, 'skipped': 0, 'written': 0, 'deleted': 0, 'collections': {}}
+        
+        # Per collection: ingested sources and the chunk keys they have now
+        current: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight)
+        
+        async def queue_changed(target: str, batch: List[DocumentChunk]):
+            """Queue the chunks of a batch that are new or changed since the last ingest"""
+            
+            sources, keys = current.setdefault(target, (set(), set()))
+            for chunk in batch:
+                sources.add(chunk.metadata['source'])
+                keys.add(chunk_key(chunk.metadata, content_digest(chunk.content)))
+            
+            # Selected once here; the writer passes the selection on instead of repeating it
+            positions, digests, replaced_ids = self.faiss_manager._select_changed_documents(target, batch)
+            stats['skipped'] += len(batch) - len(positions)
+            if positions:
+                changed = [batch[position] for position in positions]
+                await embed_queue.put((target, changed, (digests, replaced_ids)))
+        
+        async def produce():
+            """Chunk files into per-collection embedding batches"""
+            
+            pending: Dict[str, List[DocumentChunk]] = {}
+            for target, chunk in self.iter_chunks(root, collection_name):
+                batch = pending.setdefault(target, [])
+                batch.append(chunk)
+                stats['chunks'] += 1
+                if len(batch) >= self.embed_batch_size:
+                    await queue_changed(target, pending.pop(target))
+            for target, batch in pending.items():
+                await queue_changed(target, batch)
+            for _ in range(self.max_in_flight):
+                await embed_queue.put(None)
+        
+        async def embed():
+            """Encode batches on the manager's embedding executor"""
+            
+            while True:
+                item = await embed_queue.get()
+                if item is None:
+                    return
+                target, batch, changes = item
+                embeddings = await self.faiss_manager._encode_in_executor([chunk.content for chunk in batch])
+                await write_queue.put((target, batch, changes, embeddings))
+        
+        async def embed_all():
+            await asyncio.gather(*(embed() for _ in range(self.max_in_flight)))
+            await write_queue.put(None)
+        
+        async def write():
+            """Add embedded chunks to their collection once a large batch has accumulated"""
+            
+            buffers: Dict[str, Tuple[List[DocumentChunk], List[str], List[Optional[int]], List[np.ndarray]]] = {}
+            
+            async def flush(target: str):
+                chunks, digests, replaced_ids, embeddings = buffers.pop(target)
+                added = await self.faiss_manager.add_documents_to_collection(
+                    target, chunks, np.vstack(embeddings),
+                    changes=(list(range(len(chunks))), digests, replaced_ids)
+                )
+                stats['written'] += added
+                stats['collections'][target] = stats['collections'].get(target, 0) + added
+                elapsed = time.time() - start
+                logger.info(f"Wrote {stats['written']} chunks ({stats['written'] / max(elapsed, 1e-9):.1f} chunks/s)")
+            
+            while True:
+                item = await write_queue.get()
+                if item is None:
+                    break
+                target, batch, (batch_digests, batch_replaced_ids), embeddings = item
+                chunks, digests, replaced_ids, vectors = buffers.setdefault(target, ([], [], [], []))
+                chunks.extend(batch)
+                digests.extend(batch_digests)
+                replaced_ids.extend(batch_replaced_ids)
+                vectors.append(embeddings)
+                if len(chunks) >= self.write_batch_size:
+                    await flush(target)
+            
+            for target in list(buffers):
+                await flush(target)
+        
+        # A failing stage cancels the others instead of leaving them blocked on a full queue
+        stages = [asyncio.create_task(stage) for stage in (produce(), embed_all(), write())]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            raise
+        
+        for target, (sources, keys) in current.items():
+            deleted = await self.faiss_manager.delete_stale_chunks(target, sources, keys)
+            if deleted:
+                stats['deleted'] += deleted
+                stats['collections'].setdefault(target, 0)
+        
+        # Fold the delta logs into the base files and let pending index rebuilds finish
+        for target in stats['collections']:
+            await self.faiss_manager._save_collection(target)
+            rebuild_task = self.faiss_manager.collections[target]['rebuild_task']
+            if rebuild_task is not None:
+                await rebuild_task
+        
+        elapsed = time.time() - start
+        stats['seconds'] = round(elapsed, 2)
+        stats['chunks_per_second'] = round(stats['written'] / max(elapsed, 1e-9), 1)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into FAISS collections")
+    parser.add_argument('root', help="Directory of .md/.txt/.html/.pdf files")
+    parser.add_argument('--collection', help="Target collection (default: top-level sub-directory names)")
+    parser.add_argument('--base-path', default="./data/faiss_indices")
+    parser.add_argument('--chunk-size', type=int, default=800)
+    parser.add_argument('--chunk-overlap', type=int, default=100)
+    parser.add_argument('--embed-batch-size', type=int, default=256)
+    parser.add_argument('--write-batch-size', type=int, default=4096)
+    parser.add_argument('--executor', default='thread', choices=['thread', 'process'])
+    parser.add_argument('--workers', type=int, default=2, help="Embedding executor workers")
+    parser.add_argument('--backend', default='sentence_transformer')
+    parser.add_argument('--onnx-model-dir')
+    parser.add_argument('--metadata', action='append', default=[], help="Extra chunk metadata as key=value")
+    parser.add_argument('--publish', action='store_true', help="Publish a snapshot when done")
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'),
+                        help="Mirror chunks into document_metadata (default: $DATABASE_URL)")
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    async def run():
+        faiss_manager = FAISSCollectionManager(
+            base_path=args.base_path,
+            embedding_executor=args.executor,
+            embedding_workers=args.workers,
+            embedding_batch_wait_ms=0,  # Bulk batches are already large
+            embedding_backend=args.backend,
+            onnx_model_dir=args.onnx_model_dir
+        )
+        if args.database_url:
+            from utils.document_registry import DocumentRegistry
+            faiss_manager.set_document_registry(DocumentRegistry(args.database_url))
+        
+        try:
+            await faiss_manager.initialize_collections()
+            await faiss_manager.load_all_collections()
+            
+            pipeline = IngestionPipeline(
+                faiss_manager,
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap,
+                embed_batch_size=args.embed_batch_size,
+                write_batch_size=args.write_batch_size,
+                max_in_flight=args.workers * 2,
+                extra_metadata=dict(item.split('=', 1) for item in args.metadata)
+            )
+            stats = await pipeline.ingest_directory(args.root, args.collection)
+            if args.publish:
+                stats['snapshot'] = await faiss_manager.publish_snapshot()
+            print(json.dumps(stats, indent=2, ensure_ascii=False))
+        finally:
+            await faiss_manager.close()
+    
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
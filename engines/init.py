@@ -6,6 +6,9 @@ Contains all the core processing engines
 
 from .intent_classifier import IntentClassifier, IntentType, IntentResult
 from .faiss_manager import FAISSCollectionManager, DocumentChunk
+from .embedding_backends import EmbeddingBackend, create_embedding_backend
+from .document_store import DocumentStore
+from .index_policy import IndexPolicy
 from .llm_provider import MultiLLMProvider, LLMProvider
 from .response_generator import ContextualResponseGenerator
 
@@ -15,6 +18,10 @@ __all__ = [
     'IntentResult',
     'FAISSCollectionManager',
     'DocumentChunk',
+    'EmbeddingBackend',
+    'create_embedding_backend',
+    'DocumentStore',
+    'IndexPolicy',
     'MultiLLMProvider',
     'LLMProvider',
     'ContextualResponseGenerator'
@@ -85,6 +85,28 @@ class IntentClassifier:
             ]
         }
     
+        # Static refined-query templates per intent; 'product' entries are
+        # formatted with the target product when one is known
+        self.refined_query_templates = {
+            IntentType.PRODUCT_INQUIRY: {
+                'product': ["{target_product} tính năng", "{target_product} chức năng"],
+                'general': ["đặc điểm sản phẩm", "tính năng chính", "product features"]
+            },
+            IntentType.PRICING_INQUIRY: {
+                'product': ["{target_product} giá cả", "{target_product} pricing"],
+                'general': ["bảng giá dịch vụ", "gói cước phí", "pricing plans"]
+            },
+            IntentType.SUPPORT_REQUEST: {
+                'general': ["hướng dẫn sử dụng", "cách thức hoạt động", "hỗ trợ khách hàng", "user guide"]
+            },
+            IntentType.WARRANTY_INQUIRY: {
+                'general': ["chính sách bảo hành", "điều khoản đảm bảo", "hoàn tiền dịch vụ", "warranty policy"]
+            },
+            IntentType.CONTACT_REQUEST: {
+                'general': ["thông tin liên hệ", "địa chỉ công ty", "hotline hỗ trợ", "contact information"]
+            }
+        }
+    
     def set_llm_provider(self, llm_provider):
         """Inject LLM provider dependency"""
         self.llm_provider = llm_provider
@@ -130,6 +152,28 @@ class IntentClassifier:
             reasoning=llm_result.reasoning
         )
     
+    def get_static_refined_queries(self) -> List[str]:
+        """List every refined query that does not depend on the user's message"""
+        
+        known_products = {
+            product
+            for mapping in self.intent_collection_map.values()
+            if isinstance(mapping, dict)
+            for product in mapping
+            if product != 'general'
+        }
+        
+        static_queries = []
+        for templates in self.refined_query_templates.values():
+            for product in sorted(known_products):
+                static_queries.extend(
+                    template.format(target_product=product)
+                    for template in templates.get('product', [])
+                )
+            static_queries.extend(templates.get('general', []))
+        
+        return list(dict.fromkeys(static_queries))
+    
     def _extract_product_context(self, context: 'PageContext') -> Optional[str]:
         """Extract product from page context"""
         
@@ -319,53 +363,13 @@ Return JSON format:
         refined_queries = [original_query]  # Always include original
         
         # Generate variations based on intent
-        if intent == IntentType.PRODUCT_INQUIRY:
-            if target_product:
-                refined_queries.extend([
-                    f"{target_product} tính năng",
-                    f"{target_product} chức năng"
-                ])
-            refined_queries.extend([
-                "đặc điểm sản phẩm",
-                "tính năng chính",
-                "product features"
-            ])
-            
-        elif intent == IntentType.PRICING_INQUIRY:
-            if target_product:
-                refined_queries.extend([
-                    f"{target_product} giá cả",
-                    f"{target_product} pricing"
-                ])
-            refined_queries.extend([
-                "bảng giá dịch vụ",
-                "gói cước phí",
-                "pricing plans"
-            ])
-            
-        elif intent == IntentType.SUPPORT_REQUEST:
-            refined_queries.extend([
-                "hướng dẫn sử dụng",
-                "cách thức hoạt động",
-                "hỗ trợ khách hàng",
-                "user guide"
-            ])
-            
-        elif intent == IntentType.WARRANTY_INQUIRY:
-            refined_queries.extend([
-                "chính sách bảo hành",
-                "điều khoản đảm bảo",
-                "hoàn tiền dịch vụ",
-                "warranty policy"
-            ])
-            
-        elif intent == IntentType.CONTACT_REQUEST:
-            refined_queries.extend([
-                "thông tin liên hệ",
-                "địa chỉ công ty",
-                "hotline hỗ trợ",
-                "contact information"
-            ])
+        templates = self.refined_query_templates.get(intent, {})
+        if target_product:
+            refined_queries.extend(
+                template.format(target_product=target_product)
+                for template in templates.get('product', [])
+            )
+        refined_queries.extend(templates.get('general', []))
         
         # Remove duplicates and limit to 4 queries
         seen = set()
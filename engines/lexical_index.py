@@ -0,0 +1,300 @@
+#engines/lexical_index.py
+"""
+Lexical Index - In-process BM25 over chunk text with Vietnamese-aware tokenisation
+
+Text is lower-cased and stripped of diacritics (đ -> d), so "bảo hành" and "bao hanh" match.
+Tokens are syllables, adjacent-syllable bigrams (Vietnamese words are mostly two syllables)
+and, for codes such as "199.000đ", "1900-1234" or "E-401", the pieces, the joined form and any
+bare amount ("199000").
+
+On-disk layout per collection:
+    {name}_bm25.npz   terms, posting offsets/ids/term frequencies, document ids/lengths
+"""
+import os
+import re
+import math
+import unicodedata
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from .document_store import unique_tmp_path
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[.,:/_-][a-z0-9]+)*')
+SEPARATOR_PATTERN = re.compile(r'[.,:/_-]')
+AMOUNT_WITH_UNIT_PATTERN = re.compile(r'^(\d+)[a-z]+$')  # 199000d, 12thang -> 199000, 12
+COMBINING_MARKS = re.compile('[\u0300-\u036f]')
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and remove Vietnamese diacritics"""
+    
+    text = text.lower().replace('đ', 'd')
+    return COMBINING_MARKS.sub('', unicodedata.normalize('NFD', text))
+
+
+def tokenize(text: str) -> List[str]:
+    """Syllables, syllable bigrams and the pieces / joined form of punctuated codes"""
+    
+    syllables = TOKEN_PATTERN.findall(normalize_text(text))
+    tokens = list(syllables)
+    
+    for syllable in syllables:
+        joined = syllable
+        if SEPARATOR_PATTERN.search(syllable):
+            parts = [part for part in SEPARATOR_PATTERN.split(syllable) if part]
+            joined = ''.join(parts)
+            tokens.extend(parts)
+            tokens.append(joined)
+        amount = AMOUNT_WITH_UNIT_PATTERN.match(joined)
+        if amount:
+            tokens.append(amount.group(1))
+    
+    tokens.extend(f"{first} {second}" for first, second in zip(syllables, syllables[1:]))
+    return tokens
+
+
+class BM25Index:
+    """BM25 inverted index: an array-backed base (loaded from disk) plus an in-memory tail of new documents"""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        
+        # Base: term -> row, postings sliced by offsets, documents sorted by id
+        self._base_terms: Dict[str, int] = {}
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_posting_ids = np.zeros(0, dtype=np.int64)
+        self._base_posting_tfs = np.zeros(0, dtype=np.float32)
+        self._base_doc_ids = np.zeros(0, dtype=np.int64)
+        self._base_doc_lengths = np.zeros(0, dtype=np.float32)
+        
+        # Tail: documents added since the last save
+        self._tail_postings: Dict[str, Dict[int, int]] = {}
+        self._tail_lengths: Dict[int, int] = {}
+        
+        # Base documents removed since the last save
+        self._removed: set = set()
+        
+        self._total_length = 0.0
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._base_doc_ids) - len(self._removed) + len(self._tail_lengths)
+    
+    def __contains__(self, faiss_id: int) -> bool:
+        if faiss_id in self._tail_lengths:
+            return True
+        return faiss_id not in self._removed and self._base_row(faiss_id) is not None
+    
+    def _base_row(self, faiss_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self._base_doc_ids, faiss_id))
+        if row < len(self._base_doc_ids) and self._base_doc_ids[row] == faiss_id:
+            return row
+        return None
+    
+    def doc_ids(self) -> np.ndarray:
+        """Ids of every indexed document"""
+        
+        base_ids = self._base_doc_ids
+        if self._removed:
+            base_ids = base_ids[~np.isin(base_ids, list(self._removed))]
+        tail_ids = np.fromiter(self._tail_lengths, dtype=np.int64, count=len(self._tail_lengths))
+        return np.concatenate([base_ids, tail_ids])
+    
+    def add(self, records):
+        """Index the content of records (a re-added id replaces its previous text)"""
+        
+        for record in records:
+            faiss_id = record['faiss_id']
+            if faiss_id in self:
+                self.remove([faiss_id])
+            
+            tokens = tokenize(record['content'])
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            
+            for token, count in counts.items():
+                self._tail_postings.setdefault(token, {})[faiss_id] = count
+                self._arrays.pop(token, None)
+            self._tail_lengths[faiss_id] = len(tokens)
+            self._total_length += len(tokens)
+    
+    def remove(self, faiss_ids):
+        """Drop documents from the index"""
+        
+        changed = False
+        for faiss_id in np.asarray(faiss_ids, dtype=np.int64).tolist():
+            length = self._tail_lengths.pop(faiss_id, None)
+            if length is not None:
+                for postings in self._tail_postings.values():
+                    postings.pop(faiss_id, None)
+                self._total_length -= length
+                changed = True
+                continue
+            
+            row = self._base_row(faiss_id)
+            if row is not None and faiss_id not in self._removed:
+                self._removed.add(faiss_id)
+                self._total_length -= float(self._base_doc_lengths[row])
+                changed = True
+        
+        if changed:
+            self._arrays = {}
+    
+    def _term_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, term frequencies, document lengths) of a term's postings, cached until the term changes"""
+        
+        arrays = self._arrays.get(term)
+        if arrays is not None:
+            return arrays
+        
+        ids_parts, tf_parts, length_parts = [], [], []
+        row = self._base_terms.get(term)
+        if row is not None:
+            start, end = self._base_offsets[row], self._base_offsets[row + 1]
+            ids = self._base_posting_ids[start:end]
+            tfs = self._base_posting_tfs[start:end]
+            if self._removed:
+                live = ~np.isin(ids, list(self._removed))
+                ids, tfs = ids[live], tfs[live]
+            ids_parts.append(ids)
+            tf_parts.append(tfs)
+            length_parts.append(self._base_doc_lengths[np.searchsorted(self._base_doc_ids, ids)])
+        
+        tail = self._tail_postings.get(term)
+        if tail:
+            ids_parts.append(np.fromiter(tail.keys(), dtype=np.int64, count=len(tail)))
+            tf_parts.append(np.fromiter(tail.values(), dtype=np.float32, count=len(tail)))
+            length_parts.append(np.fromiter(
+                (self._tail_lengths[faiss_id] for faiss_id in tail), dtype=np.float32, count=len(tail)
+            ))
+        
+        if ids_parts:
+            arrays = (np.concatenate(ids_parts), np.concatenate(tf_parts), np.concatenate(length_parts))
+        else:
+            arrays = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32))
+        self._arrays[term] = arrays
+        return arrays
+    
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, BM25 scores) for a query, best first; allowed restricts the candidate ids"""
+        
+        doc_count = len(self)
+        if doc_count == 0 or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        average_length = max(self._total_length / doc_count, 1.0)
+        
+        id_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            ids, tfs, lengths = self._term_arrays(term)
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / average_length)
+            id_parts.append(ids)
+            score_parts.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        
+        if not id_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        # Sum per-term contributions per document
+        doc_ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        if allowed is not None:
+            keep = np.isin(doc_ids, allowed)
+            doc_ids, scores = doc_ids[keep], scores[keep]
+        
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return doc_ids[top], scores[top]
+    
+    def save(self, directory: str, collection_name: str):
+        """Write base + tail as one array file, then reload it as the base"""
+        
+        postings: Dict[str, Dict[int, float]] = {}
+        for term, row in self._base_terms.items():
+            start, end = self._base_offsets[row], self._base_offsets[row + 1]
+            ids, tfs = self._base_posting_ids[start:end], self._base_posting_tfs[start:end]
+            if self._removed:
+                live = ~np.isin(ids, list(self._removed))
+                ids, tfs = ids[live], tfs[live]
+            postings[term] = dict(zip(ids.tolist(), tfs.tolist()))
+        for term, tail in self._tail_postings.items():
+            postings.setdefault(term, {}).update(tail)
+        
+        terms = sorted(term for term, term_postings in postings.items() if term_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        posting_ids, posting_tfs = [], []
+        for row, term in enumerate(terms):
+            term_postings = postings[term]
+            posting_ids.append(np.fromiter(term_postings.keys(), dtype=np.int64, count=len(term_postings)))
+            posting_tfs.append(np.fromiter(term_postings.values(), dtype=np.float32, count=len(term_postings)))
+            offsets[row + 1] = offsets[row] + len(term_postings)
+        
+        live_base = ~np.isin(self._base_doc_ids, list(self._removed)) if self._removed else slice(None)
+        doc_ids = np.concatenate([
+            self._base_doc_ids[live_base],
+            np.fromiter(self._tail_lengths.keys(), dtype=np.int64, count=len(self._tail_lengths))
+        ])
+        doc_lengths = np.concatenate([
+            self._base_doc_lengths[live_base],
+            np.fromiter(self._tail_lengths.values(), dtype=np.float32, count=len(self._tail_lengths))
+        ])
+        order = np.argsort(doc_ids)
+        
+        path = self.file_path(directory, collection_name)
+        tmp_path = unique_tmp_path(path)
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                posting_ids=np.concatenate(posting_ids) if posting_ids else np.zeros(0, dtype=np.int64),
+                posting_tfs=np.concatenate(posting_tfs) if posting_tfs else np.zeros(0, dtype=np.float32),
+                doc_ids=doc_ids[order],
+                doc_lengths=doc_lengths[order]
+            )
+        os.replace(tmp_path, path)
+        
+        self._open(path)
+    
+    def _open(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self._base_terms = {term: row for row, term in enumerate(data['terms'].tolist())}
+            self._base_offsets = data['offsets']
+            self._base_posting_ids = data['posting_ids']
+            self._base_posting_tfs = data['posting_tfs']
+            self._base_doc_ids = data['doc_ids']
+            self._base_doc_lengths = data['doc_lengths']
+        
+        self._tail_postings = {}
+        self._tail_lengths = {}
+        self._removed = set()
+        self._total_length = float(self._base_doc_lengths.sum())
+        self._arrays = {}
+    
+    @staticmethod
+    def file_path(directory: str, collection_name: str) -> str:
+        return os.path.join(directory, f"{collection_name}_bm25.npz")
+    
+    @classmethod
+    def exists(cls, directory: str, collection_name: str) -> bool:
+        return os.path.exists(cls.file_path(directory, collection_name))
+    
+    @classmethod
+    def load(cls, directory: str, collection_name: str, **kwargs) -> 'BM25Index':
+        index = cls(**kwargs)
+        index._open(cls.file_path(directory, collection_name))
+        return index
@@ -0,0 +1,98 @@
+#engines/snapshots.py
+"""
+Snapshot Store - Immutable, versioned copies of the collection files with an atomic CURRENT pointer
+
+Layout:
+    {root}/v000001/...   one directory per published version (never modified after publish)
+    {root}/CURRENT       name of the version readers should serve, replaced atomically
+"""
+import os
+import re
+import shutil
+import logging
+from typing import List, Optional
+
+from .document_store import unique_tmp_path
+
+logger = logging.getLogger(__name__)
+
+VERSION_PATTERN = re.compile(r'^v(\d{6,})$')
+
+
+class SnapshotStore:
+    """Publishes collection files as a new version directory, then flips CURRENT to it"""
+    
+    POINTER = 'CURRENT'
+    
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = keep  # Versions kept on disk, besides the current one
+    
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, version)
+    
+    def current(self) -> Optional[str]:
+        """Version named by the CURRENT pointer, if it exists"""
+        
+        try:
+            with open(os.path.join(self.root, self.POINTER), 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        
+        return version if version and os.path.isdir(self.path(version)) else None
+    
+    def versions(self) -> List[str]:
+        """Published versions, oldest first (by number: v1000000 follows v999999)"""
+        
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            (name for name in os.listdir(self.root) if VERSION_PATTERN.match(name)),
+            key=lambda name: int(VERSION_PATTERN.match(name).group(1))
+        )
+    
+    def publish(self, source_dir: str, file_names: List[str]) -> str:
+        """Copy files into a new version directory and point CURRENT at it"""
+        
+        versions = self.versions()
+        next_number = int(VERSION_PATTERN.match(versions[-1]).group(1)) + 1 if versions else 1
+        version = f"v{next_number:06d}"
+        
+        # Stage under a name readers ignore, then rename: a version directory is always complete
+        staging_path = os.path.join(self.root, f".{version}.tmp")
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+        
+        for file_name in file_names:
+            source_path = os.path.join(source_dir, file_name)
+            if not os.path.exists(source_path):
+                continue
+            # Collection saves replace files by rename, so hard links never see later writes
+            try:
+                os.link(source_path, os.path.join(staging_path, file_name))
+            except OSError:
+                shutil.copy2(source_path, os.path.join(staging_path, file_name))
+        
+        os.rename(staging_path, self.path(version))
+        
+        pointer_path = os.path.join(self.root, self.POINTER)
+        tmp_path = unique_tmp_path(pointer_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pointer_path)
+        
+        logger.info(f"Published snapshot {version} ({len(file_names)} files)")
+        self.prune()
+        return version
+    
+    def prune(self):
+        """Delete old versions; readers still mapping their files keep them until unmapped"""
+        
+        current = self.current()
+        stale = [version for version in self.versions() if version != current][:-self.keep or None]
+        for version in stale:
+            shutil.rmtree(self.path(version), ignore_errors=True)
+            logger.debug(f"Removed snapshot {version}")
@@ -38,10 +38,12 @@ logger = logging.getLogger(__name__)
 from models.schemas import ChatRequest, ChatResponse, PageContext
 from engines.intent_classifier import IntentClassifier
 from engines.faiss_manager import FAISSCollectionManager
+from engines.cross_encoder import CrossEncoderReranker, DEFAULT_CROSS_ENCODER_MODEL
 from engines.llm_provider import MultiLLMProvider
 from engines.response_generator import ContextualResponseGenerator
 from utils.analytics import ChatAnalytics
-from utils.cache import CacheManager
+from utils.cache import CacheManager, EmbeddingCache
+from utils.document_registry import DocumentRegistry
 from utils.monitoring import PerformanceMonitor
 
 # Rate limiting
@@ -89,9 +91,41 @@ redis_client = redis.Redis(
     socket_timeout=5
 )
 
+# Binary-safe Redis client for the shared embedding cache tier
+embedding_redis_client = redis.Redis(
+    host=os.getenv('REDIS_HOST', 'localhost'),
+    port=int(os.getenv('REDIS_PORT', 6379)),
+    decode_responses=False,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
 # Initialize components
 intent_classifier = IntentClassifier()
-faiss_manager = FAISSCollectionManager()
+faiss_manager = FAISSCollectionManager(
+    embedding_executor=os.getenv('EMBEDDING_EXECUTOR', 'thread'),
+    embedding_workers=int(os.getenv('EMBEDDING_WORKERS', 2)),
+    embedding_batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', 64)),
+    embedding_batch_wait_ms=float(os.getenv('EMBEDDING_BATCH_WAIT_MS', 5)),
+    embedding_backend=os.getenv('EMBEDDING_BACKEND', 'sentence_transformer'),
+    onnx_model_dir=os.getenv('ONNX_MODEL_DIR'),
+    index_load_mode=os.getenv('FAISS_INDEX_LOAD_MODE', 'memory'),  # 'mmap' only shares IVF collections
+    unified_index=os.getenv('FAISS_UNIFIED_INDEX', 'false') == 'true',  # Extra in-memory float32 copy; not with mmap/compression
+    index_latency_target_ms=float(os.getenv('FAISS_LATENCY_TARGET_MS', 1.0)),
+    ivf_nprobe=int(os.getenv('FAISS_NPROBE', 16)),
+    hnsw_ef_search=int(os.getenv('FAISS_EF_SEARCH', 64)),
+    index_compression=os.getenv('FAISS_INDEX_COMPRESSION') or None,
+    delta_compaction_entries=int(os.getenv('FAISS_DELTA_COMPACTION_ENTRIES', 5000)),
+    tombstone_compaction_ratio=float(os.getenv('FAISS_TOMBSTONE_COMPACTION_RATIO', 0.2)),
+    near_duplicate_threshold=float(os.getenv('FAISS_NEAR_DUPLICATE_THRESHOLD', 0.95)),
+    hybrid_search=os.getenv('FAISS_HYBRID_SEARCH', 'false') == 'true',
+    lexical_min_score=float(os.getenv('FAISS_LEXICAL_MIN_SCORE', 0.3)),
+    mmr_lambda=float(os.getenv('FAISS_MMR_LAMBDA')) if os.getenv('FAISS_MMR_LAMBDA') else None,
+    search_workers=int(os.getenv('FAISS_SEARCH_WORKERS', 4)),
+    search_omp_threads=int(os.getenv('FAISS_OMP_THREADS', 1)),
+    snapshot_watch_interval=float(os.getenv('FAISS_SNAPSHOT_WATCH_INTERVAL', 0)),
+    snapshot_keep=int(os.getenv('FAISS_SNAPSHOT_KEEP', 3))
+)
 llm_provider = MultiLLMProvider()
 response_generator = ContextualResponseGenerator()
 analytics = ChatAnalytics(
@@ -99,6 +133,20 @@ analytics = ChatAnalytics(
     redis_client=redis_client
 )
 cache_manager = CacheManager(redis_client)
+embedding_cache = EmbeddingCache(
+    model_name=faiss_manager.embedding_model_id,
+    redis_client=embedding_redis_client if os.getenv('EMBEDDING_CACHE_REDIS', 'true') == 'true' else None,
+    max_entries=int(os.getenv('EMBEDDING_CACHE_SIZE', 10000))
+)
+faiss_manager.set_embedding_cache(embedding_cache)
+if os.getenv('DATABASE_URL'):
+    faiss_manager.set_document_registry(DocumentRegistry(os.getenv('DATABASE_URL')))
+if os.getenv('CROSS_ENCODER_RERANK', 'false') == 'true':
+    faiss_manager.set_cross_encoder(CrossEncoderReranker(
+        model_name=os.getenv('CROSS_ENCODER_MODEL', DEFAULT_CROSS_ENCODER_MODEL),
+        top_n=int(os.getenv('CROSS_ENCODER_TOP_N', 20)),
+        latency_budget_ms=float(os.getenv('CROSS_ENCODER_BUDGET_MS', 150))
+    ))
 performance_monitor = PerformanceMonitor()
 
 
@@ -119,6 +167,10 @@ async def startup_event():
         # Load FAISS indices
         await faiss_manager.initialize_collections()
         await faiss_manager.load_all_collections()
+        await faiss_manager.precompute_query_embeddings(
+            intent_classifier.get_static_refined_queries()
+        )
+        faiss_manager.start_snapshot_watcher()
         logger.info("FAISS collections initialized")
     except Exception as e:
         logger.error(f"FAISS initialization failed: {e}")
@@ -145,7 +197,9 @@ async def shutdown_event():
     
     try:
         await llm_provider.cleanup()
+        await faiss_manager.close()
         redis_client.close()
+        embedding_redis_client.close()
         logger.info("Resources cleaned up successfully")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
@@ -215,7 +269,8 @@ async def chat_endpoint(
                 "product": intent_result.target_product,
                 "section": request.context.section
             },
-            top_k=8
+            top_k=8,
+            original_query=request.message
         )
         
         logger.info(f"Found {len(relevant_docs)} relevant documents")
@@ -279,18 +334,20 @@ async def health_check():
     """Comprehensive health check"""
     health_status = {
         "status": "healthy",
+        "ready": False,
         "timestamp": datetime.now().isoformat(),
         "uptime": time.time() - app.state.start_time,
         "components": {}
     }
     
-    # Check FAISS collections
+    # Check FAISS collections; readiness = serving the published snapshot (when watching one)
     try:
         collections_status = await faiss_manager.health_check()
         health_status["components"]["faiss"] = {
             "status": "healthy" if collections_status["all_loaded"] else "degraded",
             "details": collections_status
         }
+        health_status["ready"] = collections_status["ready"]
     except Exception as e:
         health_status["components"]["faiss"] = {
             "status": "unhealthy",
@@ -347,6 +404,7 @@ async def get_monitoring_metrics():
         faiss_status = await faiss_manager.health_check()
         llm_status = await llm_provider.health_check()
         cache_stats = cache_manager.get_stats()
+        embedding_cache_stats = embedding_cache.get_stats()
         
         return {
             'system': system_metrics,
@@ -354,7 +412,8 @@ async def get_monitoring_metrics():
                 'uptime': time.time() - app.state.start_time,
                 'faiss_status': faiss_status,
                 'llm_providers': llm_status,
-                'cache_stats': cache_stats
+                'cache_stats': cache_stats,
+                'embedding_cache_stats': embedding_cache_stats
             }
         }
     except Exception as e:
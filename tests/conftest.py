@@ -0,0 +1,79 @@
+#tests/conftest.py
+"""
+Shared fixtures: a FAISSCollectionManager on a temporary directory that never loads an
+embedding model (documents come with embeddings, queries from the query embedding table)
+"""
+import asyncio
+from typing import Dict, List, Optional
+import numpy as np
+import pytest
+
+from engines.faiss_manager import FAISSCollectionManager, DocumentChunk
+
+DIM = 384
+
+
+def cluster_center(seed: int = 0) -> np.ndarray:
+    """Unit query vector that scores ~0.93 against every vector of clustered_vectors(seed=seed)"""
+    
+    center = np.random.default_rng(seed).normal(size=DIM)
+    return (center / np.linalg.norm(center)).astype(np.float32)
+
+
+def clustered_vectors(count: int, seed: int = 0, noise: float = 0.4) -> np.ndarray:
+    """Unit vectors around one center: above every similarity threshold for the center,
+    below the near-duplicate threshold for each other (pairwise cosine ~0.86)"""
+    
+    center = cluster_center(seed)
+    offsets = np.random.default_rng(seed + 1000).normal(size=(count, DIM))
+    offsets /= np.linalg.norm(offsets, axis=1, keepdims=True)
+    vectors = center + noise * offsets
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_documents(count: int, metadata: Optional[Dict] = None, source: str = 'doc.md') -> List[DocumentChunk]:
+    return [
+        DocumentChunk(
+            content=f"Chunk {position} of {source}: nội dung tài liệu số {position}",
+            metadata={'source': source, 'chunk_index': position, **(metadata or {})}
+        )
+        for position in range(count)
+    ]
+
+
+def set_query(manager: FAISSCollectionManager, query: str, vector: np.ndarray):
+    """Serve a query embedding from the precomputed table instead of the model"""
+    manager.query_embedding_table[query] = np.asarray(vector, dtype=np.float32)
+
+
+def create_manager(base_path: str, **kwargs) -> FAISSCollectionManager:
+    # 'process' skips loading the in-process backend; no worker is started unless something is encoded
+    manager = FAISSCollectionManager(
+        base_path=base_path,
+        embedding_executor='process',
+        embedding_batch_wait_ms=0,
+        **kwargs
+    )
+    asyncio.run(manager.load_all_collections())
+    return manager
+
+
+@pytest.fixture
+def manager_factory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The manager creates ./logs
+    managers = []
+    
+    def factory(**kwargs) -> FAISSCollectionManager:
+        manager = create_manager(str(tmp_path / 'indices'), **kwargs)
+        managers.append(manager)
+        return manager
+    
+    yield factory
+    
+    for manager in managers:
+        asyncio.run(manager.close())
+
+
+@pytest.fixture
+def manager(manager_factory) -> FAISSCollectionManager:
+    return manager_factory()
@@ -0,0 +1,64 @@
+#tests/test_cache.py
+"""
+EmbeddingCache: in-process LRU tier, shared Redis tier (fakeredis) and eviction
+"""
+import fakeredis
+import numpy as np
+import redis
+
+from utils.cache import EmbeddingCache
+
+
+def make_vectors(count: int) -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(count, 4)).astype(np.float32)
+
+
+def test_keys_ignore_whitespace_but_not_the_model():
+    cache = EmbeddingCache('model-a')
+    
+    assert cache.make_key("bảo  hành\tsản phẩm") == cache.make_key("bảo hành sản phẩm")
+    assert cache.make_key("bảo hành") != EmbeddingCache('model-b').make_key("bảo hành")
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = EmbeddingCache('model', max_entries=2)
+    vectors = make_vectors(3)
+    cache.set_many(['a', 'b'], vectors[:2])
+    cache.get_many(['a'])  # 'b' becomes the least recently used
+    cache.set_many(['c'], vectors[2:])
+    
+    found = cache.get_many(['a', 'b', 'c'])
+    
+    assert found[1] is None
+    np.testing.assert_array_equal(found[0], vectors[0])
+    np.testing.assert_array_equal(found[2], vectors[2])
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_redis_tier_is_shared_and_promoted_into_the_lru():
+    redis_client = fakeredis.FakeRedis()
+    vectors = make_vectors(2)
+    EmbeddingCache('model', redis_client).set_many(['a', 'b'], vectors)
+    
+    # Another worker: empty LRU, same Redis
+    cache = EmbeddingCache('model', redis_client)
+    found = cache.get_many(['a', 'b', 'c'])
+    cache.get_many(['a'])
+    
+    np.testing.assert_array_equal(np.stack(found[:2]), vectors)
+    assert found[2] is None
+    assert redis_client.ttl(cache.make_key('a')) > 0
+    assert cache.get_stats()['l2_hits'] == 2
+    assert cache.get_stats()['l1_hits'] == 1
+
+
+class UnreachableRedis:
+    def mget(self, keys):
+        raise redis.ConnectionError("Connection refused")
+
+
+def test_redis_errors_fall_back_to_misses():
+    cache = EmbeddingCache('model', UnreachableRedis())
+    
+    assert cache.get_many(['a']) == [None]
+    assert cache.get_stats()['redis_errors'] == 1
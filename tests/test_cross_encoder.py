@@ -0,0 +1,88 @@
+#tests/test_cross_encoder.py
+"""
+CrossEncoderReranker: ordering, the pair-score cache and the latency-budget fallback
+"""
+import asyncio
+import threading
+from typing import List
+
+from engines.cross_encoder import CrossEncoderReranker
+
+QUERY = "bảo hành bao lâu"
+
+
+class KeywordModel:
+    """Scores a pair by how often 'bảo hành' occurs in the passage, recording every batch"""
+    
+    def __init__(self, release: threading.Event = None, error: Exception = None):
+        self.batches = []
+        self.release = release
+        self.error = error
+    
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(list(pairs))
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [passage.count("bảo hành") for _, passage in pairs]
+
+
+def make_results(contents: List[str]) -> List[dict]:
+    return [
+        {'doc_id': f"doc-{position}", 'content': content, 'query': QUERY, 'similarity_score': 0.9 - position / 100}
+        for position, content in enumerate(contents)
+    ]
+
+
+CONTENTS = ["giao hàng", "bảo hành 12 tháng", "bảo hành bảo hành tại nhà", "đổi trả"]
+
+
+def test_reorders_the_head_by_score_and_keeps_the_tail():
+    reranker = CrossEncoderReranker(top_n=3, model=KeywordModel())
+    
+    reranked = asyncio.run(reranker.rerank(QUERY, make_results(CONTENTS)))
+    
+    assert [result['doc_id'] for result in reranked] == ['doc-2', 'doc-1', 'doc-0', 'doc-3']
+    assert [result.get('rerank_score') for result in reranked] == [2, 1, 0, None]
+    reranker.close()
+
+
+def test_pair_scores_are_cached_per_query_and_document():
+    model = KeywordModel()
+    reranker = CrossEncoderReranker(model=model)
+    
+    asyncio.run(reranker.rerank(QUERY, make_results(CONTENTS)))
+    reranked = asyncio.run(reranker.rerank(" Bảo hành  BAO LÂU ", make_results(CONTENTS)))
+    
+    assert len(model.batches) == 1
+    assert reranked[0]['doc_id'] == 'doc-2'
+    assert reranker.get_stats()['cache_hits'] == len(CONTENTS)
+    reranker.close()
+
+
+def test_over_budget_keeps_the_order_and_caches_the_late_scores():
+    release = threading.Event()
+    model = KeywordModel(release=release)
+    reranker = CrossEncoderReranker(latency_budget_ms=10, model=model)
+    results = make_results(CONTENTS)
+    
+    reranked = asyncio.run(reranker.rerank(QUERY, results))
+    release.set()
+    reranker.executor.submit(lambda: None).result()  # The overrun batch finishes in the background
+    cached = asyncio.run(reranker.rerank(QUERY, make_results(CONTENTS)))
+    
+    assert reranked == results and all('rerank_score' not in result for result in reranked)
+    assert reranker.get_stats()['over_budget'] == 1
+    assert len(model.batches) == 1
+    assert cached[0]['doc_id'] == 'doc-2'
+    reranker.close()
+
+
+def test_model_errors_keep_the_retrieval_order():
+    reranker = CrossEncoderReranker(model=KeywordModel(error=RuntimeError("model crashed")))
+    results = make_results(CONTENTS)
+    
+    assert asyncio.run(reranker.rerank(QUERY, results)) == results
+    assert reranker.get_stats()['errors'] == 1
+    reranker.close()
@@ -0,0 +1,49 @@
+#tests/test_document_store.py
+"""
+Collection file writes shared by several worker processes: unique tmp names and the collection file lock
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+from engines.document_store import FileLock, unique_tmp_path
+from tests.conftest import clustered_vectors, make_documents
+
+TRY_LOCK = """
+import fcntl, os, sys
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)
+try:
+    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+except BlockingIOError:
+    sys.exit(1)
+"""
+
+
+def lock_is_free(path: str) -> bool:
+    return subprocess.run([sys.executable, '-c', TRY_LOCK, path]).returncode == 0
+
+
+def test_tmp_paths_are_unique_per_write(tmp_path):
+    path = str(tmp_path / 'product_a_features.index')
+    
+    assert unique_tmp_path(path) != unique_tmp_path(path)
+    assert f".{os.getpid()}." in unique_tmp_path(path)
+
+
+def test_file_lock_excludes_other_processes_and_is_reentrant(tmp_path):
+    lock = FileLock.for_collection(str(tmp_path), 'warranty_support')
+    
+    with lock:
+        with lock:
+            assert not lock_is_free(lock.path)
+        assert not lock_is_free(lock.path)
+    assert lock_is_free(lock.path)
+
+
+def test_save_replaces_every_file_and_releases_the_lock(manager):
+    asyncio.run(manager.add_documents_to_collection('warranty_support', make_documents(4), clustered_vectors(4)))
+    asyncio.run(manager._save_collection('warranty_support'))
+    
+    assert not [name for name in os.listdir(manager.base_path) if name.endswith('.tmp')]
+    assert lock_is_free(manager.collections['warranty_support']['file_lock'].path)
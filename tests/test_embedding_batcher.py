@@ -0,0 +1,64 @@
+#tests/test_embedding_batcher.py
+"""
+EmbeddingBatcher: concurrent encode requests coalesced into one model call, flushed by size or wait
+"""
+import time
+import asyncio
+import numpy as np
+
+from engines.faiss_manager import EmbeddingBatcher
+
+
+class RecordingModel:
+    """Encodes each text as its batch position, recording every batch"""
+    
+    def __init__(self):
+        self.batches = []
+    
+    async def encode(self, texts):
+        self.batches.append(list(texts))
+        return np.arange(len(texts), dtype=np.float32)[:, None]
+
+
+def test_full_batch_flushes_without_waiting():
+    model = RecordingModel()
+    
+    async def run():
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=3, max_wait_ms=60000)
+        return await asyncio.wait_for(asyncio.gather(batcher.encode(['a', 'b']), batcher.encode(['c'])), timeout=1)
+    
+    first, second = asyncio.run(run())
+    
+    assert model.batches == [['a', 'b', 'c']]
+    assert first.ravel().tolist() == [0, 1]
+    assert second.ravel().tolist() == [2]
+
+
+def test_partial_batch_flushes_after_max_wait():
+    model = RecordingModel()
+    
+    async def run():
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=64, max_wait_ms=20)
+        start = time.perf_counter()
+        results = await asyncio.gather(batcher.encode(['a']), batcher.encode(['b', 'c']))
+        return results, time.perf_counter() - start, batcher.get_stats()
+    
+    (first, second), elapsed, stats = asyncio.run(run())
+    
+    assert model.batches == [['a', 'b', 'c']]
+    assert second.ravel().tolist() == [1, 2]
+    assert elapsed >= 0.015
+    assert stats['requests'] == 2 and stats['batches'] == 1
+
+
+def test_model_errors_reach_every_caller():
+    async def failing_encode(texts):
+        raise RuntimeError("model crashed")
+    
+    async def run():
+        batcher = EmbeddingBatcher(failing_encode, max_batch_size=2, max_wait_ms=60000)
+        return await asyncio.gather(batcher.encode(['a']), batcher.encode(['b']), return_exceptions=True)
+    
+    outcomes = asyncio.run(run())
+    
+    assert [str(outcome) for outcome in outcomes] == ["model crashed", "model crashed"]
@@ -0,0 +1,214 @@
+#tests/test_faiss_manager.py
+"""
+FAISSCollectionManager against the pinned FAISS: filtered, deleted and unified searches, delta log replay
+"""
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+from engines.index_policy import compression_of
+from tests.conftest import DIM, cluster_center, clustered_vectors, make_documents, set_query
+
+
+def test_filtered_search_returns_only_matching_documents(manager):
+    vectors = clustered_vectors(12)
+    documents = make_documents(6, {'product': 'alpha'}, source='alpha.md')
+    documents += make_documents(6, {'product': 'beta'}, source='beta.md')
+    asyncio.run(manager.add_documents_to_collection('product_a_features', documents, vectors))
+    set_query(manager, 'tính năng', cluster_center())
+    
+    results = asyncio.run(manager.search_targeted_collections(
+        queries=['tính năng'],
+        collections=['product_a_features'],
+        context_filter={'product': 'alpha', 'section': None},
+        top_k=4
+    ))
+    
+    assert len(results) == 4
+    assert {result['metadata']['product'] for result in results} == {'alpha'}
+
+
+def test_deleted_documents_are_not_returned(manager):
+    vectors = clustered_vectors(8)
+    documents = make_documents(4, source='keep.md') + make_documents(4, source='drop.md')
+    asyncio.run(manager.add_documents_to_collection('warranty_support', documents, vectors))
+    set_query(manager, 'bảo hành', cluster_center())
+    
+    deleted = asyncio.run(manager.delete_documents('warranty_support', metadata_filter={'source': 'drop.md'}))
+    # Built by the delete itself: search pool threads only read it
+    assert manager.collections['warranty_support']['tombstone_selector'] is not None
+    results = asyncio.run(manager.search_targeted_collections(['bảo hành'], ['warranty_support'], top_k=8))
+    
+    assert deleted == 4
+    assert len(manager.collections['warranty_support']['tombstones']) == 4
+    assert len(results) == 4
+    assert {result['metadata']['source'] for result in results} == {'keep.md'}
+
+
+def test_replaced_chunk_returns_only_its_new_version(manager):
+    vectors = clustered_vectors(4)
+    asyncio.run(manager.add_documents_to_collection('warranty_support', make_documents(3), vectors[:3]))
+    changed = make_documents(3)[:1]
+    changed[0].content = "Chunk 0 of doc.md: nội dung đã cập nhật"
+    asyncio.run(manager.add_documents_to_collection('warranty_support', changed, vectors[3:]))
+    set_query(manager, 'bảo hành', cluster_center())
+    
+    results = asyncio.run(manager.search_targeted_collections(['bảo hành'], ['warranty_support'], top_k=8))
+    
+    assert sorted(result['content'] for result in results) == [
+        "Chunk 0 of doc.md: nội dung đã cập nhật",
+        "Chunk 1 of doc.md: nội dung tài liệu số 1",
+        "Chunk 2 of doc.md: nội dung tài liệu số 2"
+    ]
+
+
+def test_unified_search_spans_collections_and_skips_deleted(manager_factory):
+    manager = manager_factory(unified_index=True)
+    vectors = clustered_vectors(8)
+    asyncio.run(manager.add_documents_to_collection('product_a_pricing', make_documents(4, source='a.md'), vectors[:4]))
+    asyncio.run(manager.add_documents_to_collection('product_b_pricing', make_documents(4, source='b.md'), vectors[4:]))
+    asyncio.run(manager.delete_documents('product_b_pricing', metadata_filter={'chunk_index': 0}))
+    set_query(manager, 'giá', cluster_center())
+    
+    results = asyncio.run(manager.search_targeted_collections(
+        ['giá'], ['product_a_pricing', 'product_b_pricing'], top_k=4
+    ))
+    
+    assert manager.unified_index.ntotal == 8
+    assert sorted((result['collection'], result['metadata']['chunk_index']) for result in results) == [
+        ('product_a_pricing', 0), ('product_a_pricing', 1), ('product_a_pricing', 2), ('product_a_pricing', 3),
+        ('product_b_pricing', 1), ('product_b_pricing', 2), ('product_b_pricing', 3)
+    ]
+
+
+@pytest.mark.parametrize('options', [{'index_load_mode': 'mmap'}, {'index_compression': 'sq8'}])
+def test_unified_index_refuses_mmap_and_compression(manager_factory, options):
+    # Its in-memory float32 copy of every collection would undo what these options save
+    with pytest.raises(ValueError, match='unified_index'):
+        manager_factory(unified_index=True, **options)
+
+
+def test_unified_search_keeps_collections_where_the_filter_key_is_not_indexed(manager_factory):
+    manager = manager_factory(unified_index=True)
+    vectors = clustered_vectors(6)
+    # List values cannot be indexed, so 'tags' is post-filtered in product_a_features only
+    asyncio.run(manager.add_documents_to_collection(
+        'product_a_features', make_documents(3, {'tags': ['sla']}, source='a.md'), vectors[:3]
+    ))
+    asyncio.run(manager.add_documents_to_collection(
+        'product_b_features', make_documents(3, {'tags': 'sla'}, source='b.md'), vectors[3:]
+    ))
+    set_query(manager, 'tính năng', cluster_center())
+    
+    results = asyncio.run(manager.search_targeted_collections(
+        ['tính năng'], ['product_a_features', 'product_b_features'], context_filter={'tags': ['sla']}, top_k=3
+    ))
+    
+    assert len(results) == 3
+    assert {result['collection'] for result in results} == {'product_a_features'}
+
+
+def test_growing_collection_retrains_its_quantizer(manager_factory):
+    manager = manager_factory(index_compression='sq8')
+    collection = manager.collections['warranty_support']
+    vectors = clustered_vectors(330)
+    
+    async def add_and_rebuild(documents, document_vectors):
+        await manager.add_documents_to_collection('warranty_support', documents, document_vectors)
+        await collection['rebuild_task']
+    
+    asyncio.run(add_and_rebuild(make_documents(30, source='first.md'), vectors[:30]))
+    assert compression_of(collection['base_index']) == 'sq8'
+    assert collection['trained_vectors'] == 30
+    
+    asyncio.run(add_and_rebuild(make_documents(300, source='second.md'), vectors[30:]))
+    assert collection['trained_vectors'] == 330
+
+
+def test_search_keeps_the_collection_state_it_started_with(manager):
+    vectors = clustered_vectors(4)
+    asyncio.run(manager.add_documents_to_collection('warranty_support', make_documents(4), vectors))
+    collection = manager.collections['warranty_support']
+    
+    # A snapshot swap replaces self.collections while the pool thread is searching
+    swapped = manager._new_collection_state('warranty_support', collection['config'], manager.base_path)
+    manager.collections = {**manager.collections, 'warranty_support': swapped}
+    search_filter = manager._search_filter({'warranty_support': collection}, None)
+    results = manager._search_collection(
+        'warranty_support', collection, ['bảo hành'], cluster_center()[None, :], search_filter, 4, 0.5
+    )
+    
+    assert len(results) == 4
+
+
+def test_filters_are_resolved_on_the_event_loop_not_the_search_pool(manager_factory):
+    # Adds and deletes update the metadata index on the loop; pool threads must not read it
+    manager = manager_factory(search_workers=2)
+    vectors = clustered_vectors(8)
+    documents = make_documents(4, {'product': 'alpha'}, source='alpha.md') + make_documents(4, {'product': 'beta'}, source='beta.md')
+    asyncio.run(manager.add_documents_to_collection('product_a_features', documents, vectors))
+    set_query(manager, 'tính năng', cluster_center())
+    
+    metadata_index = manager.collections['product_a_features']['metadata_index']
+    resolve = metadata_index.resolve
+    threads = []
+    
+    def recording_resolve(context_filter):
+        threads.append(threading.current_thread())
+        return resolve(context_filter)
+    
+    metadata_index.resolve = recording_resolve
+    results = asyncio.run(manager.search_targeted_collections(
+        ['tính năng'], ['product_a_features'], context_filter={'product': 'alpha'}, top_k=4
+    ))
+    
+    assert {result['metadata']['product'] for result in results} == {'alpha'}
+    assert threads and set(threads) == {threading.main_thread()}
+
+
+def test_near_duplicate_chain_keeps_the_last_link(manager):
+    # A~B and B~C (cosine 0.96) but A and C differ (cosine 0.84): only B is a duplicate of a kept result
+    angle = np.arccos(0.96)
+    basis = np.linalg.qr(np.random.default_rng(7).normal(size=(DIM, 2)))[0].T
+    vectors = np.stack([np.cos(step * angle) * basis[0] + np.sin(step * angle) * basis[1] for step in range(3)])
+    asyncio.run(manager.add_documents_to_collection('warranty_support', make_documents(3), vectors.astype(np.float32)))
+    set_query(manager, 'bảo hành', basis[0])
+    
+    results = asyncio.run(manager.search_targeted_collections(['bảo hành'], ['warranty_support'], top_k=3))
+    
+    assert [result['metadata']['chunk_index'] for result in results] == [0, 2]
+
+
+def test_mmap_mode_reports_flat_indexes_as_read_into_memory(manager_factory):
+    writer = manager_factory()
+    asyncio.run(writer.add_documents_to_collection('warranty_support', make_documents(4), clustered_vectors(4)))
+    asyncio.run(writer._save_collection('warranty_support'))
+    
+    reader = manager_factory(index_load_mode='mmap')
+    set_query(reader, 'bảo hành', cluster_center())
+    status = asyncio.run(reader.health_check())['collections']['warranty_support']
+    results = asyncio.run(reader.search_targeted_collections(['bảo hành'], ['warranty_support'], top_k=4))
+    
+    assert reader.collections['warranty_support']['read_only']
+    assert status['index_type'] == 'flat' and not status['memory_mapped']
+    assert len(results) == 4
+
+
+def test_delta_log_replay_restores_unsaved_adds_and_deletes(manager_factory):
+    writer = manager_factory()
+    vectors = clustered_vectors(6)
+    documents = make_documents(3, source='keep.md') + make_documents(3, source='drop.md')
+    asyncio.run(writer.add_documents_to_collection('warranty_support', documents, vectors))
+    asyncio.run(writer.delete_documents('warranty_support', metadata_filter={'source': 'drop.md'}))
+    assert writer.collections['warranty_support']['delta_log'].entry_count == 9  # 6 adds, 3 removals, none compacted
+    
+    # A restarted worker rebuilds the collection from the base files plus the delta log
+    restarted = manager_factory()
+    set_query(restarted, 'bảo hành', cluster_center())
+    results = asyncio.run(restarted.search_targeted_collections(['bảo hành'], ['warranty_support'], top_k=6))
+    
+    assert restarted.collections['warranty_support']['doc_count'] == 3
+    assert sorted(result['content'] for result in results) == [
+        f"Chunk {position} of keep.md: nội dung tài liệu số {position}" for position in range(3)
+    ]
@@ -0,0 +1,35 @@
+#tests/test_index_policy.py
+"""
+IndexPolicy: search parameters through the IndexIDMap2 wrapper and quantizer retraining
+"""
+import faiss
+import numpy as np
+import pytest
+
+from engines.index_policy import IndexPolicy
+from tests.conftest import DIM, clustered_vectors
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw'])
+def test_search_parameters_pass_through_the_id_map(index_type):
+    policy = IndexPolicy(nprobe=64)
+    vectors = clustered_vectors(400)
+    ids = (np.int64(3) << 40) + np.arange(400, dtype=np.int64)
+    index = faiss.IndexIDMap2(policy.build(index_type, DIM, vectors))
+    index.add_with_ids(vectors, ids)
+    
+    allowed = np.ascontiguousarray(ids[::2])
+    selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+    params = policy.search_parameters(faiss.downcast_index(index.index), selector)
+    _, found = index.search(vectors[:4], 5, params=params)
+    
+    assert (found != -1).all()
+    assert np.isin(found, allowed).all()
+
+
+def test_quantizer_is_retrained_once_the_collection_outgrows_its_sample():
+    policy = IndexPolicy(compression='sq8')
+    index = policy.build('flat', DIM, clustered_vectors(30), 'sq8')
+    
+    assert not policy.needs_rebuild({}, index, 50, trained_vectors=30)
+    assert policy.needs_rebuild({}, index, 330, trained_vectors=30)
@@ -0,0 +1,102 @@
+#tests/test_ingestion.py
+"""
+Ingestion: section splitting, chunking and the read -> chunk -> embed -> write pipeline
+"""
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from engines.embedding_backends import EmbeddingBackend
+from engines.ingestion import IngestionPipeline, chunk_text, split_sections
+from tests.conftest import DIM
+
+
+class HashingBackend(EmbeddingBackend):
+    """Deterministic embeddings from the text hash (no model download)"""
+    
+    name = 'hashing'
+    dimension = DIM
+    
+    def encode(self, texts):
+        return np.stack([
+            np.random.default_rng(int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)).normal(size=DIM)
+            for text in texts
+        ]).astype(np.float32)
+
+
+def use_hashing_backend(manager):
+    manager.embedding_executor.shutdown(wait=False)
+    manager.embedding_executor = ThreadPoolExecutor(max_workers=1)
+    manager.embedding_backend = HashingBackend()
+
+
+def test_split_sections_keeps_headings_with_their_body():
+    text = "Intro line\n\n# Bảo hành\nTwelve months.\n\n## Đổi trả\nThirty days.\n"
+    
+    assert split_sections(text) == [
+        (None, "Intro line\n"),
+        ("Bảo hành", "Twelve months.\n"),
+        ("Đổi trả", "Thirty days.")
+    ]
+
+
+def test_chunks_respect_the_size_and_overlap_on_word_boundaries():
+    paragraphs = [" ".join(f"p{paragraph}w{word}" for word in range(30)) for paragraph in range(6)]
+    
+    chunks = chunk_text("\n\n".join(paragraphs), chunk_size=400, chunk_overlap=60)
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        carried = chunk.split("\n\n")[0]
+        assert previous.endswith(carried) and carried.split()[0] in previous.split()
+
+
+def test_long_paragraphs_are_cut_between_words():
+    chunks = chunk_text(" ".join(["từ"] * 500), chunk_size=200, chunk_overlap=0)
+    
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(word == "từ" for chunk in chunks for word in chunk.split())
+
+
+def test_pipeline_writes_every_chunk_with_its_source_metadata(manager, tmp_path):
+    use_hashing_backend(manager)
+    root = tmp_path / 'content'
+    (root / 'product_a_features').mkdir(parents=True)
+    (root / 'product_a_features' / 'guide.md').write_text(
+        "# Cài đặt\n" + "\n\n".join(f"Bước {step}: cấu hình mục {step}." for step in range(40)) + "\n\n# Gỡ lỗi\nKhởi động lại.",
+        encoding='utf-8'
+    )
+    (root / 'product_a_features' / 'notes.bin').write_text("ignored", encoding='utf-8')
+    pipeline = IngestionPipeline(manager, chunk_size=200, chunk_overlap=40, embed_batch_size=3, write_batch_size=5)
+    
+    stats = asyncio.run(pipeline.ingest_directory(str(root)))
+    
+    collection = manager.collections['product_a_features']
+    assert stats['written'] == stats['chunks'] == collection['doc_count'] > 3
+    records = list(collection['doc_store'].iter_records())
+    assert sorted(record['metadata']['chunk_index'] for record in records) == list(range(stats['chunks']))
+    assert {record['metadata']['source'] for record in records} == {'product_a_features/guide.md'}
+    assert {record['metadata']['heading'] for record in records} == {'Cài đặt', 'Gỡ lỗi'}
+    assert {record['metadata']['product'] for record in records} == {'product_a'}
+
+
+def test_reingesting_a_shorter_file_deletes_its_trailing_chunks(manager, tmp_path):
+    use_hashing_backend(manager)
+    guide = tmp_path / 'content' / 'warranty_support' / 'guide.md'
+    guide.parent.mkdir(parents=True)
+    steps = [f"Bước {step}: kiểm tra bảo hành mục {step}." for step in range(40)]
+    pipeline = IngestionPipeline(manager, chunk_size=200, chunk_overlap=0, embed_batch_size=3, write_batch_size=4)
+    
+    guide.write_text("\n\n".join(steps), encoding='utf-8')
+    first = asyncio.run(pipeline.ingest_directory(str(tmp_path / 'content')))
+    guide.write_text("\n\n".join(steps[:10]), encoding='utf-8')
+    second = asyncio.run(pipeline.ingest_directory(str(tmp_path / 'content')))
+    
+    collection = manager.collections['warranty_support']
+    records = list(collection['doc_store'].iter_records())
+    assert second['skipped'] == second['chunks'] < first['chunks']
+    assert second['written'] == 0 and second['deleted'] == first['chunks'] - second['chunks']
+    assert sorted(record['metadata']['chunk_index'] for record in records) == list(range(second['chunks']))
+    assert collection['doc_count'] == second['chunks']
@@ -0,0 +1,105 @@
+#tests/test_lexical_index.py
+"""
+BM25 lexical index: tokenisation, persistence, reconciliation with the document store and hybrid fusion
+"""
+import asyncio
+import numpy as np
+
+from engines.faiss_manager import DocumentChunk
+from engines.lexical_index import BM25Index, tokenize
+from tests.conftest import DIM, clustered_vectors, make_documents, set_query
+
+
+def records(*contents, start: int = 1):
+    return [{'faiss_id': faiss_id, 'content': content} for faiss_id, content in enumerate(contents, start)]
+
+
+def test_tokens_ignore_diacritics_and_keep_codes_and_amounts():
+    tokens = tokenize("Gói Premium 199.000đ, hotline 1900-1234")
+    
+    assert tokenize("bảo hành") == tokenize("BAO HANH") == ['bao', 'hanh', 'bao hanh']
+    assert {'goi', 'premium', 'goi premium', '199.000d', '199000', '1900-1234', '19001234'} <= set(tokens)
+
+
+def test_search_ranks_by_bm25_and_respects_allowed_ids():
+    index = BM25Index()
+    index.add(records("gói premium giá 199.000đ", "gói cơ bản", "bảo hành premium premium"))
+    
+    ids, scores = index.search("premium 199.000đ", top_k=3)
+    allowed_ids, _ = index.search("premium 199.000đ", top_k=3, allowed=np.array([2, 3]))
+    
+    assert ids.tolist() == [1, 3]
+    assert scores[0] > scores[1] > 0
+    assert allowed_ids.tolist() == [3]
+
+
+def test_saved_index_reloads_with_later_adds_and_removes(tmp_path):
+    index = BM25Index()
+    index.add(records("gói premium", "gói cơ bản", "hotline 1900-1234"))
+    index.save(str(tmp_path), 'product_a_pricing')
+    
+    loaded = BM25Index.load(str(tmp_path), 'product_a_pricing')
+    loaded.remove([1])
+    loaded.add(records("gói premium mới", start=4))
+    loaded.save(str(tmp_path), 'product_a_pricing')
+    reloaded = BM25Index.load(str(tmp_path), 'product_a_pricing')
+    
+    assert sorted(reloaded.doc_ids().tolist()) == [2, 3, 4]
+    assert reloaded.search("premium", top_k=5)[0].tolist() == [4]
+    assert reloaded.search("1900-1234", top_k=5)[0].tolist() == [3]
+
+
+def test_loading_reconciles_the_index_with_the_document_store(manager):
+    asyncio.run(manager.add_documents_to_collection('warranty_support', make_documents(3), clustered_vectors(3)))
+    collection = manager.collections['warranty_support']
+    stored_ids = sorted(record['faiss_id'] for record in collection['doc_store'].iter_records())
+    
+    # As after a crash: a delta-log add never reached the index, a removed chunk is still in it
+    collection['lexical_index'].remove([stored_ids[0]])
+    collection['lexical_index'].add([{'faiss_id': 999, 'content': "đã xoá"}])
+    manager._index_records(collection)
+    
+    assert sorted(collection['lexical_index'].doc_ids().tolist()) == stored_ids
+
+
+def unit(*components) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector / np.linalg.norm(vector)
+
+
+# content -> vector; the query is unit(1): cosine 0.93, 0.9, 0.5 and 0
+PRICING_CHUNKS = {
+    "Gói Premium giá 199.000đ mỗi tháng": unit(0.93, 0.37),
+    "Thanh toán theo năm được giảm giá": unit(0.9, 0, 0.44),
+    "Gói Premium có hỗ trợ 24/7": unit(0.5, 0, 0, 0.87),
+    "Premium là tên phòng họp tầng 3": unit(0, 0, 0, 0, 1)
+}
+
+
+def search_pricing(manager):
+    documents = [
+        DocumentChunk(content=content, metadata={'source': 'pricing.md', 'chunk_index': position})
+        for position, content in enumerate(PRICING_CHUNKS)
+    ]
+    asyncio.run(manager.add_documents_to_collection(
+        'product_a_pricing', documents, np.stack(list(PRICING_CHUNKS.values()))
+    ))
+    set_query(manager, 'gói premium 199.000đ', unit(1))
+    return asyncio.run(manager.search_targeted_collections(['gói premium 199.000đ'], ['product_a_pricing'], top_k=4))
+
+
+def test_fusion_ranks_hits_of_both_first_and_floors_lexical_only_hits(manager_factory):
+    results = search_pricing(manager_factory(hybrid_search=True))
+    
+    scores = {result['metadata']['chunk_index']: result['score'] for result in results}
+    assert results[0]['metadata']['chunk_index'] == 0
+    assert results[0]['fusion_score'] == 2 / 61  # Rank 1 in both rankings
+    assert set(scores) == {0, 1, 2}  # 2 is lexical-only above the floor, 3 only shares a term
+    assert abs(scores[2] - 0.5) < 0.01
+
+
+def test_lexical_floor_is_configurable(manager_factory):
+    results = search_pricing(manager_factory(hybrid_search=True, lexical_min_score=0.0))
+    
+    assert {result['metadata']['chunk_index'] for result in results} == {0, 1, 2, 3}
@@ -0,0 +1,68 @@
+#tests/test_mmr.py
+"""
+Maximal marginal relevance: selection order between relevance and diversity
+"""
+import asyncio
+import numpy as np
+import pytest
+
+from tests.conftest import DIM, make_documents
+
+
+def unit(*components) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector / np.linalg.norm(vector)
+
+
+# name -> (vector, composite score): 'a2' repeats 'a' (cosine 0.9), 'c' half overlaps it (0.7), 'b' is unrelated
+CANDIDATES = {
+    'a': (unit(1, 0, 0, 0), 1.0),
+    'a2': (unit(0.9, np.sqrt(1 - 0.81), 0, 0), 0.95),
+    'b': (unit(0, 0, 1, 0), 0.6),
+    'c': (unit(0.7, 0, 0, np.sqrt(1 - 0.49)), 0.5)
+}
+
+
+@pytest.fixture
+def candidates(manager):
+    documents = make_documents(len(CANDIDATES))
+    vectors = np.stack([vector for vector, _ in CANDIDATES.values()])
+    asyncio.run(manager.add_documents_to_collection('warranty_support', documents, vectors))
+    
+    faiss_ids = {
+        record['metadata']['chunk_index']: record['faiss_id']
+        for record in manager.collections['warranty_support']['doc_store'].iter_records()
+    }
+    return [
+        {'name': name, 'faiss_id': faiss_ids[position], 'collection': 'warranty_support', 'composite_score': score}
+        for position, (name, (_, score)) in enumerate(CANDIDATES.items())
+    ]
+
+
+def select(manager, candidates, k, mmr_lambda, collection=None):
+    collections = {'warranty_support': collection or manager.collections['warranty_support']}
+    return [result['name'] for result in manager._select_mmr(candidates, collections, k, mmr_lambda)]
+
+
+def test_lambda_one_keeps_the_relevance_order(manager, candidates):
+    assert select(manager, candidates, 4, 1.0) == ['a', 'a2', 'b', 'c']
+
+
+def test_lambda_zero_picks_the_least_redundant_after_the_first(manager, candidates):
+    assert select(manager, candidates, 4, 0.0) == ['a', 'b', 'c', 'a2']
+
+
+def test_balanced_lambda_defers_the_near_repeat(manager, candidates):
+    assert select(manager, candidates, 4, 0.5) == ['a', 'b', 'a2', 'c']
+    assert select(manager, candidates, 2, 0.5) == ['a', 'b']
+
+
+def test_vectors_come_from_the_collection_state_of_the_request(manager, candidates):
+    collection = manager.collections['warranty_support']
+    
+    # A snapshot swap after the search replaces self.collections with a state lacking these chunks
+    swapped = manager._new_collection_state('warranty_support', collection['config'], manager.base_path)
+    manager.collections = {**manager.collections, 'warranty_support': swapped}
+    
+    assert select(manager, candidates, 4, 0.0, collection) == ['a', 'b', 'c', 'a2']
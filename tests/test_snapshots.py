@@ -0,0 +1,22 @@
+#tests/test_snapshots.py
+"""
+SnapshotStore: version numbering, the CURRENT pointer and pruning
+"""
+import os
+
+from engines.snapshots import SnapshotStore
+
+
+def test_versions_are_numbered_past_six_digits(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'), keep=1)
+    for version in ('v999998', 'v1000000', 'v999999'):
+        os.makedirs(store.path(version))
+    (tmp_path / 'products.index').write_bytes(b'index')
+    
+    assert store.versions() == ['v999998', 'v999999', 'v1000000']
+    
+    version = store.publish(str(tmp_path), ['products.index', 'missing.index'])
+    
+    assert version == 'v1000001' == store.current()
+    assert os.listdir(store.path(version)) == ['products.index']
+    assert store.versions() == ['v1000000', 'v1000001']  # keep=1 besides the current one
@@ -5,7 +5,10 @@ Cache Manager - Redis-based caching for responses and session management
 import json
 import hashlib
 import time
-from typing import Optional, Dict, Any
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+import numpy as np
 import redis
 import logging
 from models.schemas import ChatResponse, PageContext
@@ -217,4 +220,116 @@ class CacheManager:
             return len(self.redis_client.keys(f"{self.cache_prefix}*"))
         except Exception as e:
             logger.error(f"Cache size error: {e}")
-            return 0
\ No newline at end of file
+            return 0
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-process LRU backed by an optional shared Redis tier"""
+    
+    def __init__(
+        self,
+        model_name: str,
+        redis_client: Optional[redis.Redis] = None,
+        max_entries: int = 10000,
+        ttl: int = 7 * 24 * 3600
+    ):
+        # The Redis client must be created with decode_responses=False (values are raw float32 bytes)
+        self.model_name = model_name
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_prefix = "chatbot:embedding:"
+        
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {
+            'l1_hits': 0,
+            'l2_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'redis_errors': 0
+        }
+    
+    def make_key(self, text: str) -> str:
+        """Cache key from normalized text and model name"""
+        
+        normalized = unicodedata.normalize('NFC', ' '.join(text.split()))
+        digest = hashlib.md5(f"{self.model_name}\x00{normalized}".encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}{digest}"
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings; returns None for texts missing from both tiers"""
+        
+        keys = [self.make_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        
+        # Tier one: in-process LRU
+        l2_rows = []
+        for row, key in enumerate(keys):
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                vectors[row] = vector
+                self.stats['l1_hits'] += 1
+            else:
+                l2_rows.append(row)
+        
+        # Tier two: shared Redis, promoted into the LRU on hit
+        if l2_rows and self.redis_client is not None:
+            try:
+                raw_values = self.redis_client.mget([keys[row] for row in l2_rows])
+            except Exception as e:
+                logger.error(f"Embedding cache retrieval error: {e}")
+                self.stats['redis_errors'] += 1
+                raw_values = [None] * len(l2_rows)
+            
+            for row, raw in zip(l2_rows, raw_values):
+                if raw:
+                    vector = np.frombuffer(raw, dtype=np.float32)
+                    vectors[row] = vector
+                    self._store_local(keys[row], vector)
+                    self.stats['l2_hits'] += 1
+        
+        self.stats['misses'] += sum(1 for vector in vectors if vector is None)
+        return vectors
+    
+    def set_many(self, texts: List[str], vectors: np.ndarray):
+        """Store freshly computed embeddings in both tiers"""
+        
+        keys = [self.make_key(text) for text in texts]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        
+        for key, vector in zip(keys, vectors):
+            self._store_local(key, vector)
+        
+        if self.redis_client is not None:
+            try:
+                pipeline = self.redis_client.pipeline()
+                for key, vector in zip(keys, vectors):
+                    pipeline.setex(key, self.ttl, vector.tobytes())
+                pipeline.execute()
+            except Exception as e:
+                logger.error(f"Embedding cache storage error: {e}")
+                self.stats['redis_errors'] += 1
+    
+    def _store_local(self, key: str, vector: np.ndarray):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedding cache statistics for this worker"""
+        
+        stats = dict(self.stats)
+        hits = stats['l1_hits'] + stats['l2_hits']
+        total_requests = hits + stats['misses']
+        stats['hit_rate'] = (hits / total_requests) if total_requests > 0 else 0.0
+        stats['size'] = len(self._lru)
+        stats['max_entries'] = self.max_entries
+        stats['redis_enabled'] = self.redis_client is not None
+        
+        return stats
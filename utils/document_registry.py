@@ -0,0 +1,82 @@
+#utils/document_registry.py
+"""
+Document Registry - Mirrors indexed chunks into the document_metadata table
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, List, Any
+import psycopg2
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """Keeps one document_metadata row per indexed chunk, with its SHA-256 content_hash"""
+    
+    def __init__(self, postgres_url: str):
+        self.postgres_url = postgres_url
+    
+    async def sync(
+        self,
+        collection_name: str,
+        added_records: List[Dict[str, Any]],
+        removed_doc_ids: List[str],
+        embedding_model: str
+    ):
+        """Upsert rows for added chunks and delete rows of replaced ones
+        
+        The FAISS collection files are the source of truth; failures are logged, not raised.
+        """
+        
+        if not added_records and not removed_doc_ids:
+            return
+        
+        rows = [
+            (
+                collection_name,
+                record['id'],
+                record['metadata'].get('heading') or record['metadata'].get('title'),
+                record['content_digest'],
+                record['metadata'].get('source'),
+                json.dumps(record['metadata'], ensure_ascii=False),
+                embedding_model
+            )
+            for record in added_records
+        ]
+        
+        try:
+            # Run database operation in thread pool to avoid blocking
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_rows, collection_name, rows, removed_doc_ids)
+        except Exception as e:
+            logger.error(f"Document registry sync error for {collection_name}: {e}")
+    
+    def _write_rows(self, collection_name: str, rows: List[tuple], removed_doc_ids: List[str]):
+        """Apply the upserts and deletes in one transaction"""
+        
+        with psycopg2.connect(self.postgres_url) as conn:
+            with conn.cursor() as cursor:
+                if removed_doc_ids:
+                    cursor.execute(
+                        "DELETE FROM document_metadata WHERE collection_name = %s AND doc_id = ANY(%s)",
+                        (collection_name, list(removed_doc_ids))
+                    )
+                if rows:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO document_metadata
+                        (collection_name, doc_id, title, content_hash, source_file, metadata, embedding_model)
+                        VALUES %s
+                        ON CONFLICT (collection_name, doc_id) DO UPDATE SET
+                            title = EXCLUDED.title,
+                            content_hash = EXCLUDED.content_hash,
+                            source_file = EXCLUDED.source_file,
+                            metadata = EXCLUDED.metadata,
+                            embedding_model = EXCLUDED.embedding_model
+                        """,
+                        rows
+                    )
+                conn.commit()